@@ -1,4 +1,31 @@
 from .client import NoteClient2
+from .image_optimizer import ImageOptimizer
+from .instrumentation import Instrumentation, PrometheusMetrics
+from .note_ir import NoteIR
+from .rate_limit import RateLimiter
+from .retry import RetryPolicy
 
-__all__ = ["NoteClient2"]
-__version__ = "1.0.5"
\ No newline at end of file
+__all__ = ["NoteClient2", "AccountPool", "AsyncNoteClient2", "BulkParser", "ImageCache", "ImageOptimizer", "JobStore", "NoteCache", "NoteExporter", "NoteIR", "RateLimiter", "RetryPolicy", "Instrumentation", "PrometheusMetrics"]
+__version__ = "1.0.5"
+
+
+# 使うときだけ読み込むもの (aiohttp は任意依存、ほかは sqlite3 / concurrent.futures を読み込む)
+_LAZY = {
+    "AsyncNoteClient2": ".async_client",
+    "AccountPool": ".account_pool",
+    "BulkParser": ".bulk_parse",
+    "ImageCache": ".image_cache",
+    "JobStore": ".job_store",
+    "NoteCache": ".note_cache",
+    "NoteExporter": ".note_export",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,177 @@
+from __future__ import annotations
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .note_ir import plain_length
+from .utils import xsrf_from_cookies
+
+# NoteClient2 と AsyncNoteClient2 が共有する、送信方法によらない部分 (リクエストの組み立て・結果の整形・計測)
+
+DEFAULT_HEADERS: Dict[str, str] = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Origin": "https://editor.note.com",
+    "X-Requested-With": "XMLHttpRequest",
+}
+
+CREATE_NOTE_URL = "https://note.com/api/v1/text_notes"
+
+
+def _draft_save_url(note_id: int) -> str:
+    return f"https://note.com/api/v1/text_notes/draft_save?id={note_id}&is_temp_saved=true"
+
+
+def _body_length(parsed: Dict[str, Any]) -> int:
+    # 下書き保存と公開の両方で使うので、最初に数えた値を parse 結果に残しておく
+    if parsed.get("body_length") is None:
+        parsed["body_length"] = plain_length(parsed["combined_html"])
+    return parsed["body_length"]
+
+
+def _draft_request(
+    cookies: Dict[str, str],
+    title: str,
+    body_html: str,
+    image_keys: List[str],
+    body_length: Optional[int] = None,
+) -> Dict[str, Any]:
+    headers = {
+        "X-XSRF-TOKEN": xsrf_from_cookies(cookies),
+        "X-Requested-With": "XMLHttpRequest",
+        "Referer": "https://editor.note.com/",
+        "Content-Type": "application/json",
+    }
+    payload = {
+        "body": body_html,
+        "body_length": body_length if body_length is not None else plain_length(body_html),
+        "name": title,
+        "index": False,
+        "is_lead_form": False,
+        "image_keys": image_keys or [],
+    }
+    return {"headers": headers, "json": payload}
+
+
+def _created_note(created: Dict[str, Any]) -> Dict[str, Any]:
+    if not created.get("ok") or not created.get("json"):
+        return {"ok": False, "error": {"type": "CreateNoteFailed", "status_code": created.get("status_code"), "detail": created.get("text")}}
+
+    note_data = (created["json"] or {}).get("data")
+    if not note_data:
+        return {"ok": False, "error": {"type": "CreateNoteInvalidResponse", "detail": created.get("json")}}
+
+    note_id = note_data.get("id")
+    note_key = note_data.get("key")
+    if not note_id or not note_key:
+        return {"ok": False, "error": {"type": "CreateNoteMissingFields", "detail": note_data}}
+    return {"ok": True, "data": {"note_data": note_data, "note_id": note_id, "note_key": note_key}}
+
+
+def _publish_payload(
+    note_data: Dict[str, Any],
+    title: str,
+    parsed: Dict[str, Any],
+    hashtags: List[str],
+    price: int,
+    magazine_ids: List[int],
+) -> Dict[str, Any]:
+    separator_id = parsed["separator_id"]
+    formatted_hashtags = [t if t.startswith("#") else f"#{t}" for t in hashtags]
+
+    overrides = {
+        "name": title,
+        "free_body": parsed["free_html"],
+        "pay_body": parsed["pay_html"] if price > 0 else "",
+        "status": "published",
+        "price": price,
+        "separator": separator_id if price > 0 and separator_id else None,
+        "is_refund": False,
+        "limited": False,
+        "index": True,
+        "image_keys": parsed["image_keys"],
+        "hashtags": formatted_hashtags,
+        "magazine_ids": magazine_ids,
+        "magazine_keys": [],
+        "body_length": _body_length(parsed),
+        "send_notifications_flag": True,
+        "lead_form": {"is_active": False, "consent_url": ""},
+        "line_add_friend": {"is_active": False, "keyword": "", "add_friend_url": ""},
+    }
+
+    update_payload = dict(note_data)
+    update_payload.update(overrides)
+    return {k: v for k, v in update_payload.items() if v is not None}
+
+
+def _timed(timings: Dict[str, float], stage: str, fn: Callable[..., Any], *args: Any) -> Any:
+    # ステージの所要時間 (秒) を timings[stage] に記録する
+    t0 = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        timings[stage] = time.perf_counter() - t0
+
+
+def _report(progress: Optional[Callable[[str, Dict[str, Any]], None]], stage: str, data: Dict[str, Any]) -> None:
+    # publish(progress=...) にステージの結果を渡す
+    if progress is not None:
+        progress(stage, data)
+
+
+def _has_note(resume: Optional[Dict[str, Any]]) -> bool:
+    # resume に作成済みの下書きがあるか (JobStore の resume は parse / magazines の結果だけのこともある)
+    return bool(resume and resume.get("note_id"))
+
+
+def _resumed_note(resume: Dict[str, Any]) -> Dict[str, Any]:
+    # 前回の publish が作成済みの下書きを使う (記事作成はやり直さない)
+    return {
+        "ok": True,
+        "data": {
+            "note_data": resume["note_data"],
+            "note_id": resume["note_id"],
+            "note_key": resume["note_key"],
+            "eyecatch_uploaded": bool(resume.get("eyecatch_uploaded")),
+        },
+    }
+
+
+def _with_resume(result: Dict[str, Any], note: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    記事作成後の失敗に、途中から再開するための状態を error["resume"] として付ける
+
+    publish(..., resume=result["error"]["resume"]) で同じ下書きを使ってやり直せる
+    """
+    if not result.get("ok") and isinstance(result.get("error"), dict):
+        result["error"]["resume"] = {
+            "note_id": note["note_id"],
+            "note_key": note["note_key"],
+            "note_data": note["note_data"],
+            "eyecatch_uploaded": note["eyecatch_uploaded"],
+        }
+    return result
+
+
+def _draft_result(note_id: int, note_key: str) -> Dict[str, Any]:
+    return {
+        "ok": True,
+        "data": {
+            "mode": "draft",
+            "note_id": note_id,
+            "note_key": note_key,
+            "edit_url": f"https://editor.note.com/notes/{note_key}/edit",
+        },
+    }
+
+
+def _published_result(user_urlname: str, note_id: int, note_key: str, price: int) -> Dict[str, Any]:
+    return {
+        "ok": True,
+        "data": {
+            "mode": "published",
+            "note_id": note_id,
+            "note_key": note_key,
+            "public_url": f"https://note.com/{user_urlname}/n/{note_key}",
+            "edit_url": f"https://editor.note.com/notes/{note_key}/edit",
+            "has_pay": price > 0,
+        },
+    }
@@ -0,0 +1,55 @@
+from __future__ import annotations
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+# image_cache.py から読み込まれるので、sqlite3 は接続するときに読み込む
+if TYPE_CHECKING:
+    import sqlite3
+
+
+class ThreadConnections:
+    """
+    スレッドごとの sqlite3 接続 (ImageCache / JobStore / NoteCache が使う)
+
+    - sqlite3 の接続はスレッドをまたいで使えないので、スレッドごとに 1 つ作る
+    - 終わったスレッドの接続は、次に接続を作るときに閉じる
+    - close() はすべてのスレッドの接続を閉じる (そのあとで使ったスレッドは接続し直す)
+    """
+
+    def __init__(self, path: str, row_factory: Optional[Any] = None):
+        self.path = path
+        self.row_factory = row_factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns: Dict[threading.Thread, sqlite3.Connection] = {}
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._conns.get(threading.current_thread()) is conn:
+            return conn
+        return self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        import sqlite3
+
+        # close() はほかのスレッドから閉じるので check_same_thread を外す (使うのは作ったスレッドだけ)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        if self.row_factory is not None:
+            conn.row_factory = self.row_factory
+        with self._lock:
+            finished = [t for t in self._conns if not t.is_alive()]
+            stale = [self._conns.pop(t) for t in finished]
+            self._conns[threading.current_thread()] = conn
+        for old in stale:
+            old.close()
+        self._local.conn = conn
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            conns = list(self._conns.values())
+            self._conns.clear()
+        for conn in conns:
+            conn.close()
+        self._local.conn = None
@@ -0,0 +1,250 @@
+from __future__ import annotations
+import collections
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .client import NoteClient2
+from .http import SessionPool
+from .rate_limit import RateLimiter
+
+
+class AccountPool:
+    """
+    複数アカウントの NoteClient2 をまとめて扱う
+
+    - 接続プール (SessionPool) は全アカウントで共有し、Cookie はアカウントごとに送る
+    - レート制限はアカウントごと (rate_limiter_factory() でアカウントごとに RateLimiter を作る)
+    - start_refresher(): バックグラウンドのスレッドで、メモリ上の検証が切れる refresh_margin 秒前に
+      セッションを検証し直す (無効なら再ログイン)。投稿のたびに検証・ログインを待たずに済む
+    - publish_many(): job["account"] のアカウントで投稿し、アカウントをまたいで並行に実行する
+      (1 アカウントの同時実行は per_account 件まで)
+
+        accounts = AccountPool(rate_limiter_factory=lambda: RateLimiter(rate=2))
+        accounts.add("alice", EMAIL_A, PASSWORD_A, "alice_note")
+        accounts.add("bob", EMAIL_B, PASSWORD_B, "bob_note")
+        accounts.start_refresher()
+        for item in accounts.publish_many([{"account": "alice", "title": ..., "md_file_path": ...}, ...]):
+            ...
+    """
+
+    def __init__(
+        self,
+        pool_maxsize: int = 32,
+        rate_limiter_factory: Optional[Callable[[], RateLimiter]] = None,
+        refresh_margin: float = 300.0,
+        **client_options: Any,
+    ):
+        self.pool = SessionPool(pool_maxsize=pool_maxsize)
+        self.rate_limiter_factory = rate_limiter_factory
+        self.refresh_margin = refresh_margin
+        self.client_options = client_options
+        self.last_refresh: Dict[str, Dict[str, Any]] = {}
+        self._clients: Dict[str, NoteClient2] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    def add(
+        self,
+        name: str,
+        email: str,
+        password: str,
+        user_urlname: str,
+        session_file: Optional[str] = None,
+        **options: Any,
+    ) -> NoteClient2:
+        """アカウントを登録する (session_file の既定は session_{name}.json、options は NoteClient2 の引数)"""
+        if name in self._clients:
+            raise ValueError(f"account already registered: {name!r}")
+        kwargs = {**self.client_options, **options}
+        if self.rate_limiter_factory is not None and "rate_limiter" not in kwargs:
+            kwargs["rate_limiter"] = self.rate_limiter_factory()
+        client = NoteClient2(
+            email,
+            password,
+            user_urlname,
+            session_file=session_file or f"session_{name}.json",
+            pool=self.pool,
+            **kwargs,
+        )
+        with self._lock:
+            self._clients[name] = client
+        return client
+
+    def client(self, name: str) -> Optional[NoteClient2]:
+        return self._clients.get(name)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._clients)
+
+    # --- sessions ---
+
+    def refresh(self, force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        検証の残り時間が refresh_margin 秒を切ったアカウント (force=True なら全部) のセッションを検証し直す
+
+        ログインが重ならないように 1 アカウントずつ行い、結果をアカウント名ごとに返す (last_refresh にも残す)
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        for name, client in list(self._clients.items()):
+            if not force and client.auth.fresh_for() > self.refresh_margin:
+                continue
+            try:
+                result = client.auth.prepare(client.http, force=True)
+                if result.get("ok"):
+                    client._sync_cookies()
+            except Exception as e:
+                result = {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "account_refresh"}}
+            results[name] = result
+            self.last_refresh[name] = {**result, "at": time.time()}
+        return results
+
+    def start_refresher(self, interval: float = 60.0) -> None:
+        """interval 秒ごとに refresh() するデーモンスレッドを起動する"""
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._stop.clear()
+
+        def loop() -> None:
+            while True:
+                self.refresh()
+                if self._stop.wait(interval):
+                    return
+
+        self._refresher = threading.Thread(target=loop, name="noteclient2-account-refresher", daemon=True)
+        self._refresher.start()
+
+    def stop_refresher(self) -> None:
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+
+    def close(self) -> None:
+        self.stop_refresher()
+        for client in self._clients.values():
+            client.close()
+        self.pool.close()
+
+    def __enter__(self) -> "AccountPool":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # --- publishing ---
+
+    def publish(self, account: str, **job: Any) -> Dict[str, Any]:
+        client = self._clients.get(account)
+        if client is None:
+            return _unknown_account(account)
+        return client.publish(**job)
+
+    def publish_many(
+        self,
+        jobs: Iterable[Dict[str, Any]],
+        max_workers: int = 8,
+        per_account: int = 2,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        複数アカウントの記事をまとめて投稿する
+
+        - jobs は {"account": 名前, **publish() の引数} の列 (ジェネレータでもよい)
+        - jobs は未完了のものが max_workers * 2 件になるまでしか先読みしない
+        - 空いているワーカーには、先読みしたジョブのうち同時実行数が per_account 未満のアカウントのものを順番に割り当てる
+          (1 アカウントのジョブが多くても、ほかのアカウントが待たされない)
+        - 完了した順に {"index", "account", "job", "result", "elapsed", "stats"} を yield する
+          stats は累計の completed / failed / elapsed / per_second と、アカウントごとの accounts
+        """
+        started = time.perf_counter()
+        queues: Dict[str, Deque[Tuple[int, Dict[str, Any]]]] = collections.OrderedDict()
+        stats: Dict[str, Any] = {"completed": 0, "failed": 0, "elapsed": 0.0, "per_second": 0.0, "accounts": {}}
+
+        def report(index: int, job: Dict[str, Any], result: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+            account = job.get("account")
+            per = stats["accounts"].setdefault(account, {"completed": 0, "failed": 0})
+            stats["completed"] += 1
+            per["completed"] += 1
+            if not result.get("ok"):
+                stats["failed"] += 1
+                per["failed"] += 1
+            stats["elapsed"] = time.perf_counter() - started
+            stats["per_second"] = stats["completed"] / stats["elapsed"] if stats["elapsed"] > 0 else 0.0
+            return {
+                "index": index,
+                "account": account,
+                "job": job,
+                "result": result,
+                "elapsed": elapsed,
+                "stats": {**stats, "accounts": {k: dict(v) for k, v in stats["accounts"].items()}},
+            }
+
+        job_iter = enumerate(jobs)
+        exhausted = False
+        buffered = 0  # queues に入れてまだ終わっていないジョブ (実行中を含む)
+
+        def fill() -> Iterator[Dict[str, Any]]:
+            # 未完了のジョブは max_workers * 2 件までに抑える (NoteClient2.publish_many() と同じ)
+            nonlocal exhausted, buffered
+            while not exhausted and buffered < max_workers * 2:
+                item = next(job_iter, None)
+                if item is None:
+                    exhausted = True
+                    break
+                index, job = item
+                if job.get("account") not in self._clients:
+                    yield report(index, job, _unknown_account(job.get("account")), 0.0)
+                    continue
+                queues.setdefault(job["account"], collections.deque()).append(item)
+                buffered += 1
+
+        def run(job: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+            t0 = time.perf_counter()
+            kwargs = {k: v for k, v in job.items() if k != "account"}
+            try:
+                result = self._clients[job["account"]].publish(**kwargs)
+            except Exception as e:
+                result = {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "account_pool"}}
+            return result, time.perf_counter() - t0
+
+        in_flight: Dict[str, int] = collections.defaultdict(int)
+        pending: Dict[Future, Tuple[int, Dict[str, Any]]] = {}
+
+        def next_job() -> Optional[Tuple[int, Dict[str, Any]]]:
+            # 先頭のアカウントから順に見て、取り出したアカウントは後ろに回す (ラウンドロビン)
+            for account in list(queues):
+                if in_flight[account] >= per_account:
+                    continue
+                queue = queues.pop(account)
+                item = queue.popleft()
+                if queue:
+                    queues[account] = queue
+                return item
+            return None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                yield from fill()
+                while len(pending) < max_workers:
+                    item = next_job()
+                    if item is None:
+                        break
+                    in_flight[item[1]["account"]] += 1
+                    pending[executor.submit(run, item[1])] = item
+                if not pending:
+                    return
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, job = pending.pop(future)
+                    in_flight[job["account"]] -= 1
+                    buffered -= 1
+                    result, elapsed = future.result()
+                    yield report(index, job, result, elapsed)
+
+
+def _unknown_account(account: Any) -> Dict[str, Any]:
+    return {"ok": False, "error": {"type": "UnknownAccount", "message": f"account not registered: {account!r}", "where": "account_pool"}}
@@ -0,0 +1,352 @@
+from __future__ import annotations
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .async_http import AsyncHttpClient
+from .auth import AuthManager
+from .images import ImageManager
+from .image_cache import ImageCache
+from .image_optimizer import ImageOptimizer
+from .instrumentation import Instrumentation
+from .magazines import MagazineResolver
+from .markdown_parser import MarkdownSource, parser_class
+from .rate_limit import RateLimiter
+from .retry import RetryPolicy
+from ._publish_common import (
+    CREATE_NOTE_URL,
+    DEFAULT_HEADERS,
+    _created_note,
+    _body_length,
+    _draft_request,
+    _draft_result,
+    _draft_save_url,
+    _publish_payload,
+    _has_note,
+    _published_result,
+    _report,
+    _resumed_note,
+    _with_resume,
+)
+
+
+async def _atimed(timings: Dict[str, float], stage: str, coro: Awaitable[Any]) -> Any:
+    t0 = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[stage] = time.perf_counter() - t0
+
+
+class AsyncNoteClient2:
+    """
+    NoteClient2 の asyncio 版
+
+    - publish() は await 可能で、1 つのイベントループから複数の投稿を並行に流せる
+    - 記事内画像とマガジン解決は投稿内でも並行に実行する
+    - 戻り値の dict 仕様は NoteClient2.publish() と同じ
+    """
+
+    def __init__(
+        self,
+        email: str,
+        password: str,
+        user_urlname: str,
+        session_file: str = "session.json",
+        limit_per_host: int = 10,
+        image_concurrency: int = 4,
+        image_cache: Optional[ImageCache] = None,
+        image_optimizer: Optional[ImageOptimizer] = None,
+        magazine_cache_file: Optional[str] = None,
+        magazine_ttl: float = 24 * 3600,
+        revalidate_interval: float = 3600.0,
+        fast_login: bool = False,
+        login_state_file: Optional[str] = None,
+        user_data_dir: Optional[str] = None,
+        parser_engine: str = "default",
+        id_strategy: str = "random",
+        pipeline: bool = False,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        instrumentation: Optional[Instrumentation] = None,
+    ):
+        self.email = email
+        self.password = password
+        self.user_urlname = user_urlname
+        self.pipeline = pipeline
+        self.retry_policy = retry_policy
+        self.instrumentation = instrumentation or Instrumentation()
+
+        self.cookies: Dict[str, str] = {}
+        self.headers: Dict[str, str] = dict(DEFAULT_HEADERS)
+
+        self.http = AsyncHttpClient(
+            self.headers,
+            self.cookies,
+            limit_per_host=limit_per_host,
+            rate_limiter=rate_limiter,
+            retry_policy=retry_policy,
+            instrumentation=self.instrumentation,
+        )
+        self.auth = AuthManager(
+            email,
+            password,
+            session_file,
+            self.headers,
+            revalidate_interval=revalidate_interval,
+            fast_login=fast_login,
+            storage_state_file=login_state_file,
+            user_data_dir=user_data_dir,
+        )
+        self.images = ImageManager(cache=image_cache, optimizer=image_optimizer)
+        self.magazines = MagazineResolver(cache_file=magazine_cache_file, ttl=magazine_ttl)
+        self.parser = parser_class(parser_engine)(self.images, image_concurrency=image_concurrency, id_strategy=id_strategy)
+        self.http.set_auth_handler(self._reauthenticate)
+
+    async def close(self) -> None:
+        await self.http.close()
+
+    async def __aenter__(self) -> "AsyncNoteClient2":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    def _sync_cookies(self) -> None:
+        self.cookies = dict(self.auth.cookies)
+        self.http.set_cookies(self.cookies)
+
+    async def _reauthenticate(self) -> bool:
+        # AsyncHttpClient から 401/403 のときに呼ばれる
+        result = await self.auth.arefresh(self.http)
+        if not result.get("ok"):
+            return False
+        self._sync_cookies()
+        return True
+
+    async def _draft_save(
+        self,
+        note_id: int,
+        title: str,
+        body_html: str,
+        image_keys: List[str],
+        body_length: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        req = _draft_request(self.cookies, title, body_html, image_keys, body_length)
+        resp = await self.http.post(_draft_save_url(note_id), headers=req["headers"], json=req["json"], idempotent=True, body="discard")
+        if not resp.get("ok"):
+            return {"ok": False, "error": {"type": "DraftSaveFailed", "status_code": resp.get("status_code"), "detail": resp.get("text")}}
+        return {"ok": True}
+
+    async def publish(
+        self,
+        title: str,
+        md_file_path: MarkdownSource,
+        eyecatch_path: Optional[str] = None,
+        hashtags: Optional[List[str]] = None,
+        price: int = 0,
+        magazine_key: Optional[List[str]] = None,
+        is_publish: bool = False,
+        resume: Optional[Dict[str, Any]] = None,
+        progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """resume / progress は NoteClient2.publish() と同じ"""
+        # 1) Auth
+        auth_timings: Dict[str, float] = {}
+        auth_result = await _atimed(auth_timings, "auth", self.auth.aprepare(self.http))
+        self.instrumentation.stages(auth_timings, bool(auth_result.get("ok")))
+        if not auth_result.get("ok"):
+            return auth_result
+        self._sync_cookies()
+
+        # NoteClient2._publish_authed() と同じく、一時的な失敗は同じ下書きで続きからやり直す
+        started = time.perf_counter()
+        attempts = self.retry_policy.publish_attempts if self.retry_policy else 1
+        for attempt in range(1, attempts + 1):
+            result = await self._publish_once(title, md_file_path, eyecatch_path, hashtags, price, magazine_key, is_publish, resume, progress)
+            resume = (result.get("error") or {}).get("resume")
+            if (
+                result.get("ok")
+                or resume is None
+                or attempt == attempts
+                or not self.retry_policy.is_transient(result)
+                or not isinstance(md_file_path, (str, os.PathLike))
+            ):
+                break
+            await asyncio.sleep(self.retry_policy.delay(attempt))
+        self.instrumentation.publish(result, time.perf_counter() - started)
+        if result.get("ok"):
+            result["data"]["timings"]["auth"] = auth_timings["auth"]
+        return result
+
+    async def _publish_once(
+        self,
+        title: str,
+        md_file_path: MarkdownSource,
+        eyecatch_path: Optional[str],
+        hashtags: Optional[List[str]],
+        price: int,
+        magazine_key: Optional[List[str]],
+        is_publish: bool,
+        resume: Optional[Dict[str, Any]],
+        progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        hashtags = hashtags or []
+        magazine_key = magazine_key or []
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+
+        # 2) Parse markdown (images) / 3) Resolve magazines / 4) Create note / 5) Eyecatch
+        # Markdown の誤りや画像ファイルが無いといったローカルで分かる失敗は、記事を作る前に返す (空の下書きを残さない)
+        prepared = await self._prepare_stage(md_file_path, timings, resume)
+        if not prepared.get("ok"):
+            self.instrumentation.stages(timings, False)
+            return _with_resume(prepared, _resumed_note(resume)["data"]) if _has_note(resume) else prepared
+        parse = self._parse_stage(md_file_path, prepared, timings, resume, progress)
+        magazines = self._magazine_stage(magazine_key, timings, resume, progress)
+        created: Optional[Dict[str, Any]] = None
+        if self.pipeline:
+            parsed, magazines, created = await asyncio.gather(parse, magazines, self._create_note(eyecatch_path, timings, resume, progress))
+        else:
+            parsed, magazines = await asyncio.gather(parse, magazines)
+
+        # 下書きがすでにあれば、失敗に再開用の状態を付ける
+        if created is not None and created.get("ok"):
+            note = created["data"]
+        else:
+            note = _resumed_note(resume)["data"] if _has_note(resume) else None
+        for stage in (parsed, magazines):
+            if not stage.get("ok"):
+                self.instrumentation.stages(timings, False)
+                return _with_resume(stage, note) if note else stage
+        if created is None:
+            created = await self._create_note(eyecatch_path, timings, resume, progress)
+        if not created.get("ok"):
+            self.instrumentation.stages(timings, False)
+            return created
+
+        # 6) - 8) draft save or temp save + final PUT
+        stages_data = {**created["data"], "parsed": parsed["data"], "magazine_ids": magazines["data"]["magazine_ids"]}
+        result = await self._save_note(title, stages_data, hashtags, price, is_publish, timings)
+        self.instrumentation.stages(timings, bool(result.get("ok")))
+        if not result.get("ok"):
+            return _with_resume(result, stages_data)
+        timings["total"] = time.perf_counter() - started
+        result["data"]["timings"] = timings
+        return result
+
+    async def _prepare_stage(
+        self,
+        md_file_path: MarkdownSource,
+        timings: Dict[str, float],
+        resume: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        # parse のうちローカルで済む部分 (IR 化と画像ファイルの確認)。再開で parse 済みなら data は None
+        if resume and resume.get("parsed") is not None:
+            return {"ok": True, "data": None}
+        # ファイルの読み込みとパースは同期処理なので、イベントループを止めないようスレッドで動かす
+        return await _atimed(timings, "parse", asyncio.to_thread(self.parser.prepare, md_file_path))
+
+    async def _parse_stage(
+        self,
+        md_file_path: MarkdownSource,
+        prepared: Dict[str, Any],
+        timings: Dict[str, float],
+        resume: Optional[Dict[str, Any]],
+        progress: Optional[Callable[[str, Dict[str, Any]], None]],
+    ) -> Dict[str, Any]:
+        if resume and resume.get("parsed") is not None:
+            return {"ok": True, "data": resume["parsed"]}
+        # timings["parse"] は _prepare_stage() の分と合わせた parse 全体
+        local = timings.get("parse", 0.0)
+        md_name = self.parser._source_name(md_file_path)
+        parsed = await _atimed(timings, "parse", self.parser.arender_ir(self.http, self.headers, prepared["data"], md_path=md_name, consume=True))
+        timings["parse"] += local
+        if parsed.get("ok"):
+            _report(progress, "parse", {"parsed": parsed["data"]})
+        return parsed
+
+    async def _magazine_stage(
+        self,
+        magazine_key: List[str],
+        timings: Dict[str, float],
+        resume: Optional[Dict[str, Any]],
+        progress: Optional[Callable[[str, Dict[str, Any]], None]],
+    ) -> Dict[str, Any]:
+        if resume and resume.get("magazine_ids") is not None:
+            return {"ok": True, "data": {"magazine_ids": resume["magazine_ids"]}}
+        magazines = await _atimed(timings, "magazines", self.magazines.aget_magazine_ids(self.http, self.user_urlname, self.headers, magazine_key))
+        if magazines.get("ok"):
+            _report(progress, "magazines", {"magazine_ids": magazines["data"]["magazine_ids"]})
+        return magazines
+
+    async def _create_note(
+        self,
+        eyecatch_path: Optional[str],
+        timings: Dict[str, float],
+        resume: Optional[Dict[str, Any]] = None,
+        progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        # 4) Create note skeleton (再開時は作成済みの下書きを使う)
+        if _has_note(resume):
+            created = _resumed_note(resume)
+        else:
+            created = _created_note(await _atimed(timings, "create", self.http.post(CREATE_NOTE_URL, headers=self.headers, json={"template_key": None})))
+            if not created.get("ok"):
+                return created
+            created["data"]["eyecatch_uploaded"] = False
+            _report(progress, "create", {k: created["data"][k] for k in ("note_id", "note_key", "note_data")})
+
+        # 5) Eyecatch
+        if eyecatch_path and not created["data"]["eyecatch_uploaded"]:
+            eye = await _atimed(timings, "eyecatch", self.images.aupload_eyecatch(self.http, self.headers, created["data"]["note_id"], eyecatch_path))
+            if not eye.get("ok"):
+                return _with_resume(eye, created["data"])
+            created["data"]["eyecatch_uploaded"] = True
+            _report(progress, "eyecatch", {})
+        return created
+
+    async def _save_note(
+        self,
+        title: str,
+        stages: Dict[str, Any],
+        hashtags: List[str],
+        price: int,
+        is_publish: bool,
+        timings: Dict[str, float],
+    ) -> Dict[str, Any]:
+        data = stages["parsed"]
+        note_id = stages["note_id"]
+        note_key = stages["note_key"]
+
+        # 6) Draft only
+        if not is_publish:
+            draft = await _atimed(timings, "draft_save", self._draft_save(note_id, title, data["combined_html"], data["image_keys"], _body_length(data)))
+            if not draft.get("ok"):
+                return draft
+            return _draft_result(note_id, note_key)
+
+        # 7) Temp save (draft_save)
+        temp = await _atimed(timings, "temp_save", self.http.post(
+            _draft_save_url(note_id),
+            headers=self.headers,
+            json={"body": data["combined_html"], "name": title, "index": True},
+            idempotent=True,
+            body="discard",
+        ))
+        if not temp.get("ok"):
+            return {"ok": False, "error": {"type": "TempDraftSaveFailed", "status_code": temp.get("status_code"), "detail": temp.get("text")}}
+
+        # 8) Final PUT
+        payload = _publish_payload(stages["note_data"], title, data, hashtags, price, stages["magazine_ids"])
+        put = await _atimed(timings, "put", self.http.put(
+            f"https://note.com/api/v1/text_notes/{note_id}",
+            headers=self.headers,
+            json=payload,
+            body="discard",
+        ))
+        if not put.get("ok"):
+            return {"ok": False, "error": {"type": "PublishFailed", "status_code": put.get("status_code"), "detail": put.get("text")}}
+
+        return _published_result(self.user_urlname, note_id, note_key, price)
@@ -0,0 +1,300 @@
+from __future__ import annotations
+import asyncio
+import contextvars
+import json
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+import aiohttp
+
+from .http import AUTH_STATUSES, HttpResponse, check_body_mode, content_length, is_note_host, override_url, refresh_xsrf
+from .instrumentation import Instrumentation
+from .rate_limit import RateLimiter
+from .retry import RetryPolicy
+
+_refreshing: contextvars.ContextVar[bool] = contextvars.ContextVar("noteclient2_refreshing", default=False)
+
+
+class AsyncHttpResponse(HttpResponse):
+    """
+    AsyncHttpClient の戻り値 (HttpResponse と同じく dict のように読め、text / json は読んだときにデコードする)
+
+    body="stream" の本文は async for chunk in resp.iter_chunked() か await resp.read() で読み、
+    読み終えたら close() する (読む前の text / json は RuntimeError)
+    """
+
+    __slots__ = ("_content", "_encoding")
+
+    def __init__(
+        self,
+        ok: bool,
+        status_code: int,
+        headers: Any = None,
+        content: Optional[bytes] = None,
+        encoding: str = "utf-8",
+        resp: Optional[aiohttp.ClientResponse] = None,
+    ):
+        super().__init__(ok, status_code, headers, resp)
+        self._content = content
+        self._encoding = encoding
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None and self._resp is not None:
+            raise RuntimeError("streamed body not read yet (await read() first)")
+        return self._content or b""
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.content.decode(self._encoding, errors="replace")
+        return self._text
+
+    def _load_json(self) -> Any:
+        content = self.content
+        if not content:
+            return None
+        try:
+            return json.loads(self._text if self._text is not None else content.decode(self._encoding, errors="replace"))
+        except Exception:
+            return None
+
+    async def iter_chunked(self, chunk_size: int = 65536) -> AsyncIterator[bytes]:
+        if self._resp is None:
+            return
+        async for chunk in self._resp.content.iter_chunked(chunk_size):
+            yield chunk
+
+    async def read(self) -> bytes:
+        if self._content is None and self._resp is not None:
+            self._content = await self._resp.read()
+            self._encoding = self._resp.get_encoding()
+            self.close()
+        return self.content
+
+    def iter_content(self, chunk_size: int = 65536) -> Any:
+        raise TypeError("use iter_chunked() on AsyncHttpResponse")
+
+    def close(self) -> None:
+        if self._resp is not None:
+            self._resp.release()
+
+    async def __aenter__(self) -> "AsyncHttpResponse":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class AsyncHttpClient:
+    """
+    HttpClient の asyncio 版 (aiohttp)
+
+    - 戻り値の仕様 (ok / status_code / text / json / error、body=) は HttpClient と同じ (成功時は AsyncHttpResponse)
+    - files= / data= / json= は requests と同じ形で受け取り、multipart に変換する
+    - 1 つの ClientSession (接続プール) を全リクエストで共有する
+    """
+
+    def __init__(
+        self,
+        base_headers: Dict[str, str],
+        cookies: Dict[str, str],
+        limit: int = 100,
+        limit_per_host: int = 10,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        instrumentation: Optional[Instrumentation] = None,
+        url_overrides: Optional[Dict[str, str]] = None,
+    ):
+        self.base_headers = dict(base_headers)
+        self.cookies = cookies
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.instrumentation = instrumentation or Instrumentation()
+        self.url_overrides = dict(url_overrides or {})
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.auth_handler: Optional[Callable[[], Awaitable[bool]]] = None
+
+    def set_cookies(self, cookies: Dict[str, str]) -> None:
+        self.cookies = cookies
+
+    def set_auth_handler(self, handler: Optional[Callable[[], Awaitable[bool]]]) -> None:
+        """HttpClient.set_auth_handler() と同じ。handler は async 関数"""
+        self.auth_handler = handler
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+            # Cookie はリクエストごとに渡すので、レスポンスの Cookie は保存しない
+            self._session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self) -> "AsyncHttpClient":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> Dict[str, Any]:
+        return await self._request("GET", url, (200,), headers, **kwargs)
+
+    async def post(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> Dict[str, Any]:
+        return await self._request("POST", url, (200, 201), headers, **kwargs)
+
+    async def put(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> Dict[str, Any]:
+        return await self._request("PUT", url, (200, 201), headers, **kwargs)
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        ok_statuses: Tuple[int, ...],
+        headers: Optional[Dict[str, str]] = None,
+        auth_retry: bool = True,
+        idempotent: Optional[bool] = None,
+        body: str = "read",
+        **kwargs,
+    ) -> Dict[str, Any]:
+        check_body_mode(body)
+        kwargs["body"] = body
+        result = await self._send_retrying(method, url, ok_statuses, headers, idempotent, **kwargs)
+        if auth_retry and result.get("status_code") in AUTH_STATUSES and self._can_refresh(url) and await self._refresh_auth():
+            result = await self._send_retrying(method, url, ok_statuses, refresh_xsrf(headers, self.cookies), idempotent, **kwargs)
+        return result
+
+    async def _send_retrying(
+        self,
+        method: str,
+        url: str,
+        ok_statuses: Tuple[int, ...],
+        headers: Optional[Dict[str, str]],
+        idempotent: Optional[bool],
+        **kwargs,
+    ) -> Dict[str, Any]:
+        # HttpClient._send_retrying() と同じ
+        attempt = 1
+        result = await self._send_throttled(method, url, ok_statuses, headers, **kwargs)
+        while self.retry_policy is not None and self.retry_policy.should_retry(method, result, attempt, idempotent):
+            await asyncio.sleep(self.retry_policy.delay(attempt))
+            attempt += 1
+            result = await self._send_throttled(method, url, ok_statuses, headers, **kwargs)
+        return result
+
+    async def _send_throttled(
+        self,
+        method: str,
+        url: str,
+        ok_statuses: Tuple[int, ...],
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        # HttpClient._send_throttled() と同じ
+        result = await self._send(method, url, ok_statuses, headers, **kwargs)
+        retries = self.rate_limiter.throttle_retries if self.rate_limiter else 0
+        while retries > 0 and result.get("status_code") == 429:
+            retries -= 1
+            result = await self._send(method, url, ok_statuses, headers, **kwargs)
+        return result
+
+    def _can_refresh(self, url: str) -> bool:
+        if self.auth_handler is None or _refreshing.get():
+            return False
+        return is_note_host(url)
+
+    async def _refresh_auth(self) -> bool:
+        # 再認証中の検証リクエストが 401 を返しても再帰しないようにする
+        token = _refreshing.set(True)
+        try:
+            return bool(await self.auth_handler())
+        except Exception:
+            return False
+        finally:
+            _refreshing.reset(token)
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        ok_statuses: Tuple[int, ...],
+        headers: Optional[Dict[str, str]] = None,
+        files: Optional[Dict[str, Tuple[Any, ...]]] = None,
+        data: Any = None,
+        body: str = "read",
+        **kwargs,
+    ) -> Dict[str, Any]:
+        url = override_url(url, self.url_overrides)
+        limit_key = await self.rate_limiter.aacquire(url) if self.rate_limiter else None
+        status_code: Optional[int] = None
+        retry_after: Optional[str] = None
+        started = time.perf_counter()
+        try:
+            if files:
+                data = self._to_form(data, files)
+            session = self._get_session()
+            resp = await session.request(
+                method,
+                url,
+                headers={**self.base_headers, **(headers or {})},
+                cookies=self.cookies,
+                data=data,
+                **kwargs,
+            )
+            streaming = False
+            try:
+                status_code = resp.status
+                retry_after = resp.headers.get("Retry-After")
+                ok = status_code in ok_statuses
+                if not ok or body == "read":
+                    content = await resp.read()
+                    received: Optional[int] = len(content)
+                    result = AsyncHttpResponse(ok, status_code, resp.headers, content, resp.get_encoding())
+                elif body == "discard":
+                    received = 0
+                    async for chunk in resp.content.iter_chunked(65536):
+                        received += len(chunk)
+                    result = AsyncHttpResponse(ok, status_code, resp.headers)
+                else:
+                    streaming = True
+                    received = content_length(resp.headers)
+                    result = AsyncHttpResponse(ok, status_code, resp.headers, resp=resp)
+            finally:
+                # stream 以外はここで接続をプールに戻す
+                if not streaming:
+                    resp.release()
+            self.instrumentation.http(
+                method,
+                url,
+                status_code,
+                time.perf_counter() - started,
+                bytes_sent=content_length(resp.request_info.headers),
+                bytes_received=received,
+            )
+            return result
+        except Exception as e:
+            self.instrumentation.http(method, url, None, time.perf_counter() - started, error=type(e).__name__)
+            return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": method, "url": url}}
+        finally:
+            if limit_key is not None:
+                self.rate_limiter.release(limit_key, status_code, retry_after)
+
+    @staticmethod
+    def _to_form(data: Any, files: Dict[str, Tuple[Any, ...]]) -> aiohttp.FormData:
+        # requests の files= 形式 (filename, content[, content_type]) を FormData に変換
+        form = aiohttp.FormData()
+        for name, value in (data or {}).items():
+            form.add_field(name, str(value))
+        for name, spec in files.items():
+            filename, content = spec[0], spec[1]
+            content_type = spec[2] if len(spec) > 2 else None
+            if filename is None:
+                form.add_field(name, str(content))
+            else:
+                form.add_field(name, content, filename=filename, content_type=content_type)
+        return form
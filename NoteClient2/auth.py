@@ -2,22 +2,89 @@ from __future__ import annotations
 
 import os
 import json
+import threading
+import time
+import urllib.parse
 from datetime import datetime
 from time import sleep
-from typing import Any, Dict, Optional
-
-from playwright.sync_api import Playwright, sync_playwright, expect
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
 from .http import HttpClient
 
+if TYPE_CHECKING:
+    import asyncio
+
+    from playwright.sync_api import Playwright
+
+VALIDATE_URL = "https://note.com/api/v3/users/user_features"
+LOGIN_URL = "https://note.com/login?redirectPath=https%3A%2F%2Fnote.com%2F"
+LOGIN_TIMEOUT_MS = 15000
+
+# fast_login で読み込まないリソース
+BLOCKED_RESOURCE_TYPES = ("image", "media", "font")
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "facebook.net",
+    "connect.facebook.net",
+    "analytics.twitter.com",
+    "bat.bing.com",
+    "clarity.ms",
+)
+
 class AuthManager:
-    def __init__(self, email: str, password: str, session_file: str, headers: Dict[str, str]):
+    def __init__(
+        self,
+        email: str,
+        password: str,
+        session_file: str,
+        headers: Dict[str, str],
+        revalidate_interval: float = 3600.0,
+        fast_login: bool = False,
+        storage_state_file: Optional[str] = None,
+        user_data_dir: Optional[str] = None,
+    ):
         self.email = email
         self.password = password
         self.session_file = session_file
         self.headers = dict(headers)
         self.cookies: Dict[str, str] = {}
 
+        # ログイン (Playwright) の設定
+        # - fast_login: 固定 sleep / networkidle 待ちをやめ、画像・フォント・計測タグを読み込まない
+        # - storage_state_file: ログイン後のブラウザ状態を保存し、次回のログインで再利用する (fast_login のときだけ)
+        # - user_data_dir: 永続プロファイルでブラウザを起動する (fast_login のときだけ)
+        if (storage_state_file or user_data_dir) and not fast_login:
+            raise ValueError("storage_state_file (login_state_file) and user_data_dir require fast_login=True")
+        self.fast_login = fast_login
+        self.storage_state_file = storage_state_file
+        self.user_data_dir = user_data_dir
+        self.last_login_seconds: Optional[float] = None
+
+        # 検証済みセッションはメモリに持ち、revalidate_interval 秒までは再検証しない
+        self.revalidate_interval = revalidate_interval
+        self.validated_at: Optional[float] = None
+        self._lock = threading.RLock()
+        self._async_lock: Optional[asyncio.Lock] = None
+
+    def is_fresh(self) -> bool:
+        return (
+            bool(self.cookies)
+            and self.validated_at is not None
+            and time.monotonic() - self.validated_at < self.revalidate_interval
+        )
+
+    def fresh_for(self) -> float:
+        """メモリ上の検証結果をあと何秒使えるか (未検証なら 0)"""
+        if not self.cookies or self.validated_at is None:
+            return 0.0
+        return max(0.0, self.revalidate_interval - (time.monotonic() - self.validated_at))
+
+    def invalidate(self) -> None:
+        self.validated_at = None
+
     def load_session(self) -> Dict[str, Any]:
         if not os.path.exists(self.session_file):
             return {"ok": False, "error": {"type": "SessionNotFound", "message": "session file not found"}}
@@ -40,8 +107,11 @@ class AuthManager:
     def validate_session(self, http: HttpClient) -> Dict[str, Any]:
         if not self.cookies:
             return {"ok": False, "error": {"type": "NoCookies", "message": "cookies not set"}}
-        url = "https://note.com/api/v3/users/user_features"
-        resp = http.get(url)
+        resp = http.get(VALIDATE_URL, auth_retry=False, body="discard")
+        return self._validation_result(resp)
+
+    @staticmethod
+    def _validation_result(resp: Dict[str, Any]) -> Dict[str, Any]:
         if resp.get("ok"):
             return {"ok": True}
         return {
@@ -54,7 +124,57 @@ class AuthManager:
             },
         }
 
-    def prepare(self, http: HttpClient) -> Dict[str, Any]:
+    async def avalidate_session(self, http: Any) -> Dict[str, Any]:
+        """validate_session() の asyncio 版 (http は AsyncHttpClient)"""
+        if not self.cookies:
+            return {"ok": False, "error": {"type": "NoCookies", "message": "cookies not set"}}
+        resp = await http.get(VALIDATE_URL, auth_retry=False, body="discard")
+        return self._validation_result(resp)
+
+    def prepare(self, http: HttpClient, force: bool = False) -> Dict[str, Any]:
+        """
+        セッションを使える状態にする
+
+        - 検証から revalidate_interval 秒以内ならメモリ上のセッションをそのまま使う
+        - force=True ならメモリ上の状態を無視して session.json の検証 / 再ログインから行う
+        """
+        with self._lock:
+            if not force and self.is_fresh():
+                http.set_cookies(self.cookies)
+                return {"ok": True, "data": {"auth": "memory"}}
+            result = self._prepare(http)
+            self.validated_at = time.monotonic() if result.get("ok") else None
+            return result
+
+    def refresh(self, http: HttpClient) -> Dict[str, Any]:
+        """
+        API が 401/403 を返したときの再認証 (検証 -> 必要なら再ログイン)
+
+        同時に複数のリクエストが失敗しても、再ログインは 1 回で済ませる
+        """
+        seen = self.validated_at
+        with self._lock:
+            if seen != self.validated_at and self.is_fresh():
+                http.set_cookies(self.cookies)
+                return {"ok": True, "data": {"auth": "memory"}}
+            return self.prepare(http, force=True)
+
+    async def arefresh(self, http: Any) -> Dict[str, Any]:
+        """refresh() の asyncio 版"""
+        import asyncio
+
+        seen = self.validated_at
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            if seen != self.validated_at and self.is_fresh():
+                http.set_cookies(self.cookies)
+                return {"ok": True, "data": {"auth": "memory"}}
+            result = await self._aprepare(http)
+            self.validated_at = time.monotonic() if result.get("ok") else None
+            return result
+
+    def _prepare(self, http: HttpClient) -> Dict[str, Any]:
         # 1) session.json があれば使う
         session = self.load_session()
         if session.get("ok"):
@@ -68,40 +188,92 @@ class AuthManager:
                 return {"ok": True, "data": {"auth": "session"}}
 
             # 期限などの情報を返す（ログ出しせず、戻り値へ）
-            ts = data.get("timestamp")
-            hours = None
-            if ts:
-                try:
-                    saved_time = datetime.fromisoformat(ts)
-                    hours = (datetime.now() - saved_time).total_seconds() / 3600
-                except Exception:
-                    hours = None
+            hours = self._session_hours(data)
 
             # セッション無効なら再ログインへ
             relogin = self._get_cookies()
-            if not relogin.get("ok"):
-                relogin["error"]["session_hours"] = hours
-                return relogin
-
-            http.set_cookies(self.cookies)
-            self.save_session()
-            return {"ok": True, "data": {"auth": "relogin", "session_hours": hours}}
+            return self._after_login(http, relogin, "relogin", hours)
 
         # 2) session が無い / 読めない -> ログイン
         relogin = self._get_cookies()
+        return self._after_login(http, relogin, "login")
+
+    async def aprepare(self, http: Any, force: bool = False) -> Dict[str, Any]:
+        """
+        prepare() の asyncio 版
+
+        - セッション検証は AsyncHttpClient で行う
+        - Playwright ログインはブロッキングなのでスレッドに逃がす
+        """
+        import asyncio
+
+        if not force and self.is_fresh():
+            http.set_cookies(self.cookies)
+            return {"ok": True, "data": {"auth": "memory"}}
+
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            # 待っている間に他のタスクが検証を済ませていればそれを使う
+            if not force and self.is_fresh():
+                http.set_cookies(self.cookies)
+                return {"ok": True, "data": {"auth": "memory"}}
+            result = await self._aprepare(http)
+            self.validated_at = time.monotonic() if result.get("ok") else None
+            return result
+
+    async def _aprepare(self, http: Any) -> Dict[str, Any]:
+        import asyncio
+
+        session = self.load_session()
+        if session.get("ok"):
+            data = session["data"]
+            self.cookies = data.get("cookies") or {}
+            http.set_cookies(self.cookies)
+
+            valid = await self.avalidate_session(http)
+            if valid.get("ok"):
+                return {"ok": True, "data": {"auth": "session"}}
+
+            hours = self._session_hours(data)
+            relogin = await asyncio.to_thread(self._get_cookies)
+            return self._after_login(http, relogin, "relogin", hours)
+
+        relogin = await asyncio.to_thread(self._get_cookies)
+        return self._after_login(http, relogin, "login")
+
+    @staticmethod
+    def _session_hours(data: Dict[str, Any]) -> Optional[float]:
+        ts = data.get("timestamp")
+        if not ts:
+            return None
+        try:
+            saved_time = datetime.fromisoformat(ts)
+            return (datetime.now() - saved_time).total_seconds() / 3600
+        except Exception:
+            return None
+
+    def _after_login(self, http: Any, relogin: Dict[str, Any], mode: str, hours: Optional[float] = None) -> Dict[str, Any]:
         if not relogin.get("ok"):
+            if mode == "relogin":
+                relogin["error"]["session_hours"] = hours
             return relogin
 
         http.set_cookies(self.cookies)
         self.save_session()
-        return {"ok": True, "data": {"auth": "login"}}
+        login_seconds = (relogin.get("data") or {}).get("login_seconds")
+        if mode == "relogin":
+            return {"ok": True, "data": {"auth": "relogin", "session_hours": hours, "login_seconds": login_seconds}}
+        return {"ok": True, "data": {"auth": mode, "login_seconds": login_seconds}}
 
     def _login(self, playwright: Playwright, email_username: str, password: str) -> Any:
+        from playwright.sync_api import expect
+
         browser = playwright.chromium.launch(headless=True)
         context = browser.new_context()
         page = context.new_page()
 
-        page.goto("https://note.com/login?redirectPath=https%3A%2F%2Fnote.com%2F")
+        page.goto(LOGIN_URL)
         page.wait_for_load_state("domcontentloaded")
         sleep(2)
 
@@ -134,11 +306,84 @@ class AuthManager:
 
         return cookies
 
+    def _fast_login(self, playwright: Playwright, email_username: str, password: str) -> Any:
+        from playwright.sync_api import expect
+
+        if self.user_data_dir:
+            browser = None
+            context = playwright.chromium.launch_persistent_context(self.user_data_dir, headless=True)
+        else:
+            browser = playwright.chromium.launch(headless=True)
+            state = self.storage_state_file if self.storage_state_file and os.path.exists(self.storage_state_file) else None
+            context = browser.new_context(storage_state=state)
+
+        try:
+            context.route("**/*", self._route_login_request)
+            page = context.new_page()
+            page.goto(LOGIN_URL, wait_until="domcontentloaded")
+
+            # 保存済みの状態でログイン済みなら、ログインページからリダイレクトされる
+            email_box = page.get_by_role("textbox", name="mail@example.com or note ID")
+            if self._on_login_page(page.url):
+                try:
+                    email_box.wait_for(state="visible", timeout=LOGIN_TIMEOUT_MS)
+                except Exception:
+                    if self._on_login_page(page.url):
+                        raise
+
+            if self._on_login_page(page.url):
+                email_box.fill(email_username)
+                expect(email_box).to_have_value(email_username, timeout=3000)
+
+                password_box = page.get_by_role("textbox", name="パスワード")
+                password_box.fill(password)
+                expect(password_box).to_have_value(password, timeout=3000)
+
+                page.get_by_role("button", name="ログイン").click()
+                page.wait_for_url(lambda url: not self._on_login_page(url), timeout=LOGIN_TIMEOUT_MS)
+
+            if self.storage_state_file:
+                context.storage_state(path=self.storage_state_file)
+            return context.cookies()
+        finally:
+            context.close()
+            if browser is not None:
+                browser.close()
+
+    @staticmethod
+    def _on_login_page(url: str) -> bool:
+        return urllib.parse.urlsplit(url).path.rstrip("/") == "/login"
+
+    @staticmethod
+    def _route_login_request(route: Any) -> None:
+        request = route.request
+        host = urllib.parse.urlsplit(request.url).hostname or ""
+        if request.resource_type in BLOCKED_RESOURCE_TYPES or any(host == h or host.endswith("." + h) for h in BLOCKED_HOSTS):
+            route.abort()
+        else:
+            route.continue_()
+
     def _get_cookies(self) -> Dict[str, Any]:
+        started = time.perf_counter()
         try:
+            # Playwright は重いので、実際にログインするときだけ読み込む
+            from playwright.sync_api import sync_playwright
+
             with sync_playwright() as playwright:
-                raw = self._login(playwright, self.email, self.password)
+                if self.fast_login:
+                    raw = self._fast_login(playwright, self.email, self.password)
+                else:
+                    raw = self._login(playwright, self.email, self.password)
                 self.cookies = {c["name"]: c["value"] for c in raw}
-            return {"ok": True, "data": {"cookies": list(self.cookies.keys())}}
+            self.last_login_seconds = time.perf_counter() - started
+            return {"ok": True, "data": {"cookies": list(self.cookies.keys()), "login_seconds": self.last_login_seconds}}
         except Exception as e:
-            return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "playwright_login"}}
+            return {
+                "ok": False,
+                "error": {
+                    "type": type(e).__name__,
+                    "message": str(e),
+                    "where": "playwright_login",
+                    "login_seconds": time.perf_counter() - started,
+                },
+            }
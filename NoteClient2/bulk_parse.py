@@ -0,0 +1,163 @@
+from __future__ import annotations
+import collections
+import itertools
+import os
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .markdown_parser import MarkdownParser, parser_class
+from .note_ir import NoteIR, render
+from .utils import ID_STRATEGIES
+
+# ファイルパス、または行のリスト (ストリームはプロセスをまたげない)
+BulkSource = Union[str, List[str]]
+
+IMAGE_MODES = ("defer", "stub")
+
+
+# ワーカープロセスごとに 1 つ (initializer で作る)
+_worker: Optional[MarkdownParser] = None
+_images = "defer"
+
+
+def _init_worker(engine_class: type, images: str, id_strategy: str) -> None:
+    global _worker, _images
+    # ワーカーでは画像を扱わない (defer は IR のまま返し、stub はパスをそのまま埋める)
+    _worker = engine_class(None, image_concurrency=1, id_strategy=id_strategy)
+    _images = images
+
+
+def _parse_one(source: BulkSource) -> Dict[str, Any]:
+    try:
+        result = _worker.parse_ir(source)
+        if not result.get("ok") or _images == "defer":
+            return result
+        ir: NoteIR = result["data"]
+        data = render(ir, {p: {"url": p, "path": p} for p in ir.image_paths()}, consume=True)["data"]
+    except Exception as e:
+        return _error(e)
+    # combined_html は free_html + pay_html なので送らず、受け取った側で作り直す
+    del data["combined_html"]
+    return {"ok": True, "data": data}
+
+
+def _parse_chunk(sources: List[BulkSource]) -> List[Dict[str, Any]]:
+    return [_parse_one(source) for source in sources]
+
+
+def _error(e: BaseException) -> Dict[str, Any]:
+    return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "bulk_parse"}}
+
+
+class BulkParser:
+    """
+    大量の Markdown をプロセスプールで並列にパースする
+
+    - ワーカーでは画像をアップロードしない
+      images="defer": data に NoteIR (parse_ir() と同じ) を返す。HTML より小さいのでプロセス間で送る量が少なく、
+                      ir.image_paths() をアップロードしてから fill_images() で描画すると parse() と同じ結果になる
+      images="stub":  画像のパスをそのまま URL / キーにして、ワーカーで HTML まで描画する (検証やプレビュー向け)
+    - parse_many() は入力順に {"index", "source", "result"} を yield する。result は parse() / parse_ir() と同じ {"ok", "data" / "error"}
+      (ワーカー内の例外やプロセスの異常終了も error にする)
+    - sources は chunksize 件ずつワーカーに送り、未完了は processes * 2 チャンクまでに抑える (sources はジェネレータでもよい)
+    - processes=1 (または 1 件だけ) ならプロセスを使わずにその場でパースする
+    - id_strategy="content" なら、どのプロセスでパースしても同じ Markdown から同じ HTML になる
+
+        bulk = BulkParser(processes=4)
+        for item in bulk.parse_many(paths):
+            ir = item["result"]["data"]
+            uploads = {p: client.images.upload_image(client.http, headers, p)["data"] for p in ir.image_paths()}
+            parsed = BulkParser.fill_images(ir, uploads)
+    """
+
+    def __init__(
+        self,
+        engine: str = "default",
+        processes: Optional[int] = None,
+        images: str = "defer",
+        chunksize: int = 4,
+        id_strategy: str = "random",
+    ):
+        if images not in IMAGE_MODES:
+            raise ValueError(f"unknown images mode: {images!r} (choose from {', '.join(IMAGE_MODES)})")
+        if id_strategy not in ID_STRATEGIES:
+            raise ValueError(f"unknown id_strategy: {id_strategy!r} (choose from {', '.join(ID_STRATEGIES)})")
+        if chunksize < 1:
+            raise ValueError(f"chunksize must be >= 1: {chunksize!r}")
+        self.parser_class = parser_class(engine)
+        self.processes = processes or os.cpu_count() or 1
+        self.images = images
+        self.chunksize = chunksize
+        self.id_strategy = id_strategy
+
+    def parse_many(self, sources: Iterable[Union[BulkSource, "os.PathLike[str]"]]) -> Iterator[Dict[str, Any]]:
+        source_iter: Iterator[BulkSource] = (os.fspath(s) if isinstance(s, os.PathLike) else s for s in sources)
+        # 1 件だけならプロセスを起こさない (2 件目まで読んで確かめる)
+        head = list(itertools.islice(source_iter, 2))
+        source_iter = itertools.chain(head, source_iter)
+        if self.processes <= 1 or len(head) <= 1:
+            _init_worker(self.parser_class, self.images, self.id_strategy)
+            for index, source in enumerate(source_iter):
+                yield _item(index, source, self._received(_parse_one(source)))
+            return
+
+        # multiprocessing は import が重いので、プロセスを使うときだけ読み込む
+        from concurrent.futures import Future, ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+
+        def chunks() -> Iterator[List[BulkSource]]:
+            while True:
+                chunk = list(itertools.islice(source_iter, self.chunksize))
+                if not chunk:
+                    return
+                yield chunk
+
+        chunk_iter = chunks()
+        # 入力順に返すので先頭から待つ (未完了のチャンクは processes * 2 個まで)
+        pending: Deque[Tuple[Future, List[BulkSource]]] = collections.deque()
+        index = 0
+        with ProcessPoolExecutor(
+            max_workers=self.processes,
+            initializer=_init_worker,
+            initargs=(self.parser_class, self.images, self.id_strategy),
+        ) as executor:
+            try:
+                for chunk in itertools.islice(chunk_iter, self.processes * 2):
+                    pending.append((executor.submit(_parse_chunk, chunk), chunk))
+                while pending:
+                    future, chunk = pending[0]
+                    results = future.result()
+                    pending.popleft()
+                    for source, result in zip(chunk, results):
+                        yield _item(index, source, self._received(result))
+                        index += 1
+                    for next_chunk in itertools.islice(chunk_iter, 1):
+                        pending.append((executor.submit(_parse_chunk, next_chunk), next_chunk))
+            except BrokenProcessPool as e:
+                # 残りは (まだ読んでいない入力も) すべて error にする
+                for _, chunk in pending:
+                    for source in chunk:
+                        yield _item(index, source, _error(e))
+                        index += 1
+                for source in source_iter:
+                    yield _item(index, source, _error(e))
+                    index += 1
+
+    def _received(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        if result.get("ok") and self.images == "stub":
+            data = result["data"]
+            data["combined_html"] = data["free_html"] + data["pay_html"]
+        return result
+
+    @staticmethod
+    def fill_images(ir: NoteIR, uploads: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        images="defer" の IR に画像のアップロード結果を埋めて描画し、parse() の data と同じものを返す
+
+        uploads は {画像パス: ImageManager.upload_image() の data} (ir.image_paths() をすべて含む)。IR は書き換えない
+        """
+        return render(ir, uploads)["data"]
+
+
+def _item(index: int, source: BulkSource, result: Dict[str, Any]) -> Dict[str, Any]:
+    # 行のリストは送り返さない (結果を小さく保つ)
+    return {"index": index, "source": source if isinstance(source, str) else None, "result": result}
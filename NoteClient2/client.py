@@ -1,61 +1,142 @@
 from __future__ import annotations
-import re
-from typing import Any, Dict, List, Optional, Union
+import itertools
+import os
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from .http import HttpClient
+from .http import HttpClient, SessionPool
 from .auth import AuthManager
 from .images import ImageManager
+from .image_optimizer import ImageOptimizer
+from .instrumentation import Instrumentation
 from .magazines import MagazineResolver
-from .markdown_parser import MarkdownParser
-from .utils import xsrf_from_cookies
+from .markdown_parser import MarkdownSource, parser_class
+from .rate_limit import RateLimiter
+from .retry import RetryPolicy
+from ._publish_common import (
+    CREATE_NOTE_URL,
+    DEFAULT_HEADERS,
+    _body_length,
+    _created_note,
+    _draft_request,
+    _draft_result,
+    _draft_save_url,
+    _has_note,
+    _publish_payload,
+    _published_result,
+    _report,
+    _resumed_note,
+    _timed,
+    _with_resume,
+)
+
+# sqlite3 / concurrent.futures は使うときだけ読み込む (import NoteClient2 を軽く保つ)
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    from .image_cache import ImageCache
+    from .job_store import JobStore
+    from .note_cache import NoteCache
+
 
 class NoteClient2:
-    def __init__(self, email: str, password: str, user_urlname: str, session_file: str = "session.json"):
+    def __init__(
+        self,
+        email: str,
+        password: str,
+        user_urlname: str,
+        session_file: str = "session.json",
+        pool_maxsize: int = 10,
+        image_concurrency: int = 4,
+        image_cache: Optional[ImageCache] = None,
+        image_optimizer: Optional[ImageOptimizer] = None,
+        magazine_cache_file: Optional[str] = None,
+        magazine_ttl: float = 24 * 3600,
+        revalidate_interval: float = 3600.0,
+        fast_login: bool = False,
+        login_state_file: Optional[str] = None,
+        user_data_dir: Optional[str] = None,
+        parser_engine: str = "default",
+        id_strategy: str = "random",
+        pipeline: bool = False,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        instrumentation: Optional[Instrumentation] = None,
+        pool: Optional[SessionPool] = None,
+    ):
         self.email = email
         self.password = password
         self.user_urlname = user_urlname
+        self.pipeline = pipeline
+        self.retry_policy = retry_policy
+        self.instrumentation = instrumentation or Instrumentation()
 
         self.cookies: Dict[str, str] = {}
-        self.headers: Dict[str, str] = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Origin": "https://editor.note.com",
-            "X-Requested-With": "XMLHttpRequest",
-        }
-
-        self.http = HttpClient(self.headers, self.cookies)
-        self.auth = AuthManager(email, password, session_file, self.headers)
-        self.images = ImageManager()
-        self.magazines = MagazineResolver()
-        self.parser = MarkdownParser(self.images)
+        self.headers: Dict[str, str] = dict(DEFAULT_HEADERS)
+
+        self.http = HttpClient(
+            self.headers,
+            self.cookies,
+            pool=pool,  # 複数クライアントで共有する接続プール (閉じるのは渡した側)
+            pool_maxsize=pool_maxsize,
+            rate_limiter=rate_limiter,
+            retry_policy=retry_policy,
+            instrumentation=self.instrumentation,
+        )
+        self.auth = AuthManager(
+            email,
+            password,
+            session_file,
+            self.headers,
+            revalidate_interval=revalidate_interval,
+            fast_login=fast_login,
+            storage_state_file=login_state_file,
+            user_data_dir=user_data_dir,
+        )
+        self.images = ImageManager(cache=image_cache, optimizer=image_optimizer)
+        self.magazines = MagazineResolver(cache_file=magazine_cache_file, ttl=magazine_ttl)
+        self.parser = parser_class(parser_engine)(self.images, image_concurrency=image_concurrency, id_strategy=id_strategy)
+        self.http.set_auth_handler(self._reauthenticate)
+
+    def close(self) -> None:
+        self.http.close()
+
+    def __enter__(self) -> "NoteClient2":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
 
     def _sync_cookies(self) -> None:
         self.cookies = dict(self.auth.cookies)
         self.http.set_cookies(self.cookies)
 
-    def _draft_save(self, note_id: int, title: str, body_html: str, image_keys: List[str]) -> Dict[str, Any]:
-        xsrf = xsrf_from_cookies(self.cookies)
-        url = f"https://note.com/api/v1/text_notes/draft_save?id={note_id}&is_temp_saved=true"
-
-        headers = {
-            "X-XSRF-TOKEN": xsrf,
-            "X-Requested-With": "XMLHttpRequest",
-            "Referer": "https://editor.note.com/",
-            "Content-Type": "application/json",
-        }
-
-        plain_text = re.sub(r"<[^>]+>", "", body_html)
-        body_length = len(plain_text)
-
-        payload = {
-            "body": body_html,
-            "body_length": body_length,
-            "name": title,
-            "index": False,
-            "is_lead_form": False,
-            "image_keys": image_keys or [],
-        }
-
-        resp = self.http.post(url, headers=headers, json=payload)
+    def _authenticate(self, timings: Dict[str, float]) -> Dict[str, Any]:
+        # 認証して Cookie を HttpClient に渡す (所要時間は timings["auth"] と auth ステージ)
+        auth_result = _timed(timings, "auth", self.auth.prepare, self.http)
+        self.instrumentation.stages(timings, bool(auth_result.get("ok")))
+        if auth_result.get("ok"):
+            self._sync_cookies()
+        return auth_result
+
+    def _reauthenticate(self) -> bool:
+        # HttpClient から 401/403 のときに呼ばれる
+        result = self.auth.refresh(self.http)
+        if not result.get("ok"):
+            return False
+        self._sync_cookies()
+        return True
+
+    def _draft_save(
+        self,
+        note_id: int,
+        title: str,
+        body_html: str,
+        image_keys: List[str],
+        body_length: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        req = _draft_request(self.cookies, title, body_html, image_keys, body_length)
+        resp = self.http.post(_draft_save_url(note_id), headers=req["headers"], json=req["json"], idempotent=True, body="discard")
         if not resp.get("ok"):
             return {"ok": False, "error": {"type": "DraftSaveFailed", "status_code": resp.get("status_code"), "detail": resp.get("text")}}
         return {"ok": True}
@@ -63,137 +144,414 @@ class NoteClient2:
     def publish(
         self,
         title: str,
-        md_file_path: str,
+        md_file_path: MarkdownSource,
         eyecatch_path: Optional[str] = None,
         hashtags: Optional[List[str]] = None,
         price: int = 0,
         magazine_key: Optional[List[str]] = None,
         is_publish: bool = False,
+        resume: Optional[Dict[str, Any]] = None,
+        progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
     ) -> Dict[str, Any]:
-        hashtags = hashtags or []
-        magazine_key = magazine_key or []
-
+        """
+        resume: 失敗した publish の error["resume"]。渡すと記事を作り直さず、その下書きに続きから保存する
+                ("parsed" / "magazine_ids" も入っていれば、その段階もやり直さない)
+        progress: ステージが終わるたびに progress(stage, data) を呼ぶ
+                  create {note_id, note_key, note_data} / eyecatch {} / parse {parsed} / magazines {magazine_ids}
+        """
         # 1) Auth
-        auth_result = self.auth.prepare(self.http)
+        auth_timings: Dict[str, float] = {}
+        auth_result = self._authenticate(auth_timings)
         if not auth_result.get("ok"):
             return auth_result
-        self._sync_cookies()
 
+        result = self._publish_authed(title, md_file_path, eyecatch_path, hashtags, price, magazine_key, is_publish, resume, progress)
+        if result.get("ok"):
+            result["data"]["timings"]["auth"] = auth_timings["auth"]
+        return result
+
+    def publish_many(self, jobs: Iterable[Dict[str, Any]], max_workers: int = 4) -> Iterator[Dict[str, Any]]:
+        """
+        複数記事をまとめて投稿する
+
+        - jobs は publish() のキーワード引数の dict (title / md_file_path / ...) の列
+        - 認証は最初に 1 回だけ行い、接続プール・画像キャッシュは全ワーカーで共有する
+        - 完了した順に {"index", "job", "result", "elapsed", "stats"} を yield する
+          stats は累計の completed / failed / elapsed / per_second
+        - 認証に失敗したときはジョブを読まず、その結果だけを 1 件 ({"index": None, "job": None, ...}) 返す
+        """
+        started = time.perf_counter()
+        auth_result = self._authenticate({})
+        if not auth_result.get("ok"):
+            yield {
+                "index": None,
+                "job": None,
+                "result": auth_result,
+                "elapsed": 0.0,
+                "stats": {"completed": 0, "failed": 0, "elapsed": time.perf_counter() - started, "per_second": 0.0},
+            }
+            return
+        yield from self._publish_many_authed(jobs, max_workers, started)
+
+    def _publish_many_authed(self, jobs: Iterable[Dict[str, Any]], max_workers: int, started: float) -> Iterator[Dict[str, Any]]:
+        # publish_many() の認証より後 (publish_queue() も認証を済ませてから使う)
+        completed = 0
+        failed = 0
+
+        def report(index: int, job: Dict[str, Any], result: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+            nonlocal completed, failed
+            completed += 1
+            if not result.get("ok"):
+                failed += 1
+            total_elapsed = time.perf_counter() - started
+            return {
+                "index": index,
+                "job": job,
+                "result": result,
+                "elapsed": elapsed,
+                "stats": {
+                    "completed": completed,
+                    "failed": failed,
+                    "elapsed": total_elapsed,
+                    "per_second": completed / total_elapsed if total_elapsed > 0 else 0.0,
+                },
+            }
+
+        def run(job: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+            t0 = time.perf_counter()
+            try:
+                result = self._publish_authed(
+                    job["title"],
+                    job["md_file_path"],
+                    job.get("eyecatch_path"),
+                    job.get("hashtags"),
+                    job.get("price", 0),
+                    job.get("magazine_key"),
+                    job.get("is_publish", False),
+                    job.get("resume"),
+                    job.get("progress"),
+                )
+            except Exception as e:
+                result = {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "publish_many"}}
+            return result, time.perf_counter() - t0
+
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        # 未完了のジョブは max_workers * 2 件までに抑え、jobs はジェネレータでもよい
+        job_iter = enumerate(jobs)
+        pending: Dict[Future, Tuple[int, Dict[str, Any]]] = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for index, job in itertools.islice(job_iter, max_workers * 2):
+                pending[executor.submit(run, job)] = (index, job)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, job = pending.pop(future)
+                    result, elapsed = future.result()
+                    yield report(index, job, result, elapsed)
+                    for next_index, next_job in itertools.islice(job_iter, 1):
+                        pending[executor.submit(run, next_job)] = (next_index, next_job)
+
+    def publish_queue(self, store: JobStore, max_workers: int = 4) -> Iterator[Dict[str, Any]]:
+        """
+        JobStore に積んだジョブを publish_many() で投稿し、途中経過と結果を store に記録する
+
+        - 途中で落ちても、もう一度呼べば記録した段階の続きから再開する (下書きを作り直さない)
+        - image_cache が無ければ、この実行のあいだだけ store と同じ SQLite ファイルを ImageCache にして、画像を再アップロードしない
+          (終わったら閉じて image_cache なしに戻す)
+        - yield する内容は publish_many() と同じ (job に "id" が入る)。stats に queue の残り queued が付く
+        - 認証に失敗したときはジョブに触れず、その結果だけを 1 件 ({"index": None, ...}) 返す
+        """
+        started = time.perf_counter()
+        auth_result = self._authenticate({})
+        if not auth_result.get("ok"):
+            yield {"index": None, "job": None, "result": auth_result, "elapsed": 0.0, "stats": {"queued": store.stats()["queued"]}}
+            return
+
+        def jobs() -> Iterator[Dict[str, Any]]:
+            for claimed in store.claim():
+                yield {**claimed["job"], "id": claimed["id"], "resume": claimed["resume"], "progress": store.recorder(claimed["id"])}
+
+        scoped_cache: Optional[ImageCache] = None
+        if self.images.cache is None:
+            from .image_cache import ImageCache
+
+            scoped_cache = self.images.cache = ImageCache(store.path)
+        try:
+            for item in self._publish_many_authed(jobs(), max_workers, started):
+                store.finish(item["job"]["id"], item["result"])
+                item["stats"]["queued"] = store.stats()["queued"]
+                yield item
+        finally:
+            if scoped_cache is not None:
+                self.images.cache = None
+                scoped_cache.close()
+
+    def export_notes(
+        self,
+        cache: NoteCache,
+        max_workers: int = 4,
+        statuses: Optional[Tuple[str, ...]] = None,
+        refresh: bool = False,
+        include_unchanged: bool = False,
+        max_pages: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        自分の記事 (公開済み・下書き) を NoteCache に書き出す (NoteExporter.export())
+
+        - 前回から変わった記事だけ詳細を取得し、終わった順に {"index", "key", "status", "change", "result", "stats"} を yield する
+        - 認証は最初に 1 回だけ行い、接続プールとレート制限は投稿と共有する
+        - statuses を省略すると公開済みと下書きの両方 (NOTE_STATUSES)
+        - 認証に失敗したときは、その結果だけを 1 件 ({"index": None, ...}) 返す
+        """
+        from .note_export import NOTE_STATUSES, NoteExporter
+
+        exporter = NoteExporter(cache, max_workers=max_workers, statuses=statuses if statuses is not None else NOTE_STATUSES, max_pages=max_pages)
+        auth_result = self._authenticate({})
+        if not auth_result.get("ok"):
+            yield {"index": None, "key": None, "status": None, "change": None, "result": auth_result, "stats": {}}
+            return
+        yield from exporter.export(self.http, refresh=refresh, include_unchanged=include_unchanged)
+
+    def _publish_authed(
+        self,
+        title: str,
+        md_file_path: MarkdownSource,
+        eyecatch_path: Optional[str] = None,
+        hashtags: Optional[List[str]] = None,
+        price: int = 0,
+        magazine_key: Optional[List[str]] = None,
+        is_publish: bool = False,
+        resume: Optional[Dict[str, Any]] = None,
+        progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        attempts = self.retry_policy.publish_attempts if self.retry_policy else 1
+        for attempt in range(1, attempts + 1):
+            result = self._publish_once(title, md_file_path, eyecatch_path, hashtags, price, magazine_key, is_publish, resume, progress)
+            resume = (result.get("error") or {}).get("resume")
+            # 下書きができていて、一時的な失敗なら同じ下書きで続きからやり直す
+            # (md_file_path がストリームだと読み直せない)
+            if (
+                result.get("ok")
+                or resume is None
+                or attempt == attempts
+                or not self.retry_policy.is_transient(result)
+                or not isinstance(md_file_path, (str, os.PathLike))
+            ):
+                break
+            time.sleep(self.retry_policy.delay(attempt))
+        self.instrumentation.publish(result, time.perf_counter() - started)
+        return result
+
+    def _publish_once(
+        self,
+        title: str,
+        md_file_path: MarkdownSource,
+        eyecatch_path: Optional[str],
+        hashtags: Optional[List[str]],
+        price: int,
+        magazine_key: Optional[List[str]],
+        is_publish: bool,
+        resume: Optional[Dict[str, Any]],
+        progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        hashtags = hashtags or []
+        magazine_key = magazine_key or []
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+
+        # 2) - 5) parse / magazines / create / eyecatch
+        run_stages = self._run_stages_pipelined if self.pipeline else self._run_stages
+        stages = run_stages(md_file_path, eyecatch_path, magazine_key, timings, resume, progress)
+        if not stages.get("ok"):
+            self.instrumentation.stages(timings, False)
+            return stages
+
+        # 6) - 8) draft save or temp save + final PUT
+        result = self._save_note(title, stages["data"], hashtags, price, is_publish, timings)
+        self.instrumentation.stages(timings, bool(result.get("ok")))
+        if not result.get("ok"):
+            return _with_resume(result, stages["data"])
+        timings["total"] = time.perf_counter() - started
+        result["data"]["timings"] = timings
+        return result
+
+    def _run_stages(
+        self,
+        md_file_path: MarkdownSource,
+        eyecatch_path: Optional[str],
+        magazine_key: List[str],
+        timings: Dict[str, float],
+        resume: Optional[Dict[str, Any]] = None,
+        progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
         # 2) Parse markdown (upload images inside)
-        parsed = self.parser.parse(self.http, self.headers, md_file_path)
+        prepared = self._prepare_stage(md_file_path, timings, resume)
+        parsed = self._parse_stage(md_file_path, prepared, timings, resume, progress) if prepared.get("ok") else prepared
         if not parsed.get("ok"):
-            return parsed
-
-        data = parsed["data"]
-        free_html = data["free_html"]
-        pay_html = data["pay_html"]
-        combined_html = data["combined_html"]
-        image_keys = data["image_keys"]
-        separator_id = data["separator_id"]
+            return _with_resume(parsed, _resumed_note(resume)["data"]) if _has_note(resume) else parsed
 
         # 3) Resolve magazines
-        magazine_id_list: List[int] = []
-        for key in magazine_key:
-            r = self.magazines.get_magazine_id(self.http, self.user_urlname, self.headers, key)
-            if not r.get("ok"):
-                return r
-            mid = (r.get("data") or {}).get("magazine_id")
-            if mid:
-                magazine_id_list.append(mid)
-
-        # 4) Create note skeleton
-        created = self.http.post(
-            "https://note.com/api/v1/text_notes",
-            headers=self.headers,
-            json={"template_key": None},
-        )
-        if not created.get("ok") or not created.get("json"):
-            return {"ok": False, "error": {"type": "CreateNoteFailed", "status_code": created.get("status_code"), "detail": created.get("text")}}
+        magazines = self._magazine_stage(magazine_key, timings, resume, progress)
+        if not magazines.get("ok"):
+            return _with_resume(magazines, _resumed_note(resume)["data"]) if _has_note(resume) else magazines
+
+        # 4) Create note skeleton / 5) Eyecatch
+        created = self._create_note(eyecatch_path, timings, resume, progress)
+        if not created.get("ok"):
+            return created
+
+        return {"ok": True, "data": {**created["data"], "parsed": parsed["data"], "magazine_ids": magazines["data"]["magazine_ids"]}}
+
+    def _run_stages_pipelined(
+        self,
+        md_file_path: MarkdownSource,
+        eyecatch_path: Optional[str],
+        magazine_key: List[str],
+        timings: Dict[str, float],
+        resume: Optional[Dict[str, Any]] = None,
+        progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        画像アップロードと HTML 化・マガジン解決・記事作成 (+ アイキャッチ) を同時に走らせる
 
-        note_data = (created["json"] or {}).get("data")
-        if not note_data:
-            return {"ok": False, "error": {"type": "CreateNoteInvalidResponse", "detail": created.get("json")}}
+        Markdown の誤りや画像ファイルが無いといったローカルで分かる失敗は、記事を作る前に返す
+        (空の下書きを残さない)。アイキャッチは note_id が要るので記事作成のあとに続けて送る。
+        アップロードなどが失敗しても作成済みの下書きは残るので、error["resume"] で再開できる
+        """
+        prepared = self._prepare_stage(md_file_path, timings, resume)
+        if not prepared.get("ok"):
+            return _with_resume(prepared, _resumed_note(resume)["data"]) if _has_note(resume) else prepared
 
-        note_id = note_data.get("id")
-        note_key = note_data.get("key")
-        if not note_id or not note_key:
-            return {"ok": False, "error": {"type": "CreateNoteMissingFields", "detail": note_data}}
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            parsed_f = executor.submit(self._parse_stage, md_file_path, prepared, timings, resume, progress)
+            magazines_f = executor.submit(self._magazine_stage, magazine_key, timings, resume, progress)
+            created_f = executor.submit(self._create_note, eyecatch_path, timings, resume, progress)
+            parsed, magazines, created = parsed_f.result(), magazines_f.result(), created_f.result()
+
+        # 失敗は逐次実行と同じ順で報告する
+        for stage in (parsed, magazines):
+            if not stage.get("ok"):
+                return _with_resume(stage, created["data"]) if created.get("ok") else stage
+        if not created.get("ok"):
+            return created
+
+        return {"ok": True, "data": {**created["data"], "parsed": parsed["data"], "magazine_ids": magazines["data"]["magazine_ids"]}}
+
+    def _prepare_stage(
+        self,
+        md_file_path: MarkdownSource,
+        timings: Dict[str, float],
+        resume: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        # parse のうちローカルで済む部分 (IR 化と画像ファイルの確認)。再開で parse 済みなら data は None
+        if resume and resume.get("parsed") is not None:
+            return {"ok": True, "data": None}
+        return _timed(timings, "parse", self.parser.prepare, md_file_path)
+
+    def _parse_stage(
+        self,
+        md_file_path: MarkdownSource,
+        prepared: Dict[str, Any],
+        timings: Dict[str, float],
+        resume: Optional[Dict[str, Any]],
+        progress: Optional[Callable[[str, Dict[str, Any]], None]],
+    ) -> Dict[str, Any]:
+        if resume and resume.get("parsed") is not None:
+            return {"ok": True, "data": resume["parsed"]}
+        # timings["parse"] は _prepare_stage() の分と合わせた parse 全体
+        local = timings.get("parse", 0.0)
+        md_name = self.parser._source_name(md_file_path)
+        parsed = _timed(timings, "parse", lambda: self.parser.render_ir(self.http, self.headers, prepared["data"], md_path=md_name, consume=True))
+        timings["parse"] += local
+        if parsed.get("ok"):
+            _report(progress, "parse", {"parsed": parsed["data"]})
+        return parsed
+
+    def _magazine_stage(
+        self,
+        magazine_key: List[str],
+        timings: Dict[str, float],
+        resume: Optional[Dict[str, Any]],
+        progress: Optional[Callable[[str, Dict[str, Any]], None]],
+    ) -> Dict[str, Any]:
+        if resume and resume.get("magazine_ids") is not None:
+            return {"ok": True, "data": {"magazine_ids": resume["magazine_ids"]}}
+        magazines = _timed(timings, "magazines", self.magazines.get_magazine_ids, self.http, self.user_urlname, self.headers, magazine_key)
+        if magazines.get("ok"):
+            _report(progress, "magazines", {"magazine_ids": magazines["data"]["magazine_ids"]})
+        return magazines
+
+    def _create_note(
+        self,
+        eyecatch_path: Optional[str],
+        timings: Dict[str, float],
+        resume: Optional[Dict[str, Any]] = None,
+        progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        # 4) Create note skeleton (再開時は作成済みの下書きを使う)
+        if _has_note(resume):
+            created = _resumed_note(resume)
+        else:
+            created = _timed(timings, "create", lambda: _created_note(self.http.post(CREATE_NOTE_URL, headers=self.headers, json={"template_key": None})))
+            if not created.get("ok"):
+                return created
+            created["data"]["eyecatch_uploaded"] = False
+            _report(progress, "create", {k: created["data"][k] for k in ("note_id", "note_key", "note_data")})
 
         # 5) Eyecatch
-        if eyecatch_path:
-            eye = self.images.upload_eyecatch(self.http, self.headers, note_id, eyecatch_path)
+        if eyecatch_path and not created["data"]["eyecatch_uploaded"]:
+            eye = _timed(timings, "eyecatch", self.images.upload_eyecatch, self.http, self.headers, created["data"]["note_id"], eyecatch_path)
             if not eye.get("ok"):
-                return eye
+                return _with_resume(eye, created["data"])
+            created["data"]["eyecatch_uploaded"] = True
+            _report(progress, "eyecatch", {})
+        return created
+
+    def _save_note(
+        self,
+        title: str,
+        stages: Dict[str, Any],
+        hashtags: List[str],
+        price: int,
+        is_publish: bool,
+        timings: Dict[str, float],
+    ) -> Dict[str, Any]:
+        data = stages["parsed"]
+        note_id = stages["note_id"]
+        note_key = stages["note_key"]
 
         # 6) Draft only
         if not is_publish:
-            draft = self._draft_save(note_id, title, combined_html, image_keys)
+            draft = _timed(timings, "draft_save", self._draft_save, note_id, title, data["combined_html"], data["image_keys"], _body_length(data))
             if not draft.get("ok"):
                 return draft
-            return {
-                "ok": True,
-                "data": {
-                    "mode": "draft",
-                    "note_id": note_id,
-                    "note_key": note_key,
-                    "edit_url": f"https://editor.note.com/notes/{note_key}/edit",
-                },
-            }
+            return _draft_result(note_id, note_key)
 
         # 7) Temp save (draft_save)
-        temp = self.http.post(
-            f"https://note.com/api/v1/text_notes/draft_save?id={note_id}&is_temp_saved=true",
+        temp = _timed(timings, "temp_save", lambda: self.http.post(
+            _draft_save_url(note_id),
             headers=self.headers,
-            json={"body": combined_html, "name": title, "index": True},
-        )
+            json={"body": data["combined_html"], "name": title, "index": True},
+            idempotent=True,
+            body="discard",
+        ))
         if not temp.get("ok"):
             return {"ok": False, "error": {"type": "TempDraftSaveFailed", "status_code": temp.get("status_code"), "detail": temp.get("text")}}
 
         # 8) Final PUT
-        status_str = "published"
-        formatted_hashtags = [t if t.startswith("#") else f"#{t}" for t in hashtags]
-        body_len = len(re.sub(r"<[^>]+>", "", combined_html))
-
-        overrides = {
-            "name": title,
-            "free_body": free_html,
-            "pay_body": pay_html if price > 0 else "",
-            "status": status_str,
-            "price": price,
-            "separator": separator_id if price > 0 and separator_id else None,
-            "is_refund": False,
-            "limited": False,
-            "index": True,
-            "image_keys": image_keys,
-            "hashtags": formatted_hashtags,
-            "magazine_ids": magazine_id_list,
-            "magazine_keys": [],
-            "body_length": body_len,
-            "send_notifications_flag": True,
-            "lead_form": {"is_active": False, "consent_url": ""},
-            "line_add_friend": {"is_active": False, "keyword": "", "add_friend_url": ""},
-        }
-
-        update_payload = dict(note_data)
-        update_payload.update(overrides)
-        payload = {k: v for k, v in update_payload.items() if v is not None}
-
-        put = self.http.put(
+        payload = _publish_payload(stages["note_data"], title, data, hashtags, price, stages["magazine_ids"])
+        put = _timed(timings, "put", lambda: self.http.put(
             f"https://note.com/api/v1/text_notes/{note_id}",
             headers=self.headers,
             json=payload,
-        )
+            body="discard",
+        ))
         if not put.get("ok"):
             return {"ok": False, "error": {"type": "PublishFailed", "status_code": put.get("status_code"), "detail": put.get("text")}}
 
-        return {
-            "ok": True,
-            "data": {
-                "mode": "published",
-                "note_id": note_id,
-                "note_key": note_key,
-                "public_url": f"https://note.com/{self.user_urlname}/n/{note_key}",
-                "edit_url": f"https://editor.note.com/notes/{note_key}/edit",
-                "has_pay": price > 0,
-            },
-        }
+        return _published_result(self.user_urlname, note_id, note_key, price)
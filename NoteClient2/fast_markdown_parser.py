@@ -0,0 +1,157 @@
+from __future__ import annotations
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .markdown_parser import IdGenerator, MarkdownParser
+from .note_ir import Block, NoteIR
+
+LINK_RE = re.compile(r'\[(.*?)\]\((.*?)\)')
+STRONG_RE = re.compile(r'\*\*(.+?)\*\*')
+EM_RE = re.compile(r'\*(.+?)\*')
+STRIKE_RE = re.compile(r'~~(.+?)~~')
+LIST_RE = re.compile(r'^(\s*)([-*]|\d+\.)\s+(.*)')
+IMG_RE = re.compile(r'!\[(.*?)\]\((.*?)\)')
+
+
+class FastMarkdownParser(MarkdownParser):
+    """
+    MarkdownParser と同じ HTML を出力する高速版
+
+    - 正規表現はすべてモジュール読み込み時にコンパイル済み
+    - 1 行につき先頭文字と含まれる記号で分岐し、当てはまらない正規表現は実行しない
+    - インライン変換以外の HTML 組み立ては MarkdownParser と同じ note_ir.render() に任せる
+    """
+
+    def _parse_inline(self, text: str) -> str:
+        if "](" in text:
+            text = LINK_RE.sub(r'<a href="\2">\1</a>', text)
+        if "*" in text:
+            text = STRONG_RE.sub(r'<strong>\1</strong>', text)
+            if "*" in text:
+                text = EM_RE.sub(r'<em>\1</em>', text)
+        if "~~" in text:
+            text = STRIKE_RE.sub(r'<s>\1</s>', text)
+        return text
+
+    def _tokenize(self, lines: Iterable[str]) -> Dict[str, Any]:
+        parse_inline = self._parse_inline
+
+        free_blocks: List[Block] = []
+        pay_blocks: List[Block] = []
+        current_blocks = free_blocks
+        append = current_blocks.append
+
+        separator_id: Optional[str] = None
+        last_block_id: Optional[str] = None
+
+        code_lines: Optional[List[str]] = None
+        list_buffer: List[Tuple[int, bool, str]] = []
+        pay_tag_count = 0
+        new_id = self._new_ids()
+
+        for line in lines:
+            raw_line = line.rstrip("\r\n")
+            stripped = raw_line.strip()
+
+            # "<" を含まない行は pay / toc のタグになりえないので lower() を省く
+            lower = stripped.lower() if "<" in stripped else ""
+
+            if lower and "</pay>" in lower:
+                return {"ok": False, "error": {"type": "InvalidPayTag", "message": "</pay> is not allowed"}}
+
+            if stripped.startswith("```"):
+                if list_buffer:
+                    last_block_id = self._flush_list(list_buffer, append, new_id)
+                    list_buffer = []
+                if code_lines is None:
+                    lang = stripped.lstrip("`").strip()
+                    uid = new_id("pre", lang)
+                    code_lines = []
+                    append(("pre", uid, lang, code_lines, False))
+                    last_block_id = uid
+                else:
+                    current_blocks[-1] = (*current_blocks[-1][:4], True)
+                    code_lines = None
+                continue
+
+            if code_lines is not None:
+                code_lines.append(raw_line)
+                continue
+
+            if not stripped:
+                if list_buffer:
+                    last_block_id = self._flush_list(list_buffer, append, new_id)
+                    list_buffer = []
+                continue
+
+            # リストは "-" "*" か数字 (全角を含む \d) で始まる行だけ
+            first = stripped[0]
+            if first == "-" or first == "*" or first.isdecimal():
+                list_match = LIST_RE.match(raw_line)
+                if list_match:
+                    marker = list_match.group(2)
+                    list_buffer.append((len(list_match.group(1)), marker[-1] == ".", list_match.group(3)))
+                    continue
+
+            if list_buffer:
+                last_block_id = self._flush_list(list_buffer, append, new_id)
+                list_buffer = []
+
+            if lower:
+                if "<toc>" in lower or "<table of content>" in lower:
+                    uid = new_id("toc")
+                    head_uid = new_id("toc-heading")
+                    append(("toc", uid, head_uid))
+                    last_block_id = uid
+                    continue
+
+                if "<pay>" in lower or "<pay_line>" in lower:
+                    if lower != "<pay>":
+                        return {"ok": False, "error": {"type": "InvalidPayTag", "message": "<pay> must be on its own line"}}
+                    if pay_tag_count >= 1:
+                        return {"ok": False, "error": {"type": "InvalidPayTag", "message": "<pay> allowed only once"}}
+
+                    pay_tag_count += 1
+                    if last_block_id:
+                        separator_id = last_block_id
+
+                    current_blocks = pay_blocks
+                    append = current_blocks.append
+                    sep_uid = new_id("pay")
+                    append(("pay", sep_uid))
+                    last_block_id = sep_uid
+                    continue
+
+            if "![" in stripped:
+                img_match = IMG_RE.search(stripped)
+                if img_match:
+                    uid = new_id("img", stripped)
+                    append(("img", uid, img_match.group(1), img_match.group(2)))
+                    last_block_id = uid
+                    continue
+
+            uid = new_id("block", stripped)
+            line_content = parse_inline(stripped)
+
+            if first == "#" and stripped.startswith("### "):
+                append(("h3", uid, line_content.lstrip("# ").strip()))
+            elif first == "#" and (stripped.startswith("# ") or stripped.startswith("## ")):
+                append(("h2", uid, line_content.lstrip("# ").strip()))
+            elif first == ">" and stripped.startswith("> "):
+                append(("blockquote", uid, line_content.lstrip("> ").strip()))
+            elif (first == "-" and stripped.startswith("---")) or (first == "*" and stripped.startswith("***")):
+                append(("hr", uid))
+            else:
+                append(("p", uid, line_content))
+
+            last_block_id = uid
+
+        if list_buffer:
+            last_block_id = self._flush_list(list_buffer, append, new_id)
+
+        return {"ok": True, "data": NoteIR(free_blocks, pay_blocks, separator_id, pay_tag_count == 1)}
+
+    def _flush_list(self, list_buffer: List[Tuple[int, bool, str]], append: Any, new_id: IdGenerator) -> Optional[str]:
+        block = self._build_list(list_buffer, new_id)
+        append(block)
+        return block[1]
@@ -1,57 +1,377 @@
 from __future__ import annotations
+import json
+import threading
+import time
+import urllib.parse
+from collections.abc import Mapping
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
 import requests
-from typing import Any, Dict, Optional
+from requests.adapters import HTTPAdapter
+
+from .instrumentation import Instrumentation
+from .rate_limit import RateLimiter
+from .retry import RetryPolicy
+from .utils import xsrf_from_cookies
+
+
+AUTH_STATUSES = (401, 403)
+
+# read: 本文を読む (デコードは text / json を読んだとき)
+# stream: 成功時は本文を読まずに返す (iter_content() で読み、close() する)
+# discard: 成功時の本文を読み捨てる
+# どのモードでも失敗時の本文はエラーの詳細に使うので読む
+BODY_MODES = ("read", "stream", "discard")
+
+_RESPONSE_KEYS = ("ok", "status_code", "text", "json")
+_UNSET = object()
+
+
+def is_note_host(url: str) -> bool:
+    host = urllib.parse.urlsplit(url).hostname or ""
+    return host == "note.com" or host.endswith(".note.com")
+
+
+def refresh_xsrf(headers: Optional[Dict[str, str]], cookies: Dict[str, str]) -> Optional[Dict[str, str]]:
+    # 再ログイン後は XSRF-TOKEN も変わるので、ヘッダに入っていれば差し替える
+    if not headers or "X-XSRF-TOKEN" not in headers:
+        return headers
+    return {**headers, "X-XSRF-TOKEN": xsrf_from_cookies(cookies)}
+
+
+def override_url(url: str, overrides: Dict[str, str]) -> str:
+    # overrides のキー (scheme://host) で始まる URL を差し替え先に向ける
+    for prefix, target in overrides.items():
+        if url.startswith(prefix) and url[len(prefix):len(prefix) + 1] in ("", "/", "?"):
+            return target + url[len(prefix):]
+    return url
+
+
+def content_length(headers: Any) -> Optional[int]:
+    value = headers.get("Content-Length") if headers is not None else None
+    return int(value) if value and str(value).isdigit() else None
+
+
+def check_body_mode(body: str) -> None:
+    if body not in BODY_MODES:
+        raise ValueError(f"unknown body mode: {body!r} (choose from {', '.join(BODY_MODES)})")
+
+
+class HttpResponse(Mapping):
+    """
+    HttpClient の戻り値
+
+    - これまでの {"ok", "status_code", "text", "json"} の dict と同じように読める (resp["json"], resp.get("text"), dict(resp))
+    - text / json は初めて読んだときにデコードしてそのまま持つ (読まなければデコードしない)
+    - body="discard" で読み捨てた本文は text が ""、json が None
+    - body="stream" の本文は iter_content() で読み、読み終えたら close() する
+      (text / json を読むと残りをまとめて読む)
+    """
+
+    __slots__ = ("ok", "status_code", "headers", "_resp", "_text", "_json")
+
+    def __init__(self, ok: bool, status_code: int, headers: Any = None, resp: Any = None):
+        self.ok = ok
+        self.status_code = status_code
+        self.headers = headers if headers is not None else {}
+        self._resp = resp  # None なら本文なし (読み捨てた)
+        self._text: Optional[str] = None
+        self._json: Any = _UNSET
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "ok":
+            return self.ok
+        if key == "status_code":
+            return self.status_code
+        if key == "text":
+            return self.text
+        if key == "json":
+            return self.json
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_RESPONSE_KEYS)
+
+    def __len__(self) -> int:
+        return len(_RESPONSE_KEYS)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} status_code={self.status_code} ok={self.ok}>"
+
+    @property
+    def content(self) -> bytes:
+        return self._resp.content if self._resp is not None else b""
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self._resp.text if self._resp is not None else ""
+        return self._text
+
+    @property
+    def json(self) -> Any:
+        if self._json is _UNSET:
+            self._json = self._load_json()
+        return self._json
+
+    def _load_json(self) -> Any:
+        if self._resp is None:
+            return None
+        try:
+            # text を読んだあとならそれを使い、本文を 2 回デコードしない
+            return json.loads(self._text) if self._text is not None else self._resp.json()
+        except Exception:
+            return None
+
+    def iter_content(self, chunk_size: int = 65536) -> Iterator[bytes]:
+        if self._resp is None:
+            return iter(())
+        return self._resp.iter_content(chunk_size)
+
+    def close(self) -> None:
+        if self._resp is not None:
+            self._resp.close()
+
+    def __enter__(self) -> "HttpResponse":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def rewind_files(kwargs: Dict[str, Any]) -> None:
+    # やり直し時にファイルオブジェクトを先頭に戻す
+    for spec in (kwargs.get("files") or {}).values():
+        if isinstance(spec, tuple) and len(spec) > 1 and hasattr(spec[1], "seek"):
+            spec[1].seek(0)
+
+
+class SessionPool:
+    """
+    ホストごとに keep-alive な requests.Session を保持する接続プール
+
+    - note.com と S3 (presigned action) で別々のプールを持つ
+    - Cookie は HttpClient がリクエストごとに渡すため、Session の cookie jar には保存しない
+      (複数アカウントでプールを共有しても Cookie が混ざらない)
+    """
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 10):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._sessions: Dict[Tuple[str, str], requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url: str) -> requests.Session:
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._new_session()
+                self._sessions[key] = session
+            return session
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def close(self) -> None:
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
 
 class HttpClient:
-    def __init__(self, base_headers: Dict[str, str], cookies: Dict[str, str]):
+    def __init__(
+        self,
+        base_headers: Dict[str, str],
+        cookies: Dict[str, str],
+        pool: Optional[SessionPool] = None,
+        pool_maxsize: int = 10,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        instrumentation: Optional[Instrumentation] = None,
+        url_overrides: Optional[Dict[str, str]] = None,
+    ):
         self.base_headers = dict(base_headers)
         self.cookies = cookies
+        self._owns_pool = pool is None
+        self.pool = pool or SessionPool(pool_maxsize=pool_maxsize)
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.instrumentation = instrumentation or Instrumentation()
+        # 送信先の差し替え {"https://note.com": "http://127.0.0.1:8080"} (ベンチマーク・検証用)
+        self.url_overrides = dict(url_overrides or {})
+        self.auth_handler: Optional[Callable[[], bool]] = None
+        self._local = threading.local()
 
     def set_cookies(self, cookies: Dict[str, str]) -> None:
         self.cookies = cookies
 
+    def set_auth_handler(self, handler: Optional[Callable[[], bool]]) -> None:
+        """
+        note.com が 401/403 を返したときに呼ぶ再認証処理を登録する
+
+        handler は再認証して set_cookies() まで済ませ、成功したら True を返す。
+        True なら同じリクエストを 1 回だけやり直す (auth_retry=False のリクエストは除く)
+        """
+        self.auth_handler = handler
+
+    def close(self) -> None:
+        # 共有プールは持ち主が閉じる
+        if self._owns_pool:
+            self.pool.close()
+
+    def __enter__(self) -> "HttpClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
     def get(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> Dict[str, Any]:
-        try:
-            resp = requests.get(url, headers={**self.base_headers, **(headers or {})}, cookies=self.cookies, **kwargs)
-            return {
-                "ok": resp.status_code == 200,
-                "status_code": resp.status_code,
-                "text": resp.text,
-                "json": self._safe_json(resp),
-            }
-        except Exception as e:
-            return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "GET", "url": url}}
+        return self._request("GET", url, (200,), headers, **kwargs)
 
     def post(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> Dict[str, Any]:
-        try:
-            resp = requests.post(url, headers={**self.base_headers, **(headers or {})}, cookies=self.cookies, **kwargs)
-            ok = resp.status_code in (200, 201)
-            return {
-                "ok": ok,
-                "status_code": resp.status_code,
-                "text": resp.text,
-                "json": self._safe_json(resp),
-            }
-        except Exception as e:
-            return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "POST", "url": url}}
+        return self._request("POST", url, (200, 201), headers, **kwargs)
 
     def put(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> Dict[str, Any]:
-        try:
-            resp = requests.put(url, headers={**self.base_headers, **(headers or {})}, cookies=self.cookies, **kwargs)
-            ok = resp.status_code in (200, 201)
-            return {
-                "ok": ok,
-                "status_code": resp.status_code,
-                "text": resp.text,
-                "json": self._safe_json(resp),
-            }
-        except Exception as e:
-            return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "PUT", "url": url}}
+        return self._request("PUT", url, (200, 201), headers, **kwargs)
 
-    @staticmethod
-    def _safe_json(resp: requests.Response) -> Any:
+    def _request(
+        self,
+        method: str,
+        url: str,
+        ok_statuses: Tuple[int, ...],
+        headers: Optional[Dict[str, str]] = None,
+        auth_retry: bool = True,
+        idempotent: Optional[bool] = None,
+        body: str = "read",
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """
+        idempotent: retry_policy でやり直してよいか (None ならメソッドで判断し、POST はやり直さない)
+        body: 成功時の本文の扱い (BODY_MODES)。応答を見ない送信は "discard"
+        """
+        check_body_mode(body)
+        kwargs["body"] = body
+        result = self._send_retrying(method, url, ok_statuses, headers, idempotent, **kwargs)
+        if auth_retry and result.get("status_code") in AUTH_STATUSES and self._can_refresh(url) and self._refresh_auth():
+            rewind_files(kwargs)
+            result = self._send_retrying(method, url, ok_statuses, refresh_xsrf(headers, self.cookies), idempotent, **kwargs)
+        return result
+
+    def _send_retrying(
+        self,
+        method: str,
+        url: str,
+        ok_statuses: Tuple[int, ...],
+        headers: Optional[Dict[str, str]],
+        idempotent: Optional[bool],
+        **kwargs,
+    ) -> Dict[str, Any]:
+        attempt = 1
+        result = self._send_throttled(method, url, ok_statuses, headers, **kwargs)
+        while self.retry_policy is not None and self.retry_policy.should_retry(method, result, attempt, idempotent):
+            time.sleep(self.retry_policy.delay(attempt))
+            attempt += 1
+            rewind_files(kwargs)
+            result = self._send_throttled(method, url, ok_statuses, headers, **kwargs)
+        return result
+
+    def _send_throttled(
+        self,
+        method: str,
+        url: str,
+        ok_statuses: Tuple[int, ...],
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        # 429 はサーバが処理していないので、メソッドによらず rate_limiter の待ちを挟んでやり直す
+        result = self._send(method, url, ok_statuses, headers, **kwargs)
+        retries = self.rate_limiter.throttle_retries if self.rate_limiter else 0
+        while retries > 0 and result.get("status_code") == 429:
+            retries -= 1
+            rewind_files(kwargs)
+            result = self._send(method, url, ok_statuses, headers, **kwargs)
+        return result
+
+    def _can_refresh(self, url: str) -> bool:
+        if self.auth_handler is None or getattr(self._local, "refreshing", False):
+            return False
+        return is_note_host(url)
+
+    def _refresh_auth(self) -> bool:
+        # 再認証中の検証リクエストが 401 を返しても再帰しないようにする
+        self._local.refreshing = True
         try:
-            return resp.json()
+            return bool(self.auth_handler())
         except Exception:
-            return None
-        
\ No newline at end of file
+            return False
+        finally:
+            self._local.refreshing = False
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        ok_statuses: Tuple[int, ...],
+        headers: Optional[Dict[str, str]] = None,
+        body: str = "read",
+        **kwargs,
+    ) -> Dict[str, Any]:
+        url = override_url(url, self.url_overrides)
+        limit_key = self.rate_limiter.acquire(url) if self.rate_limiter else None
+        status_code: Optional[int] = None
+        retry_after: Optional[str] = None
+        started = time.perf_counter()
+        try:
+            session = self.pool.session_for(url)
+            resp = session.request(
+                method,
+                url,
+                headers={**self.base_headers, **(headers or {})},
+                cookies=self.cookies,
+                stream=body != "read",
+                **kwargs,
+            )
+            status_code = resp.status_code
+            retry_after = resp.headers.get("Retry-After")
+            ok = status_code in ok_statuses
+            if not ok or body == "read":
+                received: Optional[int] = len(resp.content)
+                result = HttpResponse(ok, status_code, resp.headers, resp)
+            elif body == "discard":
+                # 最後まで読むと接続がプールに戻る
+                received = 0
+                for chunk in resp.iter_content(65536):
+                    received += len(chunk)
+                resp.close()
+                result = HttpResponse(ok, status_code, resp.headers)
+            else:
+                received = content_length(resp.headers)
+                result = HttpResponse(ok, status_code, resp.headers, resp)
+            self.instrumentation.http(
+                method,
+                url,
+                status_code,
+                time.perf_counter() - started,
+                bytes_sent=content_length(resp.request.headers),
+                bytes_received=received,
+            )
+            return result
+        except Exception as e:
+            self.instrumentation.http(method, url, None, time.perf_counter() - started, error=type(e).__name__)
+            return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": method, "url": url}}
+        finally:
+            if limit_key is not None:
+                self.rate_limiter.release(limit_key, status_code, retry_after)
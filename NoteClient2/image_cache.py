@@ -0,0 +1,93 @@
+from __future__ import annotations
+import hashlib
+import os
+import time
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from ._sqlite import ThreadConnections
+
+# file_digest() だけを使う images.py から読み込まれるので、sqlite3 は接続するときに読み込む
+if TYPE_CHECKING:
+    import sqlite3
+
+
+def file_digest(file_path: str) -> str:
+    """ファイル内容の sha256 (画像キャッシュのキー)"""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ImageCache:
+    """
+    アップロード済み画像の永続キャッシュ (SQLite)
+
+    - キーは画像内容の sha256 なので、パスが違っても同じ画像は再アップロードしない
+    - 値は presigned_post が返す (url, path)
+    - max_entries を超えたら最後に使われたのが古い順に削除、max_age 秒を過ぎたものは使わない
+    - SQLite のロックで複数プロセスから同じファイルを使っても安全
+    """
+
+    def __init__(self, path: str, max_entries: Optional[int] = 10000, max_age: Optional[float] = None):
+        self.path = os.path.expanduser(path)
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._connections = ThreadConnections(self.path)
+
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                " digest TEXT PRIMARY KEY,"
+                " url TEXT NOT NULL,"
+                " path TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " used_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS images_used_at ON images (used_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    def get(self, digest: str) -> Optional[Tuple[str, str]]:
+        now = time.time()
+        with self._conn() as conn:
+            row = conn.execute("SELECT url, path, created_at FROM images WHERE digest = ?", (digest,)).fetchone()
+            if row is None:
+                return None
+            if self.max_age is not None and now - row[2] > self.max_age:
+                conn.execute("DELETE FROM images WHERE digest = ?", (digest,))
+                return None
+            conn.execute("UPDATE images SET used_at = ? WHERE digest = ?", (now, digest))
+        return row[0], row[1]
+
+    def put(self, digest: str, url: str, path: str) -> None:
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO images (digest, url, path, created_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                (digest, url, path, now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        if self.max_age is not None:
+            conn.execute("DELETE FROM images WHERE created_at < ?", (now - self.max_age,))
+        if self.max_entries is not None:
+            conn.execute(
+                "DELETE FROM images WHERE digest IN ("
+                " SELECT digest FROM images ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM images")
+
+    def close(self) -> None:
+        # 使ったすべてのスレッドの接続を閉じる
+        self._connections.close()
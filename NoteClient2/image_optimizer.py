@@ -0,0 +1,151 @@
+from __future__ import annotations
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+from typing import Any, Dict, Optional, Tuple
+
+from .image_cache import file_digest
+
+FORMAT_EXT = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+
+
+def _pil() -> Any:
+    # Pillow は任意依存 (pip install NoteClient2[image])
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    return Image, ImageOps
+
+
+class ImageOptimizer:
+    """
+    アップロード前の画像最適化
+
+    - 長辺を max_dimension px までに縮小し、format / quality で再エンコードする
+      (format=None なら透過ありは PNG、それ以外は JPEG)
+    - EXIF などのメタデータは付けない (向きだけ反映してから捨てる)
+    - アイキャッチは eyecatch_size に合わせて中央トリミングする
+    - 出力は「元画像の sha256 + 設定」をキーに cache_dir に保存し、2 回目以降は再利用する
+    - GIF (アニメーションの可能性) や、最適化しても小さくならない画像は元ファイルをそのまま使う
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "~/.cache/noteclient2/optimized",
+        max_dimension: int = 1920,
+        format: Optional[str] = None,
+        quality: int = 85,
+        eyecatch_size: Tuple[int, int] = (1920, 1080),
+    ):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_dimension = max_dimension
+        self.format = format.upper() if format else None
+        self.quality = quality
+        self.eyecatch_size = eyecatch_size
+
+    def optimize(self, file_path: str, digest: Optional[str] = None) -> Dict[str, Any]:
+        """記事内画像用。戻り値 data: path / mime / width / height / bytes_in / bytes_out / optimized"""
+        return self._run(file_path, digest, "body")
+
+    def fit_eyecatch(self, file_path: str, digest: Optional[str] = None) -> Dict[str, Any]:
+        """アイキャッチ用。必ず eyecatch_size の画像を返す"""
+        return self._run(file_path, digest, "eyecatch")
+
+    def _run(self, file_path: str, digest: Optional[str], kind: str) -> Dict[str, Any]:
+        pil = _pil()
+        if pil is None:
+            return {"ok": False, "error": {"type": "OptionalDependencyMissing", "message": "Pillow is required: pip install NoteClient2[image]", "where": "image_optimizer"}}
+        Image, ImageOps = pil
+
+        try:
+            digest = digest or file_digest(file_path)
+            bytes_in = os.path.getsize(file_path)
+
+            with Image.open(file_path) as src:
+                src_size = src.size
+                if kind == "body" and (src.format == "GIF" or getattr(src, "is_animated", False)):
+                    return self._passthrough(file_path, bytes_in, src_size)
+
+                fmt = self.format or ("PNG" if self._has_alpha(src) else "JPEG")
+                out_path = os.path.join(self.cache_dir, f"{digest}-{self._settings_key(kind, fmt)}{FORMAT_EXT.get(fmt, '.img')}")
+                if not os.path.exists(out_path):
+                    img = ImageOps.exif_transpose(src)
+                    if kind == "eyecatch":
+                        img = ImageOps.fit(img, self.eyecatch_size, method=Image.LANCZOS)
+                    elif max(img.size) > self.max_dimension:
+                        img = img.copy()
+                        img.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+                    if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+                        img = img.convert("RGB")
+                    self._save(img, out_path, fmt)
+
+            # 縮小不要で、再エンコードしても小さくならなければ元ファイルを使う
+            if kind == "body" and max(src_size) <= self.max_dimension and os.path.getsize(out_path) >= bytes_in:
+                return self._passthrough(file_path, bytes_in, src_size)
+            return self._result(out_path, fmt, bytes_in)
+        except Exception as e:
+            return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "image_optimizer", "path": file_path}}
+
+    def _settings_key(self, kind: str, fmt: str) -> str:
+        settings = {"kind": kind, "format": fmt, "quality": self.quality}
+        if kind == "eyecatch":
+            settings["size"] = list(self.eyecatch_size)
+        else:
+            settings["max"] = self.max_dimension
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:12]
+
+    def _save(self, img: Any, out_path: str, fmt: str) -> None:
+        # 複数プロセスが同じ画像を同時に最適化しても壊れないよう、一時ファイルから置き換える
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if fmt == "PNG":
+                    img.save(f, "PNG", optimize=True)
+                else:
+                    img.save(f, fmt, quality=self.quality, optimize=True)
+            os.replace(tmp, out_path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @staticmethod
+    def _has_alpha(img: Any) -> bool:
+        return img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+
+    @staticmethod
+    def _result(path: str, fmt: str, bytes_in: int) -> Dict[str, Any]:
+        Image, _ = _pil()
+        with Image.open(path) as img:
+            width, height = img.size
+        return {
+            "ok": True,
+            "data": {
+                "path": path,
+                "mime": Image.MIME.get(fmt, "application/octet-stream"),
+                "width": width,
+                "height": height,
+                "bytes_in": bytes_in,
+                "bytes_out": os.path.getsize(path),
+                "optimized": True,
+            },
+        }
+
+    @staticmethod
+    def _passthrough(file_path: str, bytes_in: int, size: Tuple[int, int]) -> Dict[str, Any]:
+        return {
+            "ok": True,
+            "data": {
+                "path": file_path,
+                "mime": mimetypes.guess_type(file_path)[0] or "application/octet-stream",
+                "width": size[0],
+                "height": size[1],
+                "bytes_in": bytes_in,
+                "bytes_out": bytes_in,
+                "optimized": False,
+            },
+        }
@@ -1,58 +1,206 @@
 from __future__ import annotations
+import contextlib
 import os
 import mimetypes
+import threading
 import uuid
-from typing import Any, Dict, Tuple, Optional
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Tuple, Optional
 
 from .http import HttpClient
+from .image_cache import ImageCache, file_digest
+from .image_optimizer import ImageOptimizer
+
+PRESIGN_URL = "https://note.com/api/v3/images/upload/presigned_post"
+EYECATCH_URL = "https://note.com/api/v1/image_upload/note_eyecatch"
 
 class ImageManager:
-    def __init__(self):
-        self.uploaded: Dict[str, Tuple[str, str]] = {}  # file_path -> (url, path)
+    def __init__(
+        self,
+        cache: Optional[ImageCache] = None,
+        max_memory_entries: int = 1024,
+        optimizer: Optional[ImageOptimizer] = None,
+    ):
+        self.uploaded: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()  # file_path -> (url, path)
+        self.cache = cache
+        self.optimizer = optimizer
+        self.max_memory_entries = max_memory_entries
+        self._digests: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()  # sha256 -> (url, path)
+        self._lock = threading.Lock()
+        # ("path" / "digest", キー) -> [ロック, 使っているスレッド数] (誰も使っていないキーのロックは消す)
+        self._key_locks: Dict[Tuple[str, str], List[Any]] = {}
+        # (イベントループ, "path" / "digest", キー) -> アップロード中の Task
+        self._inflight: Dict[Tuple[Any, str, str], Any] = {}
+
+    def check_image(self, file_path: str) -> Dict[str, Any]:
+        """アップロードせずに、upload_image() がローカルで失敗しないか (ファイルがあるか) を確かめる"""
+        with self._lock:
+            if file_path in self.uploaded:
+                return {"ok": True, "data": None}
+        if not os.path.exists(file_path):
+            return _image_not_found(file_path)
+        return {"ok": True, "data": None}
 
     def upload_image(self, http: HttpClient, headers: Dict[str, str], file_path: str) -> Dict[str, Any]:
-        if file_path in self.uploaded:
-            url, key = self.uploaded[file_path]
-            return {"ok": True, "data": {"url": url, "path": key, "cached": True}}
+        # 複数スレッドから同じ画像 (パスか中身が同じ) が来ても 1 回だけアップロードする
+        with self._key_lock(("path", file_path)):
+            return self._upload_path(http, headers, file_path)
+
+    @contextlib.contextmanager
+    def _key_lock(self, key: Tuple[str, str]) -> Iterator[None]:
+        with self._lock:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[key]
+
+    def _upload_path(self, http: HttpClient, headers: Dict[str, str], file_path: str) -> Dict[str, Any]:
+        hit = self._lookup_path(file_path)
+        if hit:
+            return hit
 
         if not os.path.exists(file_path):
-            return {"ok": False, "error": {"type": "FileNotFound", "message": "image not found", "path": file_path}}
+            return _image_not_found(file_path)
 
-        ext = os.path.splitext(file_path)[1] or ".png"
-        uuid_name = f"{uuid.uuid4().hex}{ext}"
-        mime = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        try:
+            digest = file_digest(file_path)
+        except Exception as e:
+            return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "hash_image"}}
+        # 中身が同じ別パスのアップロード中なら、終わるのを待ってその結果を使う
+        with self._key_lock(("digest", digest)):
+            hit = self._lookup_digest(file_path, digest)
+            if hit:
+                return hit
+            return self._upload_digest(http, headers, file_path, digest)
+
+    def _upload_digest(self, http: HttpClient, headers: Dict[str, str], file_path: str, digest: str) -> Dict[str, Any]:
+        prepared = self._prepare_upload(file_path, digest)
+        if not prepared.get("ok"):
+            return prepared
+        upload_path, uuid_name, mime = prepared["data"]["path"], prepared["data"]["uuid_name"], prepared["data"]["mime"]
 
         presign = http.post(
-            "https://note.com/api/v3/images/upload/presigned_post",
+            PRESIGN_URL,
             headers=headers,
             files={"filename": (None, uuid_name)},
+            idempotent=True,
         )
-        if not presign.get("ok") or not presign.get("json"):
-            return {"ok": False, "error": {"type": "PresignFailed", "status_code": presign.get("status_code"), "detail": presign.get("text")}}
-
-        data = (presign["json"] or {}).get("data") or {}
-        if "action" not in data:
-            return {"ok": False, "error": {"type": "PresignInvalid", "message": "missing action", "detail": data}}
+        data = self._presign_data(presign)
+        if not data.get("ok"):
+            return data
+        data = data["data"]
 
         try:
-            with open(file_path, "rb") as f:
+            with open(upload_path, "rb") as f:
                 up = http.post(
                     data["action"],
                     headers={},  # S3 へは base headers を使いたくないので空
                     data=data.get("post"),
                     files={"file": (uuid_name, f, mime)},
+                    idempotent=True,  # 同じキーへの上書きになるだけ
+                    body="discard",
                 )
             if not up.get("ok"):
                 return {"ok": False, "error": {"type": "S3UploadFailed", "status_code": up.get("status_code"), "detail": up.get("text")}}
         except Exception as e:
             return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "open/upload"}}
 
-        result = (data.get("url"), data.get("path"))
-        if not result[0] or not result[1]:
-            return {"ok": False, "error": {"type": "UploadResultInvalid", "detail": data}}
+        return self._remember(file_path, digest, data)
 
-        self.uploaded[file_path] = result
-        return {"ok": True, "data": {"url": result[0], "path": result[1], "cached": False}}
+    async def aupload_image(self, http: Any, headers: Dict[str, str], file_path: str) -> Dict[str, Any]:
+        """
+        upload_image() の asyncio 版 (http は AsyncHttpClient)
+
+        同じイベントループで同じ画像 (パスか中身が同じ) が同時に来たら、先に始まった 1 回のアップロードを待ち合わせる
+        """
+        hit = self._lookup_path(file_path)
+        if hit:
+            return hit
+        result, _ = await self._join(("path", file_path), lambda: self._aupload_path(http, headers, file_path))
+        return result
+
+    async def _join(self, key: Tuple[str, str], start: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], bool]:
+        """key の処理が走っていればその結果を待ち、なければ start() を始める。(結果, 自分で始めたか) を返す"""
+        import asyncio
+
+        flight = (asyncio.get_running_loop(), *key)
+        task = self._inflight.get(flight)
+        started = task is None
+        if started:
+            task = asyncio.ensure_future(start())
+            self._inflight[flight] = task
+            task.add_done_callback(lambda _: self._inflight.pop(flight, None))
+        # 待っている側が取り消されても、ほかの呼び出しが待つアップロードは止めない
+        result = await asyncio.shield(task)
+        # 呼び出し側が error に書き足すので、中の dict は呼び出しごとに分ける
+        return {k: dict(v) if isinstance(v, dict) else v for k, v in result.items()}, started
+
+    async def _aupload_path(self, http: Any, headers: Dict[str, str], file_path: str) -> Dict[str, Any]:
+        import asyncio
+
+        if not os.path.exists(file_path):
+            return _image_not_found(file_path)
+
+        try:
+            digest = await asyncio.to_thread(file_digest, file_path)
+            hit = await asyncio.to_thread(self._lookup_digest, file_path, digest)
+        except Exception as e:
+            return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "hash_image"}}
+        if hit:
+            return hit
+
+        result, started = await self._join(("digest", digest), lambda: self._aupload_digest(http, headers, file_path, digest))
+        if started or not result.get("ok"):
+            return result
+        # 中身が同じ別パスのアップロードを待った: このパスでも引けるようにする
+        self._remember_memory(file_path, digest, (result["data"]["url"], result["data"]["path"]))
+        return {"ok": True, "data": {**result["data"], "cached": True}}
+
+    async def _aupload_digest(self, http: Any, headers: Dict[str, str], file_path: str, digest: str) -> Dict[str, Any]:
+        import asyncio
+
+        prepared = await asyncio.to_thread(self._prepare_upload, file_path, digest)
+        if not prepared.get("ok"):
+            return prepared
+        upload_path, uuid_name, mime = prepared["data"]["path"], prepared["data"]["uuid_name"], prepared["data"]["mime"]
+
+        presign = await http.post(
+            PRESIGN_URL,
+            headers=headers,
+            files={"filename": (None, uuid_name)},
+            idempotent=True,
+        )
+        data = self._presign_data(presign)
+        if not data.get("ok"):
+            return data
+        data = data["data"]
+
+        try:
+            content = await asyncio.to_thread(self._read_bytes, upload_path)
+            up = await http.post(
+                data["action"],
+                headers={},  # S3 へは base headers を使いたくないので空
+                data=data.get("post"),
+                files={"file": (uuid_name, content, mime)},
+                idempotent=True,
+                body="discard",
+            )
+            if not up.get("ok"):
+                return {"ok": False, "error": {"type": "S3UploadFailed", "status_code": up.get("status_code"), "detail": up.get("text")}}
+        except Exception as e:
+            return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "open/upload"}}
+
+        if self.cache is None:
+            return self._remember(file_path, digest, data)
+        return await asyncio.to_thread(self._remember, file_path, digest, data)
 
     def upload_eyecatch(self, http: HttpClient, headers: Dict[str, str], note_id: int, file_path: str) -> Dict[str, Any]:
         if not file_path:
@@ -60,18 +208,139 @@ class ImageManager:
         if not os.path.exists(file_path):
             return {"ok": False, "error": {"type": "FileNotFound", "message": "eyecatch not found", "path": file_path}}
 
+        prepared = self._prepare_eyecatch(file_path)
+        if not prepared.get("ok"):
+            return prepared
+        eye = prepared["data"]
+
         try:
-            with open(file_path, "rb") as f:
-                files = {"file": ("blob", f, "image/png")}
-                data = {"note_id": note_id, "width": 1920, "height": 1080}
+            with open(eye["path"], "rb") as f:
+                files = {"file": ("blob", f, eye["mime"])}
+                data = {"note_id": note_id, "width": eye["width"], "height": eye["height"]}
                 resp = http.post(
-                    "https://note.com/api/v1/image_upload/note_eyecatch",
+                    EYECATCH_URL,
                     headers=headers,
                     files=files,
                     data=data,
+                    idempotent=True,
+                    body="discard",
                 )
             if not resp.get("ok"):
                 return {"ok": False, "error": {"type": "EyecatchUploadFailed", "status_code": resp.get("status_code"), "detail": resp.get("text")}}
             return {"ok": True, "data": {"uploaded": True}}
         except Exception as e:
             return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "upload_eyecatch"}}
+
+    async def aupload_eyecatch(self, http: Any, headers: Dict[str, str], note_id: int, file_path: str) -> Dict[str, Any]:
+        """upload_eyecatch() の asyncio 版 (http は AsyncHttpClient)"""
+        import asyncio
+
+        if not file_path:
+            return {"ok": True, "data": {"skipped": True}}
+        if not os.path.exists(file_path):
+            return {"ok": False, "error": {"type": "FileNotFound", "message": "eyecatch not found", "path": file_path}}
+
+        prepared = await asyncio.to_thread(self._prepare_eyecatch, file_path)
+        if not prepared.get("ok"):
+            return prepared
+        eye = prepared["data"]
+
+        try:
+            content = await asyncio.to_thread(self._read_bytes, eye["path"])
+            resp = await http.post(
+                EYECATCH_URL,
+                headers=headers,
+                files={"file": ("blob", content, eye["mime"])},
+                data={"note_id": note_id, "width": eye["width"], "height": eye["height"]},
+                idempotent=True,
+                body="discard",
+            )
+            if not resp.get("ok"):
+                return {"ok": False, "error": {"type": "EyecatchUploadFailed", "status_code": resp.get("status_code"), "detail": resp.get("text")}}
+            return {"ok": True, "data": {"uploaded": True}}
+        except Exception as e:
+            return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "upload_eyecatch"}}
+
+    def _prepare_upload(self, file_path: str, digest: str) -> Dict[str, Any]:
+        # optimizer があれば縮小・再エンコード済みのファイルをアップロードする
+        upload_path = file_path
+        mime = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        if self.optimizer is not None:
+            opt = self.optimizer.optimize(file_path, digest)
+            if not opt.get("ok"):
+                return opt
+            upload_path, mime = opt["data"]["path"], opt["data"]["mime"]
+
+        ext = os.path.splitext(upload_path)[1] or ".png"
+        uuid_name = f"{uuid.uuid4().hex}{ext}"
+        return {"ok": True, "data": {"path": upload_path, "uuid_name": uuid_name, "mime": mime}}
+
+    def _prepare_eyecatch(self, file_path: str) -> Dict[str, Any]:
+        # optimizer が無い場合は従来どおり 1920x1080 として送る
+        if self.optimizer is None:
+            mime = mimetypes.guess_type(file_path)[0] or "image/png"
+            return {"ok": True, "data": {"path": file_path, "mime": mime, "width": 1920, "height": 1080}}
+        return self.optimizer.fit_eyecatch(file_path)
+
+    @staticmethod
+    def _presign_data(presign: Dict[str, Any]) -> Dict[str, Any]:
+        if not presign.get("ok") or not presign.get("json"):
+            return {"ok": False, "error": {"type": "PresignFailed", "status_code": presign.get("status_code"), "detail": presign.get("text")}}
+
+        data = (presign["json"] or {}).get("data") or {}
+        if "action" not in data:
+            return {"ok": False, "error": {"type": "PresignInvalid", "message": "missing action", "detail": data}}
+        return {"ok": True, "data": data}
+
+    @staticmethod
+    def _read_bytes(file_path: str) -> bytes:
+        with open(file_path, "rb") as f:
+            return f.read()
+
+    def _lookup_path(self, file_path: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self.uploaded.get(file_path)
+            if result is None:
+                return None
+            self.uploaded.move_to_end(file_path)
+        return {"ok": True, "data": {"url": result[0], "path": result[1], "cached": True}}
+
+    def _lookup_digest(self, file_path: str, digest: str) -> Optional[Dict[str, Any]]:
+        # 同じ内容の画像が別パスで既にアップロード済みなら再利用する
+        with self._lock:
+            result = self._digests.get(digest)
+        if result is None and self.cache is not None:
+            try:
+                result = self.cache.get(digest)
+            except Exception:
+                result = None
+        if result is None:
+            return None
+        self._remember_memory(file_path, digest, result)
+        return {"ok": True, "data": {"url": result[0], "path": result[1], "cached": True}}
+
+    def _remember_memory(self, file_path: str, digest: str, result: Tuple[str, str]) -> None:
+        with self._lock:
+            for lru, key in ((self.uploaded, file_path), (self._digests, digest)):
+                lru[key] = result
+                lru.move_to_end(key)
+                while len(lru) > self.max_memory_entries:
+                    lru.popitem(last=False)
+
+    def _remember(self, file_path: str, digest: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        result = (data.get("url"), data.get("path"))
+        if not result[0] or not result[1]:
+            return {"ok": False, "error": {"type": "UploadResultInvalid", "detail": data}}
+
+        self._remember_memory(file_path, digest, result)
+        if self.cache is not None:
+            try:
+                self.cache.put(digest, result[0], result[1])
+            except Exception:
+                # 永続キャッシュへの保存失敗でアップロード自体は失敗にしない
+                pass
+        return {"ok": True, "data": {"url": result[0], "path": result[1], "cached": False}}
+
+
+def _image_not_found(file_path: str) -> Dict[str, Any]:
+    return {"ok": False, "error": {"type": "FileNotFound", "message": "image not found", "path": file_path}}
@@ -0,0 +1,203 @@
+from __future__ import annotations
+import re
+import threading
+import urllib.parse
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Hook = Callable[[Dict[str, Any]], None]
+
+# URL のうち記事ごと・ユーザーごとに変わる部分をまとめる (メトリクスのラベルが増えすぎないように)
+_PATH_TEMPLATES: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"^/api/v2/creators/[^/]+/"), "/api/v2/creators/{user}/"),
+    (re.compile(r"^/[^/]+/m/[^/]+$"), "/{user}/m/{key}"),
+    (re.compile(r"^/[^/]+/n/[^/]+$"), "/{user}/n/{key}"),
+]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def url_template(url: str) -> str:
+    """クエリを落とし、数字だけのパス要素を {id} にした URL"""
+    parts = urllib.parse.urlsplit(url)
+    path = "/".join("{id}" if seg.isdigit() else seg for seg in parts.path.split("/"))
+    for pattern, template in _PATH_TEMPLATES:
+        path = pattern.sub(template, path)
+    return f"{parts.scheme}://{parts.netloc}{path}"
+
+
+class Instrumentation:
+    """
+    計測イベントをフックに配る
+
+    イベントは dict で、kind ごとに次のキーを持つ
+    - "http":    method / url (url_template 済み) / status (接続エラーなら None) / error /
+                 bytes_sent / bytes_received / latency
+    - "stage":   stage (auth / parse / magazines / create / eyecatch / draft_save / temp_save / put) / duration / ok
+                 ステージは入れ子にしないので、同じ投稿の duration を足しても二重に数えない
+    - "publish": ok / duration / error (失敗時の error.type)
+
+    フックは呼び出し元のスレッド (asyncio ならイベントループ) で同期的に呼ばれる。
+    フック内の例外は無視する
+    """
+
+    def __init__(self, hooks: Optional[List[Hook]] = None):
+        self._hooks: List[Hook] = list(hooks or [])
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Hook) -> None:
+        with self._lock:
+            self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook: Hook) -> None:
+        with self._lock:
+            self._hooks = [h for h in self._hooks if h is not hook]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._hooks)
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        for hook in self._hooks:
+            try:
+                hook(event)
+            except Exception:
+                pass
+
+    def http(
+        self,
+        method: str,
+        url: str,
+        status: Optional[int],
+        latency: float,
+        bytes_sent: Optional[int] = None,
+        bytes_received: Optional[int] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        if not self._hooks:
+            return
+        self.emit({
+            "kind": "http",
+            "method": method,
+            "url": url_template(url),
+            "status": status,
+            "error": error,
+            "bytes_sent": bytes_sent,
+            "bytes_received": bytes_received,
+            "latency": latency,
+        })
+
+    def stages(self, timings: Dict[str, float], ok: bool) -> None:
+        if not self._hooks:
+            return
+        for stage, duration in timings.items():
+            if stage != "total":
+                self.emit({"kind": "stage", "stage": stage, "duration": duration, "ok": ok})
+
+    def publish(self, result: Dict[str, Any], duration: float) -> None:
+        if not self._hooks:
+            return
+        error = None if result.get("ok") else (result.get("error") or {}).get("type")
+        self.emit({"kind": "publish", "ok": bool(result.get("ok")), "duration": duration, "error": error})
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+
+class PrometheusMetrics:
+    """
+    Instrumentation のフックとして登録し、Prometheus のテキスト形式で書き出す
+
+        metrics = PrometheusMetrics()
+        client.instrumentation.add_hook(metrics)
+        print(metrics.render())
+    """
+
+    def __init__(self, prefix: str = "noteclient2", buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets))
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: Dict[str, Any]) -> None:
+        kind = event.get("kind")
+        if kind == "http":
+            labels = {"method": event["method"], "url": event["url"]}
+            status = str(event["status"]) if event["status"] is not None else (event.get("error") or "error")
+            self._inc("http_requests_total", {**labels, "status": status})
+            self._observe("http_request_duration_seconds", labels, event["latency"])
+            if event.get("bytes_sent"):
+                self._inc("http_sent_bytes_total", labels, event["bytes_sent"])
+            if event.get("bytes_received"):
+                self._inc("http_received_bytes_total", labels, event["bytes_received"])
+        elif kind == "stage":
+            self._observe("stage_duration_seconds", {"stage": event["stage"]}, event["duration"])
+        elif kind == "publish":
+            self._inc("publish_total", {"ok": "true" if event["ok"] else "false"})
+            self._observe("publish_duration_seconds", {}, event["duration"])
+
+    def _inc(self, name: str, labels: Dict[str, str], value: float = 1.0) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def _observe(self, name: str, labels: Dict[str, str], value: float) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist.counts[i] += 1
+            hist.total += value
+            hist.count += 1
+
+    def render(self) -> str:
+        """Prometheus テキスト形式 (/metrics の本文)"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, (list(h.counts), h.total, h.count)) for k, h in self._histograms.items())
+
+        lines: List[str] = []
+        seen = set()
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(labels)} {_number(value)}")
+
+        for (name, labels), (counts, total, count) in histograms:
+            metric = f"{self.prefix}_{name}"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            for bound, n in zip(self.buckets, counts):
+                lines.append(f"{metric}_bucket{_labels(labels + (('le', _number(bound)),))} {n}")
+            lines.append(f"{metric}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{metric}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{metric}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
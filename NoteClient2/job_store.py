@@ -0,0 +1,207 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from ._sqlite import ThreadConnections
+
+STATUSES = ("pending", "running", "done", "failed")
+
+
+class JobStore:
+    """
+    投稿ジョブの永続キュー (SQLite)
+
+    - ジョブは publish() のキーワード引数の dict (md_file_path はパス)。key を付けると同じジョブを二重に積まない
+    - NoteClient2.publish_queue() が publish(progress=...) 経由でステージごとの途中経過を記録する
+      作成した下書き (note_id / note_key)・アイキャッチ済みか・parse 結果 (image_keys を含む)・マガジン ID・最後に終わったステージ
+    - 落ちたあとにもう一度 publish_queue() を呼ぶと、running / pending のジョブを記録した段階の続きから再開する
+      (下書きを作り直さない。画像は同じファイルの ImageCache で再アップロードしない)
+    - 記事作成 API の応答を受けてから記録するまでの間に落ちた場合だけは、下書きが 1 つ余分にできうる
+    - 1 つのファイルを同時に使う publish_queue() は 1 つまで
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        self._connections = ThreadConnections(self.path, row_factory=sqlite3.Row)
+
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " job_key TEXT UNIQUE,"
+                " job TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " stage TEXT,"
+                " note_id INTEGER,"
+                " note_key TEXT,"
+                " note_data TEXT,"
+                " eyecatch_uploaded INTEGER NOT NULL DEFAULT 0,"
+                " image_keys TEXT,"
+                " parsed TEXT,"
+                " magazine_ids TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " result TEXT,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    # --- queue ---
+
+    def add(self, job: Dict[str, Any], key: Optional[str] = None) -> int:
+        """ジョブを積んで id を返す (key が既にあれば積まずに既存の id)"""
+        job = {k: os.fspath(v) if isinstance(v, os.PathLike) else v for k, v in job.items()}
+        try:
+            encoded = json.dumps(job, ensure_ascii=False)
+        except TypeError as e:
+            raise ValueError(f"job must be JSON serializable (md_file_path はパスで渡す): {e}") from None
+        now = time.time()
+        with self._conn() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_key, job, status, created_at, updated_at) VALUES (?, ?, 'pending', ?, ?)",
+                (key, encoded, now, now),
+            )
+            if cur.rowcount:
+                return int(cur.lastrowid)
+            return int(conn.execute("SELECT id FROM jobs WHERE job_key = ?", (key,)).fetchone()[0])
+
+    def claim(self) -> Iterator[Dict[str, Any]]:
+        """
+        running (前回落ちたもの)・pending のジョブを id 順に running にして
+        {"id", "job", "resume"} を返す。resume は publish(resume=...) にそのまま渡せる
+        """
+        last_id = 0
+        while True:
+            with self._conn() as conn:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status IN ('pending', 'running') AND id > ? ORDER BY id LIMIT 1",
+                    (last_id,),
+                ).fetchone()
+                if row is None:
+                    return
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (time.time(), row["id"]),
+                )
+            last_id = row["id"]
+            yield {"id": row["id"], "job": json.loads(row["job"]), "resume": self._resume(row)}
+
+    def recorder(self, job_id: int) -> Callable[[str, Dict[str, Any]], None]:
+        """publish(progress=...) に渡す、ステージの結果を記録する関数"""
+        def record(stage: str, data: Dict[str, Any]) -> None:
+            fields: Dict[str, Any] = {"stage": stage}
+            if stage == "create":
+                fields.update(note_id=data["note_id"], note_key=data["note_key"], note_data=json.dumps(data["note_data"], ensure_ascii=False))
+            elif stage == "eyecatch":
+                fields["eyecatch_uploaded"] = 1
+            elif stage == "parse":
+                fields.update(
+                    parsed=json.dumps(data["parsed"], ensure_ascii=False),
+                    image_keys=json.dumps(data["parsed"].get("image_keys") or []),
+                )
+            elif stage == "magazines":
+                fields["magazine_ids"] = json.dumps(data["magazine_ids"])
+            self._update(job_id, fields)
+        return record
+
+    def finish(self, job_id: int, result: Dict[str, Any]) -> None:
+        if result.get("ok"):
+            # 投稿が済んだら parse 結果 (本文 HTML) は要らない
+            self._update(job_id, {
+                "status": "done",
+                "stage": "done",
+                "parsed": None,
+                "result": json.dumps(result.get("data"), ensure_ascii=False, default=str),
+                "error": None,
+            })
+            return
+        error = dict(result.get("error") or {})
+        error.pop("resume", None)  # 再開用の状態は列に記録済み
+        self._update(job_id, {"status": "failed", "error": json.dumps(error, ensure_ascii=False, default=str)})
+
+    def retry_failed(self) -> int:
+        """failed のジョブを pending に戻し (途中経過は残る)、戻した件数を返す"""
+        with self._conn() as conn:
+            return conn.execute("UPDATE jobs SET status = 'pending', updated_at = ? WHERE status = 'failed'", (time.time(),)).rowcount
+
+    # --- inspection ---
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._summary(row) if row is not None else None
+
+    def jobs(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        if status is not None and status not in STATUSES:
+            raise ValueError(f"unknown status: {status!r} (choose from {', '.join(STATUSES)})")
+        if status is None:
+            rows = self._conn().execute("SELECT * FROM jobs ORDER BY id").fetchall()
+        else:
+            rows = self._conn().execute("SELECT * FROM jobs WHERE status = ? ORDER BY id", (status,)).fetchall()
+        return [self._summary(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """status ごとの件数と、未完了 (pending + running) の queued"""
+        counts = {status: 0 for status in STATUSES}
+        for status, count in self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            counts[status] = count
+        counts["queued"] = counts["pending"] + counts["running"]
+        counts["total"] = sum(counts[s] for s in STATUSES)
+        return counts
+
+    def close(self) -> None:
+        # 使ったすべてのスレッドの接続を閉じる
+        self._connections.close()
+
+    # --- internals ---
+
+    def _update(self, job_id: int, fields: Dict[str, Any]) -> None:
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._conn() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    @staticmethod
+    def _resume(row: sqlite3.Row) -> Optional[Dict[str, Any]]:
+        resume: Dict[str, Any] = {}
+        if row["note_id"] is not None:
+            resume.update(
+                note_id=row["note_id"],
+                note_key=row["note_key"],
+                note_data=json.loads(row["note_data"]),
+                eyecatch_uploaded=bool(row["eyecatch_uploaded"]),
+            )
+        if row["parsed"] is not None:
+            resume["parsed"] = json.loads(row["parsed"])
+        if row["magazine_ids"] is not None:
+            resume["magazine_ids"] = json.loads(row["magazine_ids"])
+        return resume or None
+
+    @staticmethod
+    def _summary(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "key": row["job_key"],
+            "job": json.loads(row["job"]),
+            "status": row["status"],
+            "stage": row["stage"],
+            "note_id": row["note_id"],
+            "note_key": row["note_key"],
+            "eyecatch_uploaded": bool(row["eyecatch_uploaded"]),
+            "image_keys": json.loads(row["image_keys"]) if row["image_keys"] else [],
+            "magazine_ids": json.loads(row["magazine_ids"]) if row["magazine_ids"] else None,
+            "attempts": row["attempts"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": json.loads(row["error"]) if row["error"] else None,
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
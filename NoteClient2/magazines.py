@@ -1,16 +1,179 @@
 from __future__ import annotations
+import json
+import os
 import re
-from typing import Any, Dict, Optional
+import tempfile
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from .http import HttpClient
 
+CREATOR_MAGAZINES_URL = "https://note.com/api/v2/creators/{user_urlname}/contents?kind=magazine&page={page}"
+
 class MagazineResolver:
+    """
+    マガジンキー -> マガジン ID の解決
+
+    - 解決結果は ttl 秒のあいだメモリ (と cache_file があればディスク) に保持する
+    - まとめて解決するときは、まず user_urlname のマガジン一覧 API で一括取得し、
+      残りだけ公開ページを並行に取得する
+    - 同じ一覧・同じキーの取得が同時に来たら、先に始まった 1 回を待ち合わせる
+      (スレッドは Future、asyncio は同じイベントループの Task)
+    """
+
+    def __init__(self, cache_file: Optional[str] = None, ttl: float = 24 * 3600, max_pages: int = 10):
+        self.cache_file = os.path.expanduser(cache_file) if cache_file else None
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self._index: Dict[str, Tuple[int, float]] = {}  # "user/key" -> (magazine_id, fetched_at)
+        self._listed: Dict[str, float] = {}  # user_urlname -> 一覧 API を試した時刻
+        # ("list", user_urlname) / ("page", user_urlname, key) -> 取得中の Future (asyncio は先頭にイベントループ、値は Task)
+        self._inflight: Dict[Tuple[Any, ...], Any] = {}
+        self._lock = threading.Lock()
+        # ファイルの読み直しから書き込みまでを 1 スレッドずつにする (古い内容で上書きしない)
+        self._save_lock = threading.Lock()
+        self._load()
+
     def get_magazine_id(self, http: HttpClient, user_urlname: str, headers: Dict[str, str], magazine_key: str) -> Dict[str, Any]:
         if not magazine_key:
             return {"ok": True, "data": {"magazine_id": None}}
 
-        url = f"https://note.com/{user_urlname}/m/{magazine_key}"
-        res = http.get(url, headers={"User-Agent": headers.get("User-Agent", "")})
+        cached = self._cached(user_urlname, magazine_key)
+        if cached is not None:
+            return {"ok": True, "data": {"magazine_id": cached, "cached": True}}
+
+        def fetch() -> Dict[str, Any]:
+            url = f"https://note.com/{user_urlname}/m/{magazine_key}"
+            res = http.get(url, headers={"User-Agent": headers.get("User-Agent", "")})
+            return self._store_result(user_urlname, magazine_key, self._extract_id(res, url))
+
+        return self._join(("page", user_urlname, magazine_key), fetch)
+
+    async def aget_magazine_id(self, http: Any, user_urlname: str, headers: Dict[str, str], magazine_key: str) -> Dict[str, Any]:
+        """get_magazine_id() の asyncio 版 (http は AsyncHttpClient)"""
+        if not magazine_key:
+            return {"ok": True, "data": {"magazine_id": None}}
+
+        cached = self._cached(user_urlname, magazine_key)
+        if cached is not None:
+            return {"ok": True, "data": {"magazine_id": cached, "cached": True}}
+
+        async def fetch() -> Dict[str, Any]:
+            url = f"https://note.com/{user_urlname}/m/{magazine_key}"
+            res = await http.get(url, headers={"User-Agent": headers.get("User-Agent", "")})
+            return self._store_result(user_urlname, magazine_key, self._extract_id(res, url))
+
+        return await self._ajoin(("page", user_urlname, magazine_key), fetch)
+
+    def get_magazine_ids(
+        self,
+        http: HttpClient,
+        user_urlname: str,
+        headers: Dict[str, str],
+        magazine_keys: List[str],
+        max_workers: int = 4,
+    ) -> Dict[str, Any]:
+        """
+        複数キーをまとめて解決する
+
+        戻り値 data.magazine_ids はキーの順で、ID が取れなかったものは含まない
+        """
+        keys = [k for k in magazine_keys if k]
+        if self._misses(user_urlname, keys):
+            # 一覧の取得中に来た呼び出しは、個別取得に進まず一覧を待つ
+            self._join(("list", user_urlname), lambda: self._list(http, user_urlname, headers))
+
+        misses = self._misses(user_urlname, keys)
+        if len(misses) > 1 and max_workers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(misses))) as executor:
+                results = list(executor.map(lambda k: self.get_magazine_id(http, user_urlname, headers, k), misses))
+        else:
+            results = [self.get_magazine_id(http, user_urlname, headers, k) for k in misses]
+        return self._collect(user_urlname, keys, misses, results)
+
+    async def aget_magazine_ids(self, http: Any, user_urlname: str, headers: Dict[str, str], magazine_keys: List[str]) -> Dict[str, Any]:
+        """get_magazine_ids() の asyncio 版 (http は AsyncHttpClient)"""
+        import asyncio
+
+        keys = [k for k in magazine_keys if k]
+        if self._misses(user_urlname, keys):
+            await self._ajoin(("list", user_urlname), lambda: self._alist(http, user_urlname, headers))
+
+        misses = self._misses(user_urlname, keys)
+        results = await asyncio.gather(*(self.aget_magazine_id(http, user_urlname, headers, k) for k in misses))
+        return self._collect(user_urlname, keys, misses, list(results))
+
+    def _list(self, http: HttpClient, user_urlname: str, headers: Dict[str, str]) -> Dict[str, Any]:
+        if self._should_list(user_urlname):
+            for page in range(1, self.max_pages + 1):
+                res = http.get(CREATOR_MAGAZINES_URL.format(user_urlname=user_urlname, page=page), headers={"User-Agent": headers.get("User-Agent", "")})
+                if not self._store_listing(user_urlname, res):
+                    break
+        return {"ok": True, "data": None}
+
+    async def _alist(self, http: Any, user_urlname: str, headers: Dict[str, str]) -> Dict[str, Any]:
+        if self._should_list(user_urlname):
+            for page in range(1, self.max_pages + 1):
+                res = await http.get(CREATOR_MAGAZINES_URL.format(user_urlname=user_urlname, page=page), headers={"User-Agent": headers.get("User-Agent", "")})
+                if not self._store_listing(user_urlname, res):
+                    break
+        return {"ok": True, "data": None}
+
+    # --- single-flight ---
+
+    def _join(self, key: Tuple[str, ...], fetch: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """key の取得が別スレッドで走っていればその結果を待ち、なければ fetch() する"""
+        from concurrent.futures import Future
+
+        with self._lock:
+            future = self._inflight.get(key)
+            started = future is None
+            if started:
+                future = self._inflight[key] = Future()
+        if not started:
+            return _copy_result(future.result())
+        try:
+            result = fetch()
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return _copy_result(result)
+
+    async def _ajoin(self, key: Tuple[str, ...], fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """_join() の asyncio 版 (同じイベントループの Task を待ち合わせる)"""
+        import asyncio
+
+        flight = (asyncio.get_running_loop(), *key)
+        task = self._inflight.get(flight)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[flight] = task
+            task.add_done_callback(lambda _: self._inflight.pop(flight, None))
+        # 待っている側が取り消されても、ほかの呼び出しが待つ取得は止めない
+        return _copy_result(await asyncio.shield(task))
+
+    def _collect(self, user_urlname: str, keys: List[str], misses: List[str], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        for r in results:
+            if not r.get("ok"):
+                return r
+        fetched = {k: (r.get("data") or {}).get("magazine_id") for k, r in zip(misses, results)}
+
+        magazine_ids: List[int] = []
+        for key in keys:
+            mid = fetched[key] if key in fetched else self._cached(user_urlname, key)
+            if mid:
+                magazine_ids.append(mid)
+        return {"ok": True, "data": {"magazine_ids": magazine_ids, "fetched": len(misses)}}
+
+    @staticmethod
+    def _extract_id(res: Dict[str, Any], url: str) -> Dict[str, Any]:
         if not res.get("ok"):
             return {"ok": False, "error": {"type": "MagazinePageFetchFailed", "status_code": res.get("status_code"), "detail": res.get("text"), "url": url}}
 
@@ -25,3 +188,87 @@ class MagazineResolver:
             return {"ok": True, "data": {"magazine_id": int(m2.group(1))}}
 
         return {"ok": False, "error": {"type": "MagazineIdNotFound", "message": "magazine id not found in html", "url": url}}
+
+    # --- cache ---
+
+    def _cached(self, user_urlname: str, magazine_key: str) -> Optional[int]:
+        with self._lock:
+            entry = self._index.get(f"{user_urlname}/{magazine_key}")
+        if entry is None or time.time() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def _misses(self, user_urlname: str, keys: List[str]) -> List[str]:
+        return [k for k in dict.fromkeys(keys) if self._cached(user_urlname, k) is None]
+
+    def _should_list(self, user_urlname: str) -> bool:
+        # 一覧 API は ttl ごとに 1 回だけ試す (失敗しても個別取得にフォールバック)
+        now = time.time()
+        with self._lock:
+            if now - self._listed.get(user_urlname, 0.0) <= self.ttl:
+                return False
+            self._listed[user_urlname] = now
+        return True
+
+    def _store_listing(self, user_urlname: str, res: Dict[str, Any]) -> bool:
+        """一覧 API の 1 ページ分を取り込む。次のページがあれば True"""
+        if not res.get("ok"):
+            return False
+        data = (res.get("json") or {}).get("data") or {}
+        contents = data.get("contents") or []
+        entries = {c["key"]: c["id"] for c in contents if isinstance(c, dict) and c.get("key") and c.get("id")}
+        self._put(user_urlname, entries)
+        return bool(contents) and not data.get("isLastPage", True)
+
+    def _store_result(self, user_urlname: str, magazine_key: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        mid = (result.get("data") or {}).get("magazine_id") if result.get("ok") else None
+        if mid:
+            self._put(user_urlname, {magazine_key: mid})
+        return result
+
+    def _put(self, user_urlname: str, entries: Dict[str, int]) -> None:
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            for key, mid in entries.items():
+                self._index[f"{user_urlname}/{key}"] = (int(mid), now)
+        self._save()
+
+    def _load(self) -> None:
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            with self._lock:
+                for k, v in raw.items():
+                    entry = (int(v["id"]), float(v["fetched_at"]))
+                    if k not in self._index or self._index[k][1] < entry[1]:
+                        self._index[k] = entry
+        except Exception:
+            # 壊れたキャッシュは無視して取り直す
+            pass
+
+    def _save(self) -> None:
+        if not self.cache_file:
+            return
+        try:
+            with self._save_lock:
+                # 他プロセスの書き込みを取り込んでから、一時ファイル経由で置き換える
+                self._load()
+                with self._lock:
+                    raw = {k: {"id": v[0], "fetched_at": v[1]} for k, v in self._index.items()}
+                parent = os.path.dirname(self.cache_file) or "."
+                os.makedirs(parent, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=parent, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(raw, f, ensure_ascii=False)
+                os.replace(tmp, self.cache_file)
+        except Exception:
+            pass
+
+
+def _copy_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    # 呼び出し側が error に書き足すので、中の dict は呼び出しごとに分ける
+    return {k: dict(v) if isinstance(v, dict) else v for k, v in result.items()}
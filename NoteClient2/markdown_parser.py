@@ -1,15 +1,27 @@
 from __future__ import annotations
 import os
 import re
-from typing import Any, Dict, List, Tuple, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, TextIO, Tuple, Union
 
-from .utils import gen_uuid
+from .utils import ID_STRATEGIES, ContentIds, gen_uuid
 from .http import HttpClient
 from .images import ImageManager
+from .note_ir import Block, NoteIR, list_block, render
+
+# ファイルパス、テキストストリーム、行の iterable のいずれか
+MarkdownSource = Union[str, "os.PathLike[str]", Iterable[str]]
+
+# (ブロックの種類, 内容) から ID を返す
+IdGenerator = Callable[..., str]
 
 class MarkdownParser:
-    def __init__(self, image_manager: ImageManager):
+    def __init__(self, image_manager: ImageManager, image_concurrency: int = 4, id_strategy: str = "random"):
+        if id_strategy not in ID_STRATEGIES:
+            raise ValueError(f"unknown id_strategy: {id_strategy!r} (choose from {', '.join(ID_STRATEGIES)})")
         self.image_manager = image_manager
+        self.image_concurrency = image_concurrency
+        # "random": ブロックごとに uuid4、"content": 種類と内容から決まる ID (同じ Markdown から同じ HTML になる)
+        self.id_strategy = id_strategy
         self.img_pattern = re.compile(r'!\[(.*?)\]\((.*?)\)')
 
     def _parse_inline(self, text: str) -> str:
@@ -19,108 +31,217 @@ class MarkdownParser:
         text = re.sub(r'~~(.+?)~~', r'<s>\1</s>', text)
         return text
 
-    def _build_list_html(self, buffer: List[Dict[str, Any]]) -> Tuple[str, Optional[str]]:
-        if not buffer:
-            return "", None
-
-        html_output: List[str] = []
-        first = buffer[0]
-        is_ordered_root = bool(re.match(r'^\d+\.', first['marker']))
-        root_type = 'ol' if is_ordered_root else 'ul'
-
-        root_uid = gen_uuid()
-        if root_type == 'ol':
-            html_output.append(f'<{root_type} data-start="1" name="{root_uid}" id="{root_uid}">')
-        else:
-            html_output.append(f'<{root_type} name="{root_uid}" id="{root_uid}">')
-
-        tag_stack = [{'indent': first['indent'], 'type': root_type}]
-
-        for item in buffer:
-            indent = item['indent']
-            marker = item['marker']
-            content_text = item['clean_text']
-            content_inner = self._parse_inline(content_text)
-
-            p_uid = gen_uuid()
-            list_content = f'<p name="{p_uid}" id="{p_uid}">{content_inner}</p>'
-
-            current_item_type = 'ol' if re.match(r'^\d+\.', marker) else 'ul'
-            current_stack = tag_stack[-1]
-
-            if indent > current_stack['indent']:
-                new_uid = gen_uuid()
-                if current_item_type == 'ol':
-                    html_output.append(f'<{current_item_type} data-start="1" name="{new_uid}" id="{new_uid}">')
-                else:
-                    html_output.append(f'<{current_item_type} name="{new_uid}" id="{new_uid}">')
-                tag_stack.append({'indent': indent, 'type': current_item_type})
-
-            elif indent < current_stack['indent']:
-                while tag_stack and tag_stack[-1]['indent'] > indent:
-                    closed = tag_stack.pop()
-                    html_output.append(f"</{closed['type']}>")
-
-            else:
-                if current_item_type != current_stack['type']:
-                    html_output.append(f"</{current_stack['type']}>")
-                    tag_stack.pop()
-                    new_uid = gen_uuid()
-                    if current_item_type == 'ol':
-                        html_output.append(f'<{current_item_type} data-start="1" name="{new_uid}" id="{new_uid}">')
-                    else:
-                        html_output.append(f'<{current_item_type} name="{new_uid}" id="{new_uid}">')
-                    tag_stack.append({'indent': indent, 'type': current_item_type})
-
-            html_output.append(f'<li>{list_content}</li>')
-
-        while tag_stack:
-            closed = tag_stack.pop()
-            html_output.append(f"</{closed['type']}>")
-
-        return "".join(html_output), root_uid
+    def _new_ids(self) -> IdGenerator:
+        """文書 1 つ分の ID の振り方"""
+        if self.id_strategy == "content":
+            return ContentIds()
+        return lambda kind, content="": gen_uuid()
+
+    def _build_list(self, buffer: List[Tuple[int, bool, str]], new_id: IdGenerator) -> Block:
+        return list_block(buffer, new_id, self._parse_inline)
+
+    def parse(
+        self,
+        http: HttpClient,
+        headers: Dict[str, str],
+        md_path: MarkdownSource,
+        free_writer: Optional[TextIO] = None,
+        pay_writer: Optional[TextIO] = None,
+    ) -> Dict[str, Any]:
+        """
+        Markdown を note 用 HTML に変換する
+
+        - md_path はファイルパスのほか、テキストストリームや行の iterable でもよい (1 行ずつ読む)
+        - free_writer / pay_writer を渡すと、その部分の HTML は文字列にせず writer.write() に順に書き出す
+          (戻り値の free_html / pay_html / combined_html は None、書いた文字数が free_length / pay_length に入る)
+        - parse_ir() + render_ir() と同じ
+        """
+        parsed = self.parse_ir(md_path)
+        if not parsed.get("ok"):
+            return parsed
+        ir = parsed["data"]
+        uploaded = self._upload_images(http, headers, self._source_name(md_path), ir.image_paths())
+        if not uploaded.get("ok"):
+            return uploaded
+        # IR はここでしか使わないので、描画しながら手放す
+        return self._render(ir, uploaded["data"], free_writer, pay_writer, consume=True)
+
+    def parse_ir(self, md_path: MarkdownSource) -> Dict[str, Any]:
+        """
+        Markdown をブロック列 (NoteIR) にする (画像はアップロードしない)
+
+        IR は pickle / to_dict() で保存や別プロセスへの受け渡しができ、render_ir() で何度でも HTML にできる
+        """
+        return self._tokenize_source(md_path)
+
+    def prepare(self, md_path: MarkdownSource) -> Dict[str, Any]:
+        """
+        parse() のうちネットワークを使わない部分: parse_ir() のあと、画像ファイルがあるかを確かめる (アップロードはしない)
+
+        何度やっても失敗する誤り (<pay> の書き方、画像が無いなど) をアップロードや記事作成の前に返すためのもの
+        """
+        parsed = self.parse_ir(md_path)
+        if not parsed.get("ok"):
+            return parsed
+        for img_path in parsed["data"].image_paths():
+            checked = self.image_manager.check_image(img_path)
+            if not checked.get("ok"):
+                return self._image_error(checked, self._source_name(md_path), img_path)
+        return parsed
+
+    def render_ir(
+        self,
+        http: HttpClient,
+        headers: Dict[str, str],
+        ir: NoteIR,
+        free_writer: Optional[TextIO] = None,
+        pay_writer: Optional[TextIO] = None,
+        md_path: str = "<ir>",
+        consume: bool = False,
+        body_length: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        IR の画像をアップロードして HTML にする (戻り値は parse() と同じ。md_path はエラーに入れる名前)
+
+        consume=True なら描画しながら IR を手放す (あとで IR を使わないとき)。body_length=True なら body_length も数える (note_ir.render())
+        """
+        uploaded = self._upload_images(http, headers, md_path, ir.image_paths())
+        if not uploaded.get("ok"):
+            return uploaded
+        return self._render(ir, uploaded["data"], free_writer, pay_writer, consume, body_length)
+
+    def _upload_images(self, http: HttpClient, headers: Dict[str, str], md_path: str, paths: List[str]) -> Dict[str, Any]:
+        """
+        画像をまとめてアップロードする (最大 image_concurrency 件を並行)
+
+        失敗時は文書順で最初に失敗した画像のエラーを返し、未着手のアップロードは取り消す
+        """
+        uploads: Dict[str, Dict[str, Any]] = {}
+        if self.image_concurrency <= 1 or len(paths) <= 1:
+            for img_path in paths:
+                up = self.image_manager.upload_image(http, headers, img_path)
+                if not up.get("ok"):
+                    return self._image_error(up, md_path, img_path)
+                uploads[img_path] = up["data"]
+            return {"ok": True, "data": uploads}
 
-    def parse(self, http: HttpClient, headers: Dict[str, str], md_path: str) -> Dict[str, Any]:
-        if not os.path.exists(md_path):
-            return {"ok": False, "error": {"type": "FileNotFound", "message": "md not found", "path": md_path}}
+        from concurrent.futures import ThreadPoolExecutor
 
+        with ThreadPoolExecutor(max_workers=min(self.image_concurrency, len(paths))) as executor:
+            futures = [executor.submit(self.image_manager.upload_image, http, headers, p) for p in paths]
+            for img_path, future in zip(paths, futures):
+                up = future.result()
+                if not up.get("ok"):
+                    for rest in futures:
+                        rest.cancel()
+                    return self._image_error(up, md_path, img_path)
+                uploads[img_path] = up["data"]
+        return {"ok": True, "data": uploads}
+
+    async def aparse(
+        self,
+        http: Any,
+        headers: Dict[str, str],
+        md_path: MarkdownSource,
+        image_concurrency: Optional[int] = None,
+        free_writer: Optional[TextIO] = None,
+        pay_writer: Optional[TextIO] = None,
+    ) -> Dict[str, Any]:
+        """
+        parse() の asyncio 版
+
+        - http は AsyncHttpClient
+        - 画像は image_concurrency (省略時はコンストラクタの値) 件ずつ並行アップロードする
+        """
+        parsed = self.parse_ir(md_path)
+        if not parsed.get("ok"):
+            return parsed
+        return await self.arender_ir(http, headers, parsed["data"], image_concurrency, free_writer, pay_writer, self._source_name(md_path), consume=True)
+
+    async def arender_ir(
+        self,
+        http: Any,
+        headers: Dict[str, str],
+        ir: NoteIR,
+        image_concurrency: Optional[int] = None,
+        free_writer: Optional[TextIO] = None,
+        pay_writer: Optional[TextIO] = None,
+        md_path: str = "<ir>",
+        consume: bool = False,
+        body_length: bool = False,
+    ) -> Dict[str, Any]:
+        """render_ir() の asyncio 版"""
+        import asyncio
+
+        paths = ir.image_paths()
+        semaphore = asyncio.Semaphore(max(1, image_concurrency or self.image_concurrency))
+
+        async def upload(img_path: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.image_manager.aupload_image(http, headers, img_path)
+
+        results = await asyncio.gather(*(upload(p) for p in paths))
+
+        uploads: Dict[str, Dict[str, Any]] = {}
+        for img_path, up in zip(paths, results):
+            if not up.get("ok"):
+                return self._image_error(up, md_path, img_path)
+            uploads[img_path] = up["data"]
+
+        return self._render(ir, uploads, free_writer, pay_writer, consume, body_length)
+
+    def _tokenize_source(self, md_path: MarkdownSource) -> Dict[str, Any]:
+        # ファイル全体を readlines() せず、1 行ずつ _tokenize() に流す
         try:
+            if not isinstance(md_path, (str, os.PathLike)):
+                return self._tokenize(md_path)
+
+            if not os.path.exists(md_path):
+                return {"ok": False, "error": {"type": "FileNotFound", "message": "md not found", "path": os.fspath(md_path)}}
             with open(md_path, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-        except Exception as e:
+                return self._tokenize(f)
+        except (OSError, UnicodeDecodeError) as e:
             return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "read_md"}}
 
-        free_parts: List[str] = []
-        pay_parts: List[str] = []
-        current_parts = free_parts
+    @staticmethod
+    def _source_name(md_path: MarkdownSource) -> str:
+        if isinstance(md_path, (str, os.PathLike)):
+            return os.fspath(md_path)
+        return str(getattr(md_path, "name", "<stream>"))
+
+    @staticmethod
+    def _image_error(up: Dict[str, Any], md_path: str, img_path: str) -> Dict[str, Any]:
+        up["error"]["where"] = "markdown_image_upload"
+        up["error"]["md_path"] = md_path
+        up["error"]["image_path"] = img_path
+        return up
+
+    def _tokenize(self, lines: Iterable[str]) -> Dict[str, Any]:
+        """
+        Markdown をブロック列 (NoteIR) にする
+
+        画像はこの時点ではアップロードせず "img" ブロックとして残し、render() でアップロード結果を埋め込む
+        """
+        free_blocks: List[Block] = []
+        pay_blocks: List[Block] = []
+        current_blocks = free_blocks
 
-        image_keys: List[str] = []
         separator_id: Optional[str] = None
         last_block_id: Optional[str] = None
 
-        in_code_block = False
-        list_buffer: List[Dict[str, Any]] = []
+        code_lines: Optional[List[str]] = None
+        list_buffer: List[Tuple[int, bool, str]] = []
         pay_tag_count = 0
+        new_id = self._new_ids()
 
         def flush_list_buffer():
             nonlocal list_buffer, last_block_id
             if list_buffer:
-                l_html, l_uid = self._build_list_html(list_buffer)
-                current_parts.append(l_html)
-                last_block_id = l_uid
+                block = self._build_list(list_buffer, new_id)
+                current_blocks.append(block)
+                last_block_id = block[1]
                 list_buffer = []
 
-        def build_html(parts: List[str]) -> str:
-            final = ""
-            is_in_code = False
-            for part in parts:
-                if "<pre" in part:
-                    is_in_code = True
-                final += (part + "\n") if is_in_code else part
-                if "</pre>" in part:
-                    is_in_code = False
-            return final
-
         for line in lines:
             raw_line = line.rstrip("\r\n")
             stripped = raw_line.strip()
@@ -131,19 +252,20 @@ class MarkdownParser:
 
             if stripped.startswith("```"):
                 flush_list_buffer()
-                if not in_code_block:
-                    in_code_block = True
-                    uid = gen_uuid()
+                if code_lines is None:
                     lang = stripped.lstrip("`").strip()
-                    current_parts.append(f'<pre name="{uid}" id="{uid}" data-lang="{lang}"><code>')
+                    uid = new_id("pre", lang)
+                    code_lines = []
+                    current_blocks.append(("pre", uid, lang, code_lines, False))
                     last_block_id = uid
                 else:
-                    in_code_block = False
-                    current_parts.append("</code></pre>")
+                    # 閉じたコードブロックは閉じている印を付けて置き直す
+                    current_blocks[-1] = (*current_blocks[-1][:4], True)
+                    code_lines = None
                 continue
 
-            if in_code_block:
-                current_parts.append(raw_line)
+            if code_lines is not None:
+                code_lines.append(raw_line)
                 continue
 
             if not stripped:
@@ -152,20 +274,19 @@ class MarkdownParser:
 
             list_match = re.match(r'^(\s*)([-*]|\d+\.)\s+(.*)', raw_line)
             if list_match:
-                list_buffer.append({
-                    "indent": len(list_match.group(1)),
-                    "marker": list_match.group(2),
-                    "clean_text": list_match.group(3),
-                })
+                list_buffer.append((
+                    len(list_match.group(1)),
+                    bool(re.match(r'^\d+\.', list_match.group(2))),
+                    list_match.group(3),
+                ))
                 continue
             else:
                 flush_list_buffer()
 
             if "<toc>" in lower or "<table of content>" in lower:
-                uid = gen_uuid()
-                head_uid = gen_uuid()
-                current_parts.append(f'<h2 name="{head_uid}" id="{head_uid}">目次</h2>')
-                current_parts.append(f'<table-of-contents name="{uid}" id="{uid}"><br></table-of-contents>')
+                uid = new_id("toc")
+                head_uid = new_id("toc-heading")
+                current_blocks.append(("toc", uid, head_uid))
                 last_block_id = uid
                 continue
 
@@ -179,66 +300,61 @@ class MarkdownParser:
                 if last_block_id:
                     separator_id = last_block_id
 
-                current_parts = pay_parts
-                sep_uid = gen_uuid()
-                current_parts.append(f'<span name="{sep_uid}" id="{sep_uid}"></span>')
+                current_blocks = pay_blocks
+                sep_uid = new_id("pay")
+                current_blocks.append(("pay", sep_uid))
                 last_block_id = sep_uid
                 continue
 
             img_match = self.img_pattern.search(stripped)
             if img_match:
-                img_path = img_match.group(2)
-                up = self.image_manager.upload_image(http, headers, img_path)
-                if not up.get("ok"):
-                    up["error"]["where"] = "markdown_image_upload"
-                    up["error"]["md_path"] = md_path
-                    up["error"]["image_path"] = img_path
-                    return up
-
-                img_url = up["data"]["url"]
-                img_key_full = up["data"]["path"]
-
-                uid = gen_uuid()
-                current_parts.append(
-                    f'<figure name="{uid}" id="{uid}" class="note-image" data-image-key="{img_key_full}">'
-                    f'<a href="{img_url}" rel="noopener noreferrer" target="_blank">'
-                    f'<img src="{img_url}" alt="画像" data-src="{img_url}"></a>'
-                    f'<figcaption>{img_match.group(1)}</figcaption></figure>'
-                )
-                pure_key = os.path.splitext(os.path.basename(img_key_full))[0]
-                image_keys.append(pure_key)
+                uid = new_id("img", stripped)
+                current_blocks.append(("img", uid, img_match.group(1), img_match.group(2)))
                 last_block_id = uid
                 continue
 
-            uid = gen_uuid()
+            uid = new_id("block", stripped)
             line_content = self._parse_inline(stripped)
 
             if stripped.startswith("### "):
-                current_parts.append(f'<h3 name="{uid}" id="{uid}">{line_content.lstrip("# ").strip()}</h3>')
+                current_blocks.append(("h3", uid, line_content.lstrip("# ").strip()))
             elif stripped.startswith("# ") or stripped.startswith("## "):
-                current_parts.append(f'<h2 name="{uid}" id="{uid}">{line_content.lstrip("# ").strip()}</h2>')
+                current_blocks.append(("h2", uid, line_content.lstrip("# ").strip()))
             elif stripped.startswith("> "):
-                current_parts.append(f'<blockquote name="{uid}" id="{uid}">{line_content.lstrip("> ").strip()}</blockquote>')
+                current_blocks.append(("blockquote", uid, line_content.lstrip("> ").strip()))
             elif stripped.startswith("---") or stripped.startswith("***"):
-                current_parts.append(f'<hr name="{uid}" id="{uid}">')
+                current_blocks.append(("hr", uid))
             else:
-                current_parts.append(f'<p name="{uid}" id="{uid}">{line_content}</p>')
+                current_blocks.append(("p", uid, line_content))
 
             last_block_id = uid
 
         flush_list_buffer()
 
-        free_html = build_html(free_parts)
-        pay_html = build_html(pay_parts)
-
-        return {
-            "ok": True,
-            "data": {
-                "free_html": free_html,
-                "pay_html": pay_html,
-                "combined_html": free_html + pay_html,
-                "image_keys": image_keys,
-                "separator_id": separator_id,
-                "has_pay": pay_tag_count == 1,
-            },
-        }
+        return {"ok": True, "data": NoteIR(free_blocks, pay_blocks, separator_id, pay_tag_count == 1)}
+
+    def _render(
+        self,
+        ir: NoteIR,
+        uploads: Dict[str, Dict[str, Any]],
+        free_writer: Optional[TextIO] = None,
+        pay_writer: Optional[TextIO] = None,
+        consume: bool = False,
+        body_length: bool = False,
+    ) -> Dict[str, Any]:
+        return render(ir, uploads, free_writer, pay_writer, consume, body_length)
+
+
+# parser_engine で選べる Markdown パーサ (出力 HTML はどれも同じ)
+PARSER_ENGINES: Tuple[str, ...] = ("default", "fast")
+
+
+def parser_class(engine: str) -> type:
+    """parser_engine の名前から Markdown パーサのクラスを返す"""
+    if engine == "default":
+        return MarkdownParser
+    if engine == "fast":
+        # FastMarkdownParser はこのモジュールを読み込むので、循環しないよう使うときに読み込む
+        from .fast_markdown_parser import FastMarkdownParser
+        return FastMarkdownParser
+    raise ValueError(f"unknown parser_engine: {engine!r} (choose from {', '.join(PARSER_ENGINES)})")
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from ._sqlite import ThreadConnections
+
+
+class NoteCache:
+    """
+    書き出した記事の永続キャッシュ (SQLite)
+
+    - キーは記事キー。一覧の項目から作った version と、記事の詳細 (API の data) を持つ
+    - version が変わっていない記事は、次の書き出しで詳細を取り直さない
+    - 一覧に出てこなくなった記事は removed にする (行は消さない。また一覧に出てくれば戻る)
+    - SQLite のロックで複数プロセスから同じファイルを使っても安全
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        self._connections = ThreadConnections(self.path, row_factory=sqlite3.Row)
+
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS notes ("
+                " note_key TEXT PRIMARY KEY,"
+                " note_id INTEGER,"
+                " status TEXT NOT NULL,"
+                " version TEXT NOT NULL,"
+                " entry TEXT NOT NULL,"
+                " note TEXT NOT NULL,"
+                " removed INTEGER NOT NULL DEFAULT 0,"
+                " fetched_at REAL NOT NULL,"
+                " seen_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS notes_status ON notes (status, removed)")
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    # --- export ---
+
+    def versions(self) -> Dict[str, str]:
+        """{記事キー: version} (removed を含む)"""
+        return {row[0]: row[1] for row in self._conn().execute("SELECT note_key, version FROM notes")}
+
+    def put(self, note_key: str, status: str, version: str, entry: Dict[str, Any], note: Dict[str, Any], seen_at: Optional[float] = None) -> None:
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO notes (note_key, note_id, status, version, entry, note, removed, fetched_at, seen_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                (
+                    note_key,
+                    note.get("id") or entry.get("id"),
+                    status,
+                    version,
+                    json.dumps(entry, ensure_ascii=False),
+                    json.dumps(note, ensure_ascii=False),
+                    now,
+                    seen_at if seen_at is not None else now,
+                ),
+            )
+
+    def seen(self, note_keys: Iterable[str], seen_at: float) -> None:
+        """一覧に出てきた記事の seen_at を進める (removed なら戻す)"""
+        with self._conn() as conn:
+            conn.executemany(
+                "UPDATE notes SET seen_at = ?, removed = 0 WHERE note_key = ?",
+                ((seen_at, key) for key in note_keys),
+            )
+
+    def mark_removed(self, status: str, listed_at: float) -> List[str]:
+        """status の一覧を最後まで取った時刻 listed_at より前にしか見ていない記事を removed にし、そのキーを返す"""
+        with self._conn() as conn:
+            keys = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT note_key FROM notes WHERE status = ? AND removed = 0 AND seen_at < ?",
+                    (status, listed_at),
+                )
+            ]
+            conn.executemany("UPDATE notes SET removed = 1 WHERE note_key = ?", ((key,) for key in keys))
+        return keys
+
+    # --- inspection ---
+
+    def get(self, note_key: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM notes WHERE note_key = ?", (note_key,)).fetchone()
+        return self._summary(row) if row is not None else None
+
+    def notes(self, status: Optional[str] = None, include_removed: bool = False) -> Iterator[Dict[str, Any]]:
+        """記事を 1 件ずつ返す (全件をメモリに載せない)"""
+        query = "SELECT * FROM notes WHERE 1 = 1"
+        params: List[Any] = []
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        if not include_removed:
+            query += " AND removed = 0"
+        for row in self._conn().execute(query + " ORDER BY note_id", params):
+            yield self._summary(row)
+
+    def stats(self) -> Dict[str, int]:
+        """status ごとの件数 (removed を除く) と removed / total"""
+        counts: Dict[str, int] = {}
+        for status, count in self._conn().execute("SELECT status, COUNT(*) FROM notes WHERE removed = 0 GROUP BY status"):
+            counts[status] = count
+        counts["removed"] = self._conn().execute("SELECT COUNT(*) FROM notes WHERE removed = 1").fetchone()[0]
+        counts["total"] = self._conn().execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+        return counts
+
+    def close(self) -> None:
+        # 使ったすべてのスレッドの接続を閉じる
+        self._connections.close()
+
+    @staticmethod
+    def _summary(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "key": row["note_key"],
+            "id": row["note_id"],
+            "status": row["status"],
+            "version": row["version"],
+            "entry": json.loads(row["entry"]),
+            "note": json.loads(row["note"]),
+            "removed": bool(row["removed"]),
+            "fetched_at": row["fetched_at"],
+            "seen_at": row["seen_at"],
+        }
@@ -0,0 +1,212 @@
+from __future__ import annotations
+import hashlib
+import itertools
+import json
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .http import HttpClient
+from .note_cache import NoteCache
+
+# 自分の記事一覧 (下書きを含むので要ログイン)
+NOTE_LIST_URL = "https://note.com/api/v2/note_list/contents?publish_status={status}&page={page}"
+# 記事の詳細 (本文を含む)
+NOTE_DETAIL_URL = "https://note.com/api/v3/notes/{note_key}"
+
+NOTE_STATUSES = ("published", "draft")
+
+
+def note_version(status: str, entry: Dict[str, Any]) -> str:
+    """一覧の項目から、記事が変わったら変わる値を作る"""
+    marker = entry.get("updatedAt") or entry.get("updated_at")
+    if not marker:
+        # 更新日時が無ければ、スキ数などの件数 (…Count) を除いた項目の内容から作る
+        stable = {k: v for k, v in entry.items() if not k.lower().endswith("count")}
+        encoded = json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        marker = hashlib.blake2b(encoded, digest_size=16).hexdigest()
+    return f"{status}:{marker}"
+
+
+class NoteExporter:
+    """
+    アカウントの記事 (公開済み・下書き) を一覧し、変わった記事だけ詳細を取得して NoteCache に書き出す
+
+    - 一覧は status ごとに max_workers ページずつ並行に取得する (totalCount があれば、その先のページは取りに行かない)
+    - 一覧の項目の version (note_version()) がキャッシュと同じ記事は取得しない (refresh=True なら全部取り直す)
+    - 詳細の取得は max_workers 本並行で、終わった順に yield する
+    - 最後まで一覧できた status では、一覧に出てこなくなった記事を removed にする
+      (一覧の途中で記事が増減してページがずれると取りこぼしうるが、次の書き出しで戻る)
+    """
+
+    def __init__(
+        self,
+        cache: NoteCache,
+        max_workers: int = 4,
+        statuses: Tuple[str, ...] = NOTE_STATUSES,
+        max_pages: Optional[int] = None,
+    ):
+        unknown = [s for s in statuses if s not in NOTE_STATUSES]
+        if unknown:
+            raise ValueError(f"unknown status: {unknown[0]!r} (choose from {', '.join(NOTE_STATUSES)})")
+        self.cache = cache
+        self.max_workers = max(1, max_workers)
+        self.statuses = tuple(statuses)
+        self.max_pages = max_pages
+
+    def export(self, http: HttpClient, refresh: bool = False, include_unchanged: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        {"index", "key", "status", "change", "result", "stats"} を yield する
+
+        - change: "new" / "updated" (詳細を取得した)、"removed" (一覧から消えた)、"unchanged" (include_unchanged=True のときだけ)
+        - result: {"ok", "data": 記事の詳細} / {"ok": False, "error"}。一覧の失敗は key が None
+        - stats: 累計の listed / fetched / unchanged / removed / failed / elapsed / per_second (詳細の取得件数)
+        """
+        started = time.perf_counter()
+        stats: Dict[str, Any] = {"listed": 0, "fetched": 0, "unchanged": 0, "removed": 0, "failed": 0, "elapsed": 0.0, "per_second": 0.0}
+        counter = itertools.count()
+
+        def report(key: Optional[str], status: str, change: Optional[str], result: Dict[str, Any]) -> Dict[str, Any]:
+            if not result.get("ok"):
+                stats["failed"] += 1
+            elif change in ("new", "updated"):
+                stats["fetched"] += 1
+            elif change in stats:
+                stats[change] += 1
+            stats["elapsed"] = time.perf_counter() - started
+            stats["per_second"] = stats["fetched"] / stats["elapsed"] if stats["elapsed"] > 0 else 0.0
+            return {"index": next(counter), "key": key, "status": status, "change": change, "result": result, "stats": dict(stats)}
+
+        known = self.cache.versions()
+        # 一覧に出てきた記事の seen_at は listed_at にそろえ、全 status を一覧してから removed を付ける
+        # (status をまたいで移った記事を removed にしない)
+        listed_at = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            listings: List[Tuple[str, Dict[str, Any]]] = []
+            for status in self.statuses:
+                listing = self._list(executor, http, status)
+                if not listing.get("ok"):
+                    yield report(None, status, None, listing)
+                    continue
+                listings.append((status, listing["data"]))
+                self.cache.seen([key for key in listing["data"]["entries"] if key in known], listed_at)
+            for status, listing in listings:
+                if listing["complete"]:
+                    for key in self.cache.mark_removed(status, listed_at):
+                        yield report(key, status, "removed", {"ok": True, "data": None})
+
+            # (status, 一覧の項目, version, change)
+            changed: List[Tuple[str, Dict[str, Any], str, str]] = []
+            claimed: Set[str] = set()
+            for status, listing in listings:
+                for key, entry in listing["entries"].items():
+                    if key in claimed:
+                        continue
+                    # 公開済みの記事が下書きの一覧にも出てくることがある (先に一覧した status を使う)
+                    claimed.add(key)
+                    stats["listed"] += 1
+                    version = note_version(status, entry)
+                    if not refresh and known.get(key) == version:
+                        if include_unchanged:
+                            cached = self.cache.get(key)
+                            yield report(key, status, "unchanged", {"ok": True, "data": cached["note"] if cached else None})
+                        else:
+                            stats["unchanged"] += 1
+                        continue
+                    changed.append((status, entry, version, "updated" if key in known else "new"))
+
+            # 未完了の取得は max_workers * 2 件までに抑える
+            queue = iter(changed)
+            pending: Dict[Future, Tuple[str, Dict[str, Any], str, str]] = {}
+            for item in itertools.islice(queue, self.max_workers * 2):
+                pending[executor.submit(self._fetch, http, item[1]["key"])] = item
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    status, entry, version, change = pending.pop(future)
+                    result = future.result()
+                    if result.get("ok"):
+                        # 取得に失敗した記事は version を更新しない (次の書き出しで取り直す)
+                        self.cache.put(entry["key"], status, version, entry, result["data"], seen_at=listed_at)
+                    yield report(entry["key"], status, change, result)
+                    for item in itertools.islice(queue, 1):
+                        pending[executor.submit(self._fetch, http, item[1]["key"])] = item
+
+    # --- listing ---
+
+    def _list(self, executor: ThreadPoolExecutor, http: HttpClient, status: str) -> Dict[str, Any]:
+        """status の記事一覧 {"entries": {記事キー: 項目}, "complete": 最後まで取れたか}"""
+        first = self._page(http, status, 1)
+        if not first.get("ok"):
+            return first
+        entries: Dict[str, Dict[str, Any]] = {}
+        self._add_entries(entries, first["data"]["entries"])
+
+        last_page = math.inf
+        per_page = len(first["data"]["entries"])
+        if first["data"]["total"] is not None and per_page:
+            last_page = math.ceil(first["data"]["total"] / per_page)
+        limit = min(last_page, self.max_pages or math.inf)
+
+        done = first["data"]["last"]
+        page = 2
+        while not done and page <= limit:
+            window = range(page, int(min(page + self.max_workers, limit + 1)))
+            for result in executor.map(lambda p: self._page(http, status, p), window):
+                if not result.get("ok"):
+                    return result
+                self._add_entries(entries, result["data"]["entries"])
+                if result["data"]["last"]:
+                    done = True
+                    break
+            page = window.stop
+        # max_pages で打ち切ったときは complete にしない (removed を付けない)
+        complete = done or page > last_page
+        return {"ok": True, "data": {"entries": entries, "complete": complete}}
+
+    @staticmethod
+    def _add_entries(entries: Dict[str, Dict[str, Any]], page_entries: List[Dict[str, Any]]) -> None:
+        # ページの境目で同じ記事が 2 回出てくることがある
+        for entry in page_entries:
+            entries[entry["key"]] = entry
+
+    @staticmethod
+    def _page(http: HttpClient, status: str, page: int) -> Dict[str, Any]:
+        res = http.get(NOTE_LIST_URL.format(status=status, page=page))
+        if not res.get("ok"):
+            return {"ok": False, "error": {"type": "NoteListFetchFailed", "status_code": res.get("status_code"), "detail": res.get("text"), "status": status, "page": page}}
+        data = _data(res)
+        if not isinstance(data, dict):
+            data = {}
+        contents = data.get("contents") or data.get("notes") or []
+        entries = [c for c in contents if isinstance(c, dict) and c.get("key")]
+        total = data.get("totalCount")
+        return {
+            "ok": True,
+            "data": {
+                "entries": entries,
+                "last": not contents or bool(data.get("isLastPage", False)),
+                "total": int(total) if isinstance(total, int) or str(total).isdigit() else None,
+            },
+        }
+
+    # --- notes ---
+
+    @staticmethod
+    def _fetch(http: HttpClient, note_key: str) -> Dict[str, Any]:
+        try:
+            res = http.get(NOTE_DETAIL_URL.format(note_key=note_key))
+        except Exception as e:
+            return {"ok": False, "error": {"type": type(e).__name__, "message": str(e), "where": "note_export"}}
+        if not res.get("ok"):
+            return {"ok": False, "error": {"type": "NoteFetchFailed", "status_code": res.get("status_code"), "detail": res.get("text"), "note_key": note_key}}
+        data = _data(res)
+        if not isinstance(data, dict):
+            return {"ok": False, "error": {"type": "NoteInvalidResponse", "detail": res.get("json"), "note_key": note_key}}
+        return {"ok": True, "data": data}
+
+
+def _data(res: Dict[str, Any]) -> Any:
+    body = res.get("json")
+    return body.get("data") if isinstance(body, dict) else None
@@ -0,0 +1,267 @@
+from __future__ import annotations
+import os
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+# ブロックは種類を先頭に置いたタプル (dict やオブジェクトより小さく、pickle / JSON にそのまま載る)
+#   ("p" | "h2" | "h3" | "blockquote", uid, インライン変換済みの HTML)
+#   ("hr", uid)
+#   ("pre", uid, lang, [コードの行...], 閉じているか)
+#   ("toc", uid, 見出しの uid)
+#   ("pay", uid)                                   有料部分の先頭の区切り
+#   ("img", uid, alt, 画像パス)                    URL / キーは render() でアップロード結果から埋める
+#   ("list", uid, "ul" | "ol", [(indent, ordered, インライン変換済みの HTML, p の uid, 開くリストの uid), ...])
+#     開くリストの uid は、その項目で入れ子のリストを開く / 種類が変わって開き直すときだけ入る (ほかは None)
+Block = Tuple[Any, ...]
+
+IR_VERSION = 1
+
+_TAGS = re.compile(r"<[^>]+>")
+
+
+def plain_length(html: str) -> int:
+    """タグを除いた文字数 (note の body_length)"""
+    return len(_TAGS.sub("", html))
+
+
+class NoteIR:
+    """
+    Markdown をパースした結果のブロック列 (画像はまだアップロードしていない)
+
+    - render() で HTML にする。render() は (consume=True でなければ) IR を書き換えないので、何度でも (アップロード先を変えても) 描画できる
+    - pickle でき、to_dict() / from_dict() で JSON にもできる (キャッシュやプロセス間の受け渡し向け)
+    """
+
+    __slots__ = ("free", "pay", "separator_id", "has_pay")
+
+    def __init__(self, free: List[Block], pay: List[Block], separator_id: Optional[str], has_pay: bool):
+        self.free = free
+        self.pay = pay
+        self.separator_id = separator_id
+        self.has_pay = has_pay
+
+    def images(self) -> Iterator[Block]:
+        """画像ブロックを文書順に返す"""
+        for blocks in (self.free, self.pay):
+            for block in blocks:
+                if block[0] == "img":
+                    yield block
+
+    def image_paths(self) -> List[str]:
+        """アップロードが必要な画像パス (文書順・重複なし)"""
+        return list(dict.fromkeys(block[3] for block in self.images()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": IR_VERSION,
+            "free": self.free,
+            "pay": self.pay,
+            "separator_id": self.separator_id,
+            "has_pay": self.has_pay,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "NoteIR":
+        if data.get("version") != IR_VERSION:
+            raise ValueError(f"unsupported IR version: {data.get('version')!r} (expected {IR_VERSION})")
+        # JSON を通るとタプルがリストになるので戻す (リストの項目も)
+        def blocks(items: List[Any]) -> List[Block]:
+            out = []
+            for block in items:
+                if block[0] == "list":
+                    block = (*block[:3], [tuple(item) for item in block[3]])
+                elif block[0] == "pre":
+                    block = (*block[:3], list(block[3]), block[4])
+                out.append(tuple(block))
+            return out
+
+        return cls(blocks(data["free"]), blocks(data["pay"]), data["separator_id"], data["has_pay"])
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, NoteIR):
+            return NotImplemented
+        return (self.free, self.pay, self.separator_id, self.has_pay) == (other.free, other.pay, other.separator_id, other.has_pay)
+
+    def __repr__(self) -> str:
+        return f"NoteIR(free={len(self.free)} blocks, pay={len(self.pay)} blocks, separator_id={self.separator_id!r})"
+
+
+def render(
+    ir: NoteIR,
+    uploads: Dict[str, Dict[str, Any]],
+    free_writer: Optional[TextIO] = None,
+    pay_writer: Optional[TextIO] = None,
+    consume: bool = False,
+    body_length: bool = False,
+) -> Dict[str, Any]:
+    """
+    IR を note 用 HTML にする
+
+    - uploads は {画像パス: ImageManager.upload_image() の data} (ir.image_paths() をすべて含む)
+    - 戻り値は parse() と同じ {"ok": True, "data": {free_html, pay_html, combined_html, image_keys, separator_id, has_pay}}
+    - free_writer / pay_writer を渡すとその部分は文字列にせず書き出す
+      (free_html / pay_html / combined_html は None、書いた文字数が free_length / pay_length に入る)
+    - consume=True なら描画したブロックから手放す (IR は空になる。parse() のように IR を使い回さないとき、メモリのピークを抑える)
+    - body_length=True なら data["body_length"] (combined_html の plain_length()) も入れる (書き出したときは None)
+      文書全体を走査し直すので、要るときだけ数える (parse() は数えない)
+    """
+    image_keys = [os.path.splitext(os.path.basename(uploads[block[3]]["path"]))[0] for block in ir.images()]
+
+    data: Dict[str, Any] = {
+        "free_html": None,
+        "pay_html": None,
+        "combined_html": None,
+        "image_keys": image_keys,
+        "separator_id": ir.separator_id,
+        "has_pay": ir.has_pay,
+    }
+    streaming = free_writer is not None or pay_writer is not None
+
+    for name, blocks, writer in (("free", ir.free, free_writer), ("pay", ir.pay, pay_writer)):
+        parts = _parts(_consumed(blocks) if consume else blocks, uploads)
+        if writer is None:
+            chunks: List[str] = []
+            write_html(parts, chunks.append)
+            data[f"{name}_html"] = "".join(chunks)
+            del chunks
+        else:
+            data[f"{name}_length"] = write_html(parts, writer.write)
+
+    if not streaming:
+        data["combined_html"] = data["free_html"] + data["pay_html"]
+    if body_length:
+        data["body_length"] = None if streaming else plain_length(data["combined_html"])
+    return {"ok": True, "data": data}
+
+
+def _consumed(blocks: List[Block]) -> Iterator[Block]:
+    # 先頭から取り出して手放す (reverse + pop で O(1))
+    blocks.reverse()
+    while blocks:
+        yield blocks.pop()
+
+
+def _parts(blocks: Iterable[Block], uploads: Dict[str, Dict[str, Any]]) -> Iterator[str]:
+    """ブロックを HTML パーツにする (コードブロックは開始タグ・各行・終了タグを別のパーツにする)"""
+    for block in blocks:
+        kind = block[0]
+        uid = block[1]
+        if kind == "p" or kind == "h2" or kind == "h3" or kind == "blockquote":
+            yield f'<{kind} name="{uid}" id="{uid}">{block[2]}</{kind}>'
+        elif kind == "list":
+            yield _list_html(block)
+        elif kind == "pre":
+            yield f'<pre name="{uid}" id="{uid}" data-lang="{block[2]}"><code>'
+            yield from block[3]
+            if block[4]:
+                yield "</code></pre>"
+        elif kind == "img":
+            up = uploads[block[3]]
+            img_url = up["url"]
+            yield (
+                f'<figure name="{uid}" id="{uid}" class="note-image" data-image-key="{up["path"]}">'
+                f'<a href="{img_url}" rel="noopener noreferrer" target="_blank">'
+                f'<img src="{img_url}" alt="画像" data-src="{img_url}"></a>'
+                f'<figcaption>{block[2]}</figcaption></figure>'
+            )
+        elif kind == "hr":
+            yield f'<hr name="{uid}" id="{uid}">'
+        elif kind == "toc":
+            yield f'<h2 name="{block[2]}" id="{block[2]}">目次</h2>'
+            yield f'<table-of-contents name="{uid}" id="{uid}"><br></table-of-contents>'
+        elif kind == "pay":
+            yield f'<span name="{uid}" id="{uid}"></span>'
+        else:
+            raise ValueError(f"unknown block kind: {kind!r}")
+
+
+def _open_list(list_type: str, uid: str) -> str:
+    if list_type == "ol":
+        return f'<ol data-start="1" name="{uid}" id="{uid}">'
+    return f'<ul name="{uid}" id="{uid}">'
+
+
+def _list_html(block: Block) -> str:
+    _, root_uid, root_type, items = block
+    html_output = [_open_list(root_type, root_uid)]
+    append = html_output.append
+
+    # (indent, type) のスタック
+    indents = [items[0][0]]
+    types = [root_type]
+    for indent, ordered, inner, p_uid, open_uid in items:
+        item_type = "ol" if ordered else "ul"
+        if indent > indents[-1]:
+            append(_open_list(item_type, open_uid))
+            indents.append(indent)
+            types.append(item_type)
+        elif indent < indents[-1]:
+            while indents and indents[-1] > indent:
+                indents.pop()
+                append(f"</{types.pop()}>")
+        elif item_type != types[-1]:
+            append(f"</{types.pop()}>")
+            indents.pop()
+            append(_open_list(item_type, open_uid))
+            indents.append(indent)
+            types.append(item_type)
+        append(f'<li><p name="{p_uid}" id="{p_uid}">{inner}</p></li>')
+
+    while types:
+        append(f"</{types.pop()}>")
+    return "".join(html_output)
+
+
+def list_block(
+    buffer: Iterable[Tuple[int, bool, str]],
+    new_id: Callable[..., str],
+    parse_inline: Callable[[str], str],
+) -> Block:
+    """
+    リスト項目 (indent, ordered, テキスト) の列から "list" ブロックを作る
+
+    入れ子を開く位置は _list_html() と同じ手順で決め、uid はそこでだけ振る
+    """
+    items = list(buffer)
+    first_indent, first_ordered, first_text = items[0]
+    root_type = "ol" if first_ordered else "ul"
+    root_uid = new_id("list", first_text)
+
+    out: List[Tuple[int, bool, str, str, Optional[str]]] = []
+    indents = [first_indent]
+    types = [root_type]
+    for indent, ordered, text in items:
+        p_uid = new_id("li", text)
+        inner = parse_inline(text)
+        item_type = "ol" if ordered else "ul"
+        open_uid = None
+        if indent > indents[-1]:
+            open_uid = new_id("list", text)
+            indents.append(indent)
+            types.append(item_type)
+        elif indent < indents[-1]:
+            while indents and indents[-1] > indent:
+                indents.pop()
+                types.pop()
+        elif item_type != types[-1]:
+            open_uid = new_id("list", text)
+            types[-1] = item_type
+        out.append((indent, ordered, inner, p_uid, open_uid))
+    return ("list", root_uid, root_type, out)
+
+
+def write_html(parts: Iterable[str], write: Callable[[str], Any]) -> int:
+    """パーツを順に write() に渡す (コードブロック内だけ行ごとに改行を入れる)。書いた文字数を返す"""
+    written = 0
+    is_in_code = False
+    for part in parts:
+        if "<pre" in part:
+            is_in_code = True
+        write(part)
+        written += len(part)
+        if is_in_code:
+            write("\n")
+            written += 1
+        if "</pre>" in part:
+            is_in_code = False
+    return written
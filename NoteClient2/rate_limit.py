@@ -0,0 +1,186 @@
+from __future__ import annotations
+import email.utils
+import threading
+import time
+import urllib.parse
+from typing import Any, Callable, Dict, Optional
+
+THROTTLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After (秒数 または HTTP 日付) を待ち秒数にする"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def host_key(url: str) -> str:
+    return urllib.parse.urlsplit(url).hostname or ""
+
+
+class _HostLimit:
+    __slots__ = ("limit", "in_flight", "tokens", "refilled_at", "blocked_until", "decreased_at", "requests", "throttled")
+
+    def __init__(self, limit: float, tokens: float, now: float):
+        self.limit = limit
+        self.in_flight = 0
+        self.tokens = tokens
+        self.refilled_at = now
+        self.blocked_until = 0.0
+        self.decreased_at = 0.0
+        self.requests = 0
+        self.throttled = 0
+
+
+class RateLimiter:
+    """
+    ホスト (または key_func で決めたエンドポイント種別) ごとのレート制限
+
+    - rate 件/秒・burst 件のトークンバケット (rate=None なら回数制限なし)
+    - 同時実行数は AIMD で調整する: 成功ごとに少しずつ増やし、429 / 5xx で decrease 倍に減らす
+      (減らすのは cooldown 秒に 1 回まで)
+    - Retry-After が返ったら、そのホストへの新しいリクエストをその時刻まで止める
+    - 1 つのインスタンスを複数スレッド・複数の asyncio タスク (HttpClient / AsyncHttpClient) で共有できる
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        initial_concurrency: Optional[int] = None,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+        max_retry_after: float = 120.0,
+        throttle_retries: int = 3,
+        key_func: Callable[[str], str] = host_key,
+    ):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate or 1))
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.initial_concurrency = initial_concurrency or max_concurrency
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.max_retry_after = max_retry_after
+        self.throttle_retries = throttle_retries
+        self.key_func = key_func
+        self._limits: Dict[str, _HostLimit] = {}
+        self._cond = threading.Condition()
+
+    # --- acquire / release ---
+
+    def acquire(self, url: str) -> str:
+        """枠が空くまで待って 1 件分を確保する。戻り値のキーを release() に渡す"""
+        key = self.key_func(url)
+        with self._cond:
+            while True:
+                wait = self._try_acquire(key)
+                if wait == 0.0:
+                    return key
+                self._cond.wait(wait)
+
+    async def aacquire(self, url: str) -> str:
+        """acquire() の asyncio 版 (イベントループを止めない)"""
+        import asyncio
+
+        key = self.key_func(url)
+        while True:
+            with self._cond:
+                wait = self._try_acquire(key)
+            if wait == 0.0:
+                return key
+            await asyncio.sleep(wait)
+
+    def release(self, key: str, status_code: Optional[int] = None, retry_after: Optional[str] = None) -> Optional[float]:
+        """
+        応答を受け取ったら呼ぶ (接続エラーなら status_code=None)
+
+        429 / 5xx なら同時実行数を下げ、そのキーを止める秒数 (Retry-After、上限 max_retry_after) を返す
+        """
+        now = time.monotonic()
+        delay = parse_retry_after(retry_after)
+        if delay is not None:
+            delay = min(delay, self.max_retry_after)
+
+        with self._cond:
+            state = self._state(key, now)
+            state.in_flight = max(0, state.in_flight - 1)
+            if status_code in THROTTLE_STATUSES:
+                state.throttled += 1
+                if now - state.decreased_at >= self.cooldown:
+                    state.limit = max(float(self.min_concurrency), state.limit * self.decrease)
+                    state.decreased_at = now
+                if status_code == 429:
+                    # Retry-After が無い 429 でも cooldown 秒は新しいリクエストを止める
+                    delay = self.cooldown if delay is None else delay
+                    state.blocked_until = max(state.blocked_until, now + delay)
+                elif delay:
+                    state.blocked_until = max(state.blocked_until, now + delay)
+            elif status_code is not None and status_code < 400:
+                state.limit = min(float(self.max_concurrency), state.limit + self.increase / max(state.limit, 1.0))
+            self._cond.notify_all()
+        return delay
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """キーごとの現在の制限値と累計"""
+        now = time.monotonic()
+        with self._cond:
+            return {
+                key: {
+                    "concurrency_limit": int(state.limit),
+                    "in_flight": state.in_flight,
+                    "tokens": self._refill(state, now),
+                    "rate": self.rate,
+                    "blocked_for": max(0.0, state.blocked_until - now),
+                    "requests": state.requests,
+                    "throttled": state.throttled,
+                }
+                for key, state in self._limits.items()
+            }
+
+    # --- internals (self._cond を持った状態で呼ぶ) ---
+
+    def _state(self, key: str, now: float) -> _HostLimit:
+        state = self._limits.get(key)
+        if state is None:
+            state = _HostLimit(float(self.initial_concurrency), float(self.burst), now)
+            self._limits[key] = state
+        return state
+
+    def _refill(self, state: _HostLimit, now: float) -> float:
+        if self.rate is not None:
+            state.tokens = min(float(self.burst), state.tokens + (now - state.refilled_at) * self.rate)
+        state.refilled_at = now
+        return state.tokens
+
+    def _try_acquire(self, key: str) -> float:
+        """確保できたら 0.0、できなければ次に試すまでの秒数"""
+        now = time.monotonic()
+        state = self._state(key, now)
+        if now < state.blocked_until:
+            return state.blocked_until - now
+        if state.in_flight >= int(state.limit):
+            # release() で起こされる (asyncio 側は短い間隔で見直す)
+            return 0.05
+        if self.rate is not None and self._refill(state, now) < 1.0:
+            return (1.0 - state.tokens) / self.rate
+        if self.rate is not None:
+            state.tokens -= 1.0
+        state.in_flight += 1
+        state.requests += 1
+        return 0.0
+
@@ -0,0 +1,72 @@
+from __future__ import annotations
+import random
+from typing import Any, Dict, Optional, Tuple
+
+RETRY_STATUSES = (500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+# 接続断・タイムアウトなど、やり直せば通りうる例外 (requests / aiohttp / 標準ライブラリ)
+TRANSIENT_ERRORS = frozenset({
+    "ConnectionError",
+    "ConnectTimeout",
+    "ReadTimeout",
+    "Timeout",
+    "ChunkedEncodingError",
+    "ClientConnectionError",
+    "ClientConnectorError",
+    "ClientOSError",
+    "ClientPayloadError",
+    "ServerDisconnectedError",
+    "ServerTimeoutError",
+    "ConnectionResetError",
+    "TimeoutError",
+})
+
+
+class RetryPolicy:
+    """
+    一時的な失敗のやり直し方針
+
+    - HttpClient: 冪等なリクエスト (GET / PUT と idempotent=True を付けた POST) だけを、
+      接続エラーや retry_statuses のときに最大 max_attempts 回まで送る
+      記事作成 (POST /api/v1/text_notes) のように二重実行されると困るものはやり直さない
+    - 429 は扱わない (RateLimiter が Retry-After を待ってやり直す。2 か所でやり直すと回数が掛け算になる)
+    - 待ち時間は base_delay * 2^n (上限 max_delay) の full jitter
+    - publish: 記事作成後に一時的な失敗で止まったら、publish_attempts 回まで
+      同じ下書きを使って途中から再開する
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        retry_statuses: Tuple[int, ...] = RETRY_STATUSES,
+        publish_attempts: int = 2,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = retry_statuses
+        self.publish_attempts = max(1, publish_attempts)
+
+    def delay(self, attempt: int) -> float:
+        """attempt 回目 (1 始まり) の失敗のあとに待つ秒数"""
+        return random.uniform(0.0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def should_retry(self, method: str, result: Dict[str, Any], attempt: int, idempotent: Optional[bool] = None) -> bool:
+        if attempt >= self.max_attempts or result.get("ok"):
+            return False
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        return idempotent and self.is_transient(result)
+
+    def is_transient(self, result: Dict[str, Any]) -> bool:
+        """HTTP の結果 / publish のエラーが、やり直せば通りうるものか"""
+        status = result.get("status_code")
+        error = result.get("error") or {}
+        if status is None:
+            status = error.get("status_code")
+        if status is not None:
+            return status in self.retry_statuses
+        return error.get("type") in TRANSIENT_ERRORS
@@ -1,7 +1,11 @@
+import hashlib
 import uuid
 import urllib.parse
 from typing import Dict
 
+# MarkdownParser(id_strategy=...) で選べるブロック ID の振り方
+ID_STRATEGIES = ("random", "content")
+
 
 def gen_uuid() -> str:
     """
@@ -13,6 +17,27 @@ def gen_uuid() -> str:
     return str(uuid.uuid4())
 
 
+class ContentIds:
+    """
+    ブロックの種類と内容から決まる ID を振る (id_strategy="content")
+
+    - 1 文書につき 1 つ作る。同じ (種類, 内容) が何度目に出たかも混ぜるので、文書内では重複しない
+    - 同じ Markdown からは毎回同じ ID になる (HTML のキャッシュや差分検出に使える)
+    - ほかのブロックを足したり消したりしても、ほかのブロックの ID は変わらない (前に同じ内容のブロックがある場合を除く)
+    - 形式は UUID と同じ 8-4-4-4-12 の 16 進数。blake2b 1 回なので uuid4 (urandom を読む) より安い
+    """
+
+    def __init__(self):
+        self.seen: Dict[str, int] = {}
+
+    def __call__(self, kind: str, content: str = "") -> str:
+        key = f"{kind}\x1f{content}"
+        n = self.seen.get(key, 0)
+        self.seen[key] = n + 1
+        h = hashlib.blake2b(f"{key}\x1e{n}".encode("utf-8"), digest_size=16).hexdigest()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
 def xsrf_from_cookies(cookies: Dict[str, str]) -> str:
     """
     Cookie に含まれる XSRF-TOKEN を安全に取り出す
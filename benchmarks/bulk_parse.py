@@ -0,0 +1,98 @@
+"""
+BulkParser (プロセスプールでの一括パース) のスケーリング計測
+
+    python benchmarks/bulk_parse.py [--copies 4] [--processes 1,2,4] [--repeat 3] [--chunksize N]
+
+- parser_corpus.py のコーパスを copies 回並べた文書群を、プロセス数を変えて parse_many() でパースする
+- 文書/秒 と、順にパースした場合 (parse() を 1 件ずつ) に対する速度比を出す
+- images="defer" の IR に fill_images() でダミーのアップロード結果を埋め、parse() の出力と一致するか確認する
+  (uuid はプロセスごとに振られるので、比べるときは uuid を伏せる)
+
+一致しない文書があれば終了コード 1
+"""
+from __future__ import annotations
+import argparse
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from NoteClient2.bulk_parse import BulkParser  # noqa: E402
+from NoteClient2.markdown_parser import PARSER_ENGINES, parser_class  # noqa: E402
+from parser_corpus import corpus  # noqa: E402
+from parser_engines import StubImages  # noqa: E402
+
+_UUID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+def _masked(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: _UUID.sub("<uuid>", v) if isinstance(v, str) else v for k, v in data.items()}
+
+
+def sequential(engine: str, docs: List[List[str]]) -> float:
+    parser = parser_class(engine)(StubImages(), image_concurrency=1)
+    started = time.perf_counter()
+    for lines in docs:
+        parser.parse(None, {}, lines)
+    return time.perf_counter() - started
+
+
+def check(engine: str, docs: List[List[str]], processes: int) -> List[int]:
+    """parse() と出力が違う文書の番号"""
+    images = StubImages()
+    parser = parser_class(engine)(images, image_concurrency=1)
+    mismatched: List[int] = []
+    for item, lines in zip(BulkParser(engine, processes=processes).parse_many(docs), docs):
+        expected = parser.parse(None, {}, lines)
+        result = item["result"]
+        if not result.get("ok"):
+            if result != expected:
+                mismatched.append(item["index"])
+            continue
+        uploads = {path: images.upload_image(None, {}, path)["data"] for path in result["data"].image_paths()}
+        if _masked(BulkParser.fill_images(result["data"], uploads)) != _masked(expected["data"]):
+            mismatched.append(item["index"])
+    return mismatched
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--engine", choices=sorted(PARSER_ENGINES), default="default")
+    ap.add_argument("--copies", type=int, default=4)
+    ap.add_argument("--processes", default="1,2,4", help="カンマ区切りのプロセス数")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--chunksize", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    docs = [lines for _ in range(args.copies) for _, lines in corpus(args.seed)]
+    counts = [int(n) for n in args.processes.split(",")]
+
+    base = min(sequential(args.engine, docs) for _ in range(args.repeat))
+    print(f"engine={args.engine} docs={len(docs)} lines={sum(len(d) for d in docs)} cpus={os.cpu_count()}")
+    print(f"{'processes':>10} {'seconds':>9} {'docs/s':>9} {'speedup':>8}")
+    print(f"{'parse()':>10} {base:>9.3f} {len(docs) / base:>9.1f} {1.0:>8.2f}")
+    for processes in counts:
+        bulk = BulkParser(args.engine, processes=processes, chunksize=args.chunksize)
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            for _item in bulk.parse_many(docs):
+                pass
+            best = min(best, time.perf_counter() - started)
+        print(f"{processes:>10} {best:>9.3f} {len(docs) / best:>9.1f} {base / best:>8.2f}")
+
+    mismatched = check(args.engine, docs, max(counts))
+    if mismatched:
+        print(f"FAIL output differs from parse() for documents {mismatched}")
+        return 1
+    print("output matches parse()")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
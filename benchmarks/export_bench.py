@@ -0,0 +1,113 @@
+"""
+export_notes() (記事の書き出し) のベンチマーク (ローカルのスタンドインサーバから読む)
+
+    python benchmarks/export_bench.py [--notes 400] [--drafts 100] [--workers 4]
+                                      [--latency-ms 20] [--changed 10]
+
+- cold:  空のキャッシュに、max_workers=1 と --workers で全件を書き出す
+- warm:  --changed 件の記事を更新・公開と下書きを 1 件ずつ入れ替え・2 件を削除・3 件を追加してから、同じキャッシュにもう一度書き出す
+         (変わった記事の詳細だけを取り直す)
+
+記事/秒 (一覧した件数 / 秒) と、エンドポイントごとのリクエスト数を出す
+書き出し後のキャッシュがサーバの記事と一致しなければ終了コード 1
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import time
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_note import MockNoteServer  # noqa: E402
+from publish_bench import Workspace  # noqa: E402
+from NoteClient2 import NoteCache, NoteClient2  # noqa: E402
+
+
+def export(server: MockNoteServer, workspace: Workspace, cache: NoteCache, workers: int) -> Dict[str, Any]:
+    client = NoteClient2("bench@example.invalid", "unused", "bench", session_file=workspace.session_file, pool_maxsize=max(10, workers * 2))
+    client.http.url_overrides = {"https://note.com": server.url}
+    # 認証 (user_features) は計測に含めない
+    client.auth.prepare(client.http)
+    server.reset_counters()
+
+    started = time.perf_counter()
+    changes: Dict[str, int] = {}
+    stats: Dict[str, Any] = {}
+    try:
+        for item in client.export_notes(cache, max_workers=workers):
+            changes[item["change"] or "error"] = changes.get(item["change"] or "error", 0) + 1
+            stats = item["stats"]
+    finally:
+        client.close()
+    elapsed = time.perf_counter() - started
+    return {
+        "elapsed": elapsed,
+        "listed": stats.get("listed", 0),
+        "failed": stats.get("failed", 0),
+        "changes": changes,
+        "requests": dict(sorted(server.requests.items())),
+    }
+
+
+def mismatches(server: MockNoteServer, cache: NoteCache) -> int:
+    cached = {note["key"]: note for note in cache.notes()}
+    bad = len(set(cached) ^ set(server.notes))
+    for key, note in server.notes.items():
+        if key in cached and (cached[key]["note"] != note or cached[key]["status"] != note["status"]):
+            bad += 1
+    return bad
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--notes", type=int, default=400, help="公開済みの記事数")
+    ap.add_argument("--drafts", type=int, default=100, help="下書きの数")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="各エンドポイントの応答遅延")
+    ap.add_argument("--changed", type=int, default=10, help="warm の前に更新する記事数")
+    args = ap.parse_args()
+
+    workspace = Workspace()
+    failed = False
+    try:
+        with MockNoteServer(latency=args.latency_ms / 1000.0) as server:
+            published = server.add_notes(args.notes, "published")
+            drafts = server.add_notes(args.drafts, "draft")
+
+            rows = []
+            for workers in dict.fromkeys([1, args.workers]):
+                cache = NoteCache(os.path.join(workspace.root, f"cold{workers}.db"))
+                rows.append((f"cold w={workers}", export(server, workspace, cache, workers)))
+                failed |= mismatches(server, cache) > 0
+
+            for key in (published + drafts)[: args.changed]:
+                server.edit_note(key)
+            # status をまたいで移った記事は removed にならない
+            if drafts:
+                server.edit_note(drafts[-1], status="published")
+            server.edit_note(published[0], status="draft")
+            for key in published[-2:]:
+                server.delete_note(key)
+            server.add_notes(3, "draft")
+            rows.append((f"warm w={args.workers}", export(server, workspace, cache, args.workers)))
+            failed |= mismatches(server, cache) > 0
+    finally:
+        workspace.close()
+
+    print(f"notes={args.notes} drafts={args.drafts} latency={args.latency_ms}ms")
+    print(f"{'run':>10} {'seconds':>8} {'notes/s':>9} {'fail':>5}  changes / requests")
+    for name, r in rows:
+        per_second = r["listed"] / r["elapsed"] if r["elapsed"] > 0 else 0.0
+        print(f"{name:>10} {r['elapsed']:>8.2f} {per_second:>9.1f} {r['failed']:>5}  {r['changes']} {r['requests']}")
+    if failed:
+        print("FAIL cache does not match the server")
+        return 1
+    print("cache matches the server")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
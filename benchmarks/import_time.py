@@ -0,0 +1,110 @@
+"""
+パッケージの import 時間の予算チェック
+
+    python benchmarks/import_time.py [--runs 7] [--budget-ms 200] [--top 10]
+
+- 新しいプロセスで `from NoteClient2 import NoteClient2` を runs 回実行し、-X importtime の累計時間の中央値を予算と比べる
+- import しただけで重い任意依存 (Playwright / aiohttp / Pillow) と asyncio・sqlite3・concurrent.futures を読み込んでいないか確認する
+- ローカルのスタンドインサーバ (mock_note.py) に対して session.json を使い回す認証を通し、
+  その経路でも Playwright を読み込まないことを確認する
+
+予算を超えた / 読み込んではいけないモジュールが読み込まれたら終了コード 1
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+# import しただけで読み込んではいけないモジュール
+LAZY_MODULES = ("playwright", "aiohttp", "PIL", "asyncio", "sqlite3", "concurrent.futures")
+
+_SESSION_REUSE = """
+import json, os, sys, tempfile
+sys.path[:0] = [{root!r}, {bench!r}]
+from mock_note import MockNoteServer
+from NoteClient2 import NoteClient2
+
+with tempfile.TemporaryDirectory() as tmp, MockNoteServer() as server:
+    session_file = os.path.join(tmp, "session.json")
+    with open(session_file, "w", encoding="utf-8") as f:
+        json.dump({{"timestamp": "2099-01-01T00:00:00", "cookies": {{"XSRF-TOKEN": "t", "_note_session_v5": "s"}}}}, f)
+    client = NoteClient2("user@example.invalid", "unused", "user", session_file=session_file)
+    client.http.url_overrides = {{"https://note.com": server.url}}
+    result = client.auth.prepare(client.http)
+    client.close()
+print(json.dumps({{"auth": result, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def import_profile() -> Tuple[int, List[Tuple[int, int, str]], List[str]]:
+    """(NoteClient2 の累計 us, [(自身 us, 累計 us, モジュール)], 読み込まれた LAZY_MODULES)"""
+    code = f"import json, sys; from NoteClient2 import NoteClient2; print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows: List[Tuple[int, int, str]] = []
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(self_us), int(cumulative_us), name))
+        if name == "NoteClient2":
+            total = int(cumulative_us)
+    return total, rows, json.loads(proc.stdout.strip())
+
+
+def session_reuse() -> Dict[str, object]:
+    code = _SESSION_REUSE.format(root=ROOT, bench=BENCH_DIR, lazy=LAZY_MODULES)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=7)
+    ap.add_argument("--budget-ms", type=float, default=200.0)
+    ap.add_argument("--top", type=int, default=10, help="自身の import 時間が大きいモジュールを何件出すか")
+    args = ap.parse_args()
+
+    totals = []
+    loaded: List[str] = []
+    rows: List[Tuple[int, int, str]] = []
+    for _ in range(args.runs):
+        total, rows, loaded = import_profile()
+        totals.append(total / 1000.0)
+    median = statistics.median(totals)
+
+    print(f"from NoteClient2 import NoteClient2: median {median:.1f} ms (min {min(totals):.1f} / max {max(totals):.1f}, runs={args.runs})")
+    for self_us, cumulative_us, name in sorted(rows, reverse=True)[: args.top]:
+        print(f"  self {self_us / 1000.0:6.1f} ms  cumulative {cumulative_us / 1000.0:6.1f} ms  {name}")
+
+    failures: List[str] = []
+    if median > args.budget_ms:
+        failures.append(f"import takes {median:.1f} ms > budget {args.budget_ms:.0f} ms")
+    if loaded:
+        failures.append(f"import loads {', '.join(loaded)}")
+
+    reuse = session_reuse()
+    auth = reuse["auth"]
+    print(f"session reuse: ok={auth.get('ok')} auth={(auth.get('data') or {}).get('auth')} loaded={reuse['loaded']}")
+    if not auth.get("ok"):
+        failures.append(f"session reuse failed: {auth.get('error')}")
+    if "playwright" in reuse["loaded"]:
+        failures.append("session reuse loads playwright")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+ベンチマーク用の note.com / S3 スタンドイン (同一プロセス内の HTTP サーバ)
+
+NoteClient2 が使うエンドポイントだけを実装する
+
+    user_features   GET  /api/v3/users/user_features
+    magazine_list   GET  /api/v2/creators/{user}/contents
+    magazine_page   GET  /{user}/m/{key}
+    presign         POST /api/v3/images/upload/presigned_post
+    s3              POST /s3                      (presign の action)
+    text_notes      POST /api/v1/text_notes
+    draft_save      POST /api/v1/text_notes/draft_save
+    publish         PUT  /api/v1/text_notes/{id}
+    eyecatch        POST /api/v1/image_upload/note_eyecatch
+    note_list       GET  /api/v2/note_list/contents?publish_status=&page=
+    note_detail     GET  /api/v3/notes/{key}
+
+記事一覧 / 詳細が返す記事は add_notes() / edit_note() / delete_note() で用意する
+
+latency / error_rate はエンドポイント名ごとの dict か、全体に効く数値で指定する
+
+    with MockNoteServer(latency=0.02, error_rate={"s3": 0.05}) as server:
+        client.http.url_overrides = {"https://note.com": server.url}
+"""
+from __future__ import annotations
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+Setting = Union[float, Dict[str, float]]
+
+NOTE_PAGE_SIZE = 20
+
+_ROUTES = [
+    ("GET", re.compile(r"^/api/v3/users/user_features"), "user_features"),
+    ("GET", re.compile(r"^/api/v2/creators/[^/]+/contents"), "magazine_list"),
+    ("GET", re.compile(r"^/[^/]+/m/[^/?]+"), "magazine_page"),
+    ("POST", re.compile(r"^/api/v3/images/upload/presigned_post"), "presign"),
+    ("POST", re.compile(r"^/s3$"), "s3"),
+    ("POST", re.compile(r"^/api/v1/text_notes/draft_save"), "draft_save"),
+    ("POST", re.compile(r"^/api/v1/text_notes$"), "text_notes"),
+    ("PUT", re.compile(r"^/api/v1/text_notes/\d+$"), "publish"),
+    ("POST", re.compile(r"^/api/v1/image_upload/note_eyecatch"), "eyecatch"),
+    ("GET", re.compile(r"^/api/v2/note_list/contents"), "note_list"),
+    ("GET", re.compile(r"^/api/v3/notes/[^/?]+"), "note_detail"),
+]
+
+
+class MockNoteServer:
+    def __init__(
+        self,
+        latency: Setting = 0.0,
+        error_rate: Setting = 0.0,
+        error_status: int = 503,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1000)
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.notes: Dict[str, Dict[str, Any]] = {}  # 記事キー -> 記事 (追加順)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockNoteServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockNoteServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests.clear()
+            self.errors.clear()
+
+    # --- notes ---
+
+    def add_notes(self, count: int, status: str = "published", body_size: int = 2000) -> List[str]:
+        keys = []
+        for _ in range(count):
+            note_id = self._next_id()
+            key = f"n{note_id:012x}"
+            with self._lock:
+                self.notes[key] = {
+                    "id": note_id,
+                    "key": key,
+                    "name": f"記事 {note_id}",
+                    "status": status,
+                    "updatedAt": f"2024-01-01T00:00:00+09:00#{note_id}",
+                    "likeCount": 0,
+                    "body": "<p>本文</p>" * (body_size // 11 + 1),
+                }
+            keys.append(key)
+        return keys
+
+    def edit_note(self, key: str, status: Optional[str] = None) -> None:
+        with self._lock:
+            note = self.notes[key]
+            note["updatedAt"] = f"{note['updatedAt']}+"
+            if status is not None:
+                note["status"] = status
+
+    def delete_note(self, key: str) -> None:
+        with self._lock:
+            del self.notes[key]
+
+    def _note_list(self, path: str) -> bytes:
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(path).query)
+        status = (query.get("publish_status") or ["published"])[0]
+        page = int((query.get("page") or ["1"])[0])
+        with self._lock:
+            matched = [
+                {k: v for k, v in note.items() if k != "body"}
+                for note in reversed(list(self.notes.values()))
+                if note["status"] == status
+            ]
+        start = (page - 1) * NOTE_PAGE_SIZE
+        return _json({
+            "data": {
+                "contents": matched[start:start + NOTE_PAGE_SIZE],
+                "isLastPage": start + NOTE_PAGE_SIZE >= len(matched),
+                "totalCount": len(matched),
+            }
+        })
+
+    # --- behaviour ---
+
+    @staticmethod
+    def _setting(value: Setting, endpoint: str) -> float:
+        if isinstance(value, dict):
+            return float(value.get(endpoint, value.get("*", 0.0)))
+        return float(value)
+
+    def _next_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def _should_fail(self, endpoint: str) -> bool:
+        rate = self._setting(self.error_rate, endpoint)
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def _count(self, table: Dict[str, int], endpoint: str) -> None:
+        with self._lock:
+            table[endpoint] = table.get(endpoint, 0) + 1
+
+    def _respond(self, method: str, path: str) -> Tuple[int, str, bytes]:
+        endpoint = next((name for m, pattern, name in _ROUTES if m == method and pattern.match(path)), None)
+        if endpoint is None:
+            return 404, "application/json", b"{}"
+
+        self._count(self.requests, endpoint)
+        delay = self._setting(self.latency, endpoint)
+        if delay > 0:
+            time.sleep(delay)
+        if self._should_fail(endpoint):
+            self._count(self.errors, endpoint)
+            return self.error_status, "application/json", b'{"error": "injected"}'
+
+        if endpoint == "magazine_page":
+            key = path.split("/m/", 1)[1].split("?", 1)[0]
+            return 200, "text/html", f"<script>window.__NUXT__={{magazineLayout:{{id:{sum(map(ord, key))}}}}}</script>".encode()
+        if endpoint == "magazine_list":
+            return 200, "application/json", _json({"data": {"contents": [], "isLastPage": True}})
+        if endpoint == "note_list":
+            return 200, "application/json", self._note_list(path)
+        if endpoint == "note_detail":
+            key = path.split("/api/v3/notes/", 1)[1].split("?", 1)[0]
+            with self._lock:
+                note = dict(self.notes[key]) if key in self.notes else None
+            if note is None:
+                return 404, "application/json", b'{"error": "not found"}'
+            return 200, "application/json", _json({"data": note})
+        if endpoint == "presign":
+            key = self._next_id()
+            return 200, "application/json", _json({
+                "data": {
+                    "action": f"{self.url}/s3",
+                    "post": {"key": f"img/{key}.png"},
+                    "url": f"https://assets.example.invalid/img/{key}.png",
+                    "path": f"img/{key}.png",
+                }
+            })
+        if endpoint == "text_notes":
+            note_id = self._next_id()
+            return 201, "application/json", _json({"data": {"id": note_id, "key": f"n{note_id:012x}", "status": "draft"}})
+        if endpoint == "s3":
+            # presign の post に success_action_status=201 が入っている前提
+            return 201, "text/plain", b""
+        return 201 if method == "POST" else 200, "application/json", b'{"data": {}}'
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # ヘッダと本文を別々に書くので、Nagle を切らないと keep-alive の応答ごとに遅延 ACK 待ち (約 40ms) が入る
+            disable_nagle_algorithm = True
+
+            def _serve(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                status, ctype, body = server._respond(self.command, self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PUT = _serve
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+def _json(obj: Any) -> bytes:
+    return json.dumps(obj).encode()
@@ -0,0 +1,174 @@
+"""
+MarkdownParser.parse のベンチマークと性能回帰チェック
+
+    python benchmarks/parser_bench.py                     # 計測して表示
+    python benchmarks/parser_bench.py --update-baseline   # parser_baseline.json を書き直す
+    python benchmarks/parser_bench.py --check             # baseline と比べ、遅くなった / 出力が変わったら終了コード 1
+
+- コーパスは parser_corpus.py の合成記事 (seed 固定)
+- 画像アップロードはダミー、uuid は連番に差し替えるので、出力 HTML は毎回同じになる
+- 文書ごとに 行/秒 (repeat 回の最速)・parse 中のメモリ確保量のピーク (tracemalloc)・出力の sha256 を出す
+- 出力とメモリ確保ピークは文書ごとに、速度はコーパス全体の 行/秒 を baseline と比べる
+  (マシンごとの差は固定の処理 (calibration) に掛かった時間で補正する)
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import NoteClient2.markdown_parser as markdown_parser  # noqa: E402
+from NoteClient2.markdown_parser import PARSER_ENGINES, parser_class  # noqa: E402
+from parser_corpus import corpus  # noqa: E402
+from parser_engines import StubImages  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parser_baseline.json")
+
+
+def calibrate(repeat: int = 5) -> float:
+    """マシンの速さの目安 (パーサに近い、正規表現と文字列処理の固定ループの秒数)"""
+    text = "note **太字** と *斜体* と [リンク](https://example.com) " * 4
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parts = []
+        for i in range(20000):
+            line = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+            parts.append(f'<p id="{i}">{line.strip()}</p>')
+        "".join(parts)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def parse_once(parser: Any, lines: List[str]) -> Dict[str, Any]:
+    counter = itertools.count()
+    markdown_parser.gen_uuid = lambda: f"id{next(counter)}"
+    return parser.parse(None, {}, lines)
+
+
+def digest(result: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(result, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def measure(engine: str, repeat: int, seed: int) -> Dict[str, Any]:
+    parser = parser_class(engine)(StubImages(), image_concurrency=1)
+    docs = corpus(seed)
+    best = {name: float("inf") for name, _ in docs}
+    results: Dict[str, Dict[str, Any]] = {}
+    calibration = calibrate()
+    original_uuid = markdown_parser.gen_uuid
+    try:
+        for name, lines in docs:
+            results[name] = {"lines": len(lines), **_fingerprint(parse_once(parser, lines))}
+            tracemalloc.start()
+            try:
+                parse_once(parser, lines)
+                results[name]["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        # コーパス全体を 1 巡ずつ repeat 回回し、文書ごとに最速を取る (途中で負荷が変わっても偏らない)
+        for _ in range(repeat):
+            for name, lines in docs:
+                started = time.perf_counter()
+                parse_once(parser, lines)
+                best[name] = min(best[name], time.perf_counter() - started)
+    finally:
+        markdown_parser.gen_uuid = original_uuid
+
+    for name, seconds in best.items():
+        results[name]["seconds"] = seconds
+        results[name]["lines_per_sec"] = results[name]["lines"] / seconds
+    total_lines = sum(doc["lines"] for doc in results.values())
+    return {
+        "engine": engine,
+        "seed": seed,
+        # 計測の前後で取った速い方
+        "calibration": min(calibration, calibrate()),
+        "lines_per_sec": total_lines / sum(best.values()),
+        "docs": results,
+    }
+
+
+def _fingerprint(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {"ok": bool(result.get("ok")), "sha256": digest(result)}
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float, alloc_tolerance: float) -> List[str]:
+    """
+    baseline からの後退を文字列で返す (空なら合格)
+
+    出力とメモリ確保ピークは文書ごと、速度は揺れが大きいのでコーパス全体の 行/秒 で比べる
+    """
+    problems: List[str] = []
+    for name, base in baseline["docs"].items():
+        now = current["docs"].get(name)
+        if now is None:
+            problems.append(f"{name}: missing from corpus")
+            continue
+        if now["sha256"] != base["sha256"]:
+            problems.append(f"{name}: output changed")
+        if now["peak_bytes"] > base["peak_bytes"] * (1.0 + alloc_tolerance):
+            problems.append(f"{name}: peak {now['peak_bytes']} bytes > {base['peak_bytes']} (+{alloc_tolerance:.0%})")
+
+    # calibration が遅いマシンほど基準の 行/秒 を下げる
+    expected = baseline["lines_per_sec"] * baseline["calibration"] / current["calibration"]
+    if current["lines_per_sec"] < expected * (1.0 - tolerance):
+        problems.append(f"corpus: {current['lines_per_sec']:.0f} lines/s < {expected:.0f} (-{tolerance:.0%})")
+    return problems
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--engine", choices=sorted(PARSER_ENGINES), default="default")
+    ap.add_argument("--repeat", type=int, default=7)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--check", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="許容する 行/秒 の低下 (割合)")
+    ap.add_argument("--alloc-tolerance", type=float, default=0.10, help="許容するメモリ確保ピークの増加 (割合)")
+    args = ap.parse_args()
+
+    current = measure(args.engine, args.repeat, args.seed)
+
+    print(f"engine={current['engine']} seed={current['seed']} calibration={current['calibration'] * 1000:.1f} ms")
+    print(f"{'document':>16} {'lines':>7} {'lines/s':>10} {'peak KiB':>9}  sha256")
+    for name, doc in current["docs"].items():
+        print(f"{name:>16} {doc['lines']:>7} {doc['lines_per_sec']:>10.0f} {doc['peak_bytes'] / 1024:>9.1f}  {doc['sha256'][:12]}")
+    print(f"{'corpus':>16} {sum(d['lines'] for d in current['docs'].values()):>7} {current['lines_per_sec']:>10.0f}")
+
+    if args.update_baseline:
+        # リポジトリのほかのファイルに合わせて CRLF で書く
+        with open(args.baseline, "w", encoding="utf-8", newline="\r\n") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written: {args.baseline}")
+        return 0
+
+    if args.check:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("engine") != current["engine"] or baseline.get("seed") != current["seed"]:
+            print(f"baseline is for engine={baseline.get('engine')} seed={baseline.get('seed')}")
+            return 1
+        problems = compare(baseline, current, args.tolerance, args.alloc_tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
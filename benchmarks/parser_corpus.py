@@ -0,0 +1,135 @@
+"""
+パーサのベンチマーク用コーパス (seed 固定の合成記事)
+
+    python benchmarks/parser_corpus.py [--out corpus/]   # .md として書き出す
+
+大きさ (small / medium / large) × 構成 (prose / lists / code / images / paywall / mixed) の記事を作る
+- lists:   ol / ul の混在と入れ子、深い階層から浅い階層への戻り
+- code:    言語付きのフェンス、中に Markdown に見える行 (- / # / <pay> / ![]()) を含む
+- paywall: 先頭の <toc> と途中の <pay>
+- images:  画像行と、段落中のリンク
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import sys
+from typing import Dict, List, Tuple
+
+SIZES: Dict[str, int] = {"small": 40, "medium": 400, "large": 4000}
+
+# ブロック種別ごとの重み
+MIXES: Dict[str, Dict[str, float]] = {
+    "prose": {"paragraph": 8, "heading": 1, "quote": 1, "hr": 0.2},
+    "lists": {"list": 6, "paragraph": 2, "heading": 1},
+    "code": {"code": 5, "paragraph": 3, "heading": 1},
+    "images": {"image": 4, "paragraph": 4, "heading": 1},
+    "paywall": {"paragraph": 5, "list": 2, "code": 1, "image": 1, "heading": 1},
+    "mixed": {"paragraph": 5, "list": 3, "code": 2, "image": 1, "heading": 1, "quote": 1, "hr": 0.3},
+}
+
+_WORDS = [
+    "note", "記事", "Python", "高速化", "テキスト", "**太字**", "*斜体*", "~~取消~~",
+    "[リンク](https://example.com)", "[資料](https://example.com/a?b=c)", "`code`", "2024年",
+]
+
+_CODE = [
+    "def f(x):",
+    "    return x * 2",
+    "- リストではない",
+    "# 見出しではない",
+    "<pay>",
+    "![画像ではない](x.png)",
+    "for i in range(10):",
+    "    print(i)  # **太字ではない**",
+]
+
+
+class _Writer:
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.lines: List[str] = []
+        self.image_seq = 0
+
+    def sentence(self, low: int = 4, high: int = 18) -> str:
+        return " ".join(self.rng.choice(_WORDS) for _ in range(self.rng.randint(low, high)))
+
+    def paragraph(self, i: int) -> None:
+        self.lines.append(self.sentence())
+
+    def heading(self, i: int) -> None:
+        self.lines.append(self.rng.choice(["# ", "## ", "### "]) + f"見出し {i} " + self.sentence(1, 4))
+
+    def quote(self, i: int) -> None:
+        self.lines.append("> " + self.sentence())
+
+    def hr(self, i: int) -> None:
+        self.lines.append(self.rng.choice(["---", "***"]))
+
+    def image(self, i: int) -> None:
+        self.image_seq += 1
+        self.lines.append(f"![図 {self.image_seq}](images/fig{self.image_seq % 7}.png)")
+
+    def code(self, i: int) -> None:
+        lang = self.rng.choice(["python", "js", "", "bash"])
+        self.lines.append("```" + lang)
+        self.lines.extend(self.rng.choice(_CODE) for _ in range(self.rng.randint(2, 12)))
+        self.lines.append("```")
+
+    def list(self, i: int) -> None:
+        # ルートは indent 0 から始める (浅い階層への戻りはルートより深くなる範囲で)
+        depth = 0
+        for n in range(self.rng.randint(2, 10)):
+            move = self.rng.random() if n else 1.0
+            if move < 0.3 and depth < 3:
+                depth += 1
+            elif move < 0.5 and depth > 0:
+                depth = self.rng.randint(0, depth - 1)
+            marker = f"{self.rng.randint(1, 9)}." if self.rng.random() < 0.4 else self.rng.choice(["-", "*"])
+            self.lines.append("  " * depth + f"{marker} {self.sentence(2, 10)}")
+        self.lines.append("")
+
+
+def generate(size: str, mix: str, seed: int = 0) -> List[str]:
+    """size × mix の記事 1 本 (改行付きの行リスト)"""
+    rng = random.Random(f"{seed}:{size}:{mix}")
+    writer = _Writer(rng)
+    weights = MIXES[mix]
+    kinds = list(weights)
+    blocks = SIZES[size]
+
+    if mix in ("paywall", "mixed"):
+        writer.lines.append("<toc>")
+    pay_at = blocks // 2 if mix in ("paywall", "mixed") else -1
+
+    for i in range(blocks):
+        if i == pay_at:
+            writer.lines.extend(["", "<pay>", ""])
+        kind = rng.choices(kinds, weights=[weights[k] for k in kinds])[0]
+        getattr(writer, kind)(i)
+        if rng.random() < 0.3:
+            writer.lines.append("")
+    return [line + "\n" for line in writer.lines]
+
+
+def corpus(seed: int = 0, sizes: Tuple[str, ...] = tuple(SIZES)) -> List[Tuple[str, List[str]]]:
+    """[(名前, 行リスト)] を大きさ・構成の順に返す"""
+    return [(f"{size}-{mix}", generate(size, mix, seed)) for size in sizes for mix in MIXES]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", default="corpus")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for name, lines in corpus(args.seed):
+        with open(os.path.join(args.out, f"{name}.md"), "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        print(f"{name}: {len(lines)} lines")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
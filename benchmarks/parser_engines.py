@@ -0,0 +1,128 @@
+"""
+Markdown パーサのエンジン比較
+
+    python benchmarks/parser_engines.py [--docs 200] [--repeat 5] [file.md ...]
+
+- ファイルを渡さなければ、見出し・リスト・リンク・強調・コード・画像などを混ぜた文書を生成する
+- 画像アップロードはダミー、uuid は連番に差し替えて、全エンジンの出力 HTML が一致するか確認する
+  (--id-strategy content では差し替えず、内容から決まる ID のまま一致と、2 回目のパースでも同じになるかを確認する)
+- 各エンジンの処理速度 (行/秒) を出す
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import NoteClient2.markdown_parser as markdown_parser  # noqa: E402
+from NoteClient2.markdown_parser import PARSER_ENGINES, parser_class  # noqa: E402
+from NoteClient2.utils import ID_STRATEGIES  # noqa: E402
+
+
+class StubImages:
+    def upload_image(self, http: Any, headers: Dict[str, str], file_path: str) -> Dict[str, Any]:
+        return {"ok": True, "data": {"url": f"https://example.invalid/{file_path}", "path": f"img/{file_path}", "cached": False}}
+
+
+def sample_document(rng: random.Random, blocks: int = 80) -> List[str]:
+    words = ["note", "記事", "Python", "**太字**", "*斜体*", "~~取消~~", "[リンク](https://example.com)", "テキスト", "高速化"]
+
+    def sentence() -> str:
+        return " ".join(rng.choice(words) for _ in range(rng.randint(4, 16)))
+
+    lines: List[str] = []
+    for i in range(blocks):
+        kind = rng.random()
+        if kind < 0.08:
+            lines.append(f"## 見出し {i}")
+        elif kind < 0.12:
+            lines.append(f"### 小見出し {i}")
+        elif kind < 0.3:
+            for depth in (0, 0, 2, 2, 0):
+                marker = "1." if rng.random() < 0.4 else "-"
+                lines.append(" " * depth + f"{marker} {sentence()}")
+            lines.append("")
+        elif kind < 0.35:
+            lines.extend(["```python", "def f(x):", "    return x * 2", "```"])
+        elif kind < 0.38:
+            lines.append(f"![図 {i}](img{i % 5}.png)")
+        elif kind < 0.42:
+            lines.append(f"> {sentence()}")
+        elif kind < 0.44:
+            lines.append("---")
+        else:
+            lines.append(sentence())
+    return [line + "\n" for line in lines]
+
+
+def run_engine(engine: str, docs: List[List[str]], id_strategy: str = "random") -> List[Any]:
+    parser = parser_class(engine)(StubImages(), image_concurrency=1, id_strategy=id_strategy)
+    outputs = []
+    for lines in docs:
+        if id_strategy == "random":
+            counter = itertools.count()
+            markdown_parser.gen_uuid = lambda: f"id{next(counter)}"
+        try:
+            layout = parser._tokenize(lines)
+        except Exception as e:
+            # 既存のパーサと同じ入力で同じ例外になることも一致とみなす
+            outputs.append(("error", type(e).__name__))
+            continue
+        if not layout.get("ok"):
+            outputs.append(layout)
+            continue
+        uploaded = parser._upload_images(None, {}, "<bench>", layout["data"].image_paths())
+        outputs.append(parser._render(layout["data"], uploaded["data"]))
+    return outputs
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("files", nargs="*")
+    ap.add_argument("--docs", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--id-strategy", choices=ID_STRATEGIES, default="random")
+    args = ap.parse_args()
+
+    if args.files:
+        docs = []
+        for path in args.files:
+            with open(path, "r", encoding="utf-8") as f:
+                docs.append(f.readlines())
+    else:
+        rng = random.Random(args.seed)
+        docs = [sample_document(rng) for _ in range(args.docs)]
+    total_lines = sum(len(d) for d in docs)
+
+    original_uuid = markdown_parser.gen_uuid
+    try:
+        reference = run_engine("default", docs, args.id_strategy)
+        for engine in PARSER_ENGINES:
+            if run_engine(engine, docs, args.id_strategy) != reference:
+                print(f"{engine}: output differs from default")
+                return 1
+        if args.id_strategy == "content" and run_engine("default", docs, args.id_strategy) != reference:
+            print("content ids differ between runs")
+            return 1
+
+        print(f"{len(docs)} docs, {total_lines} lines, repeat={args.repeat}, id_strategy={args.id_strategy}")
+        for engine in PARSER_ENGINES:
+            best = float("inf")
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                run_engine(engine, docs, args.id_strategy)
+                best = min(best, time.perf_counter() - started)
+            print(f"{engine:>8}: {best * 1000:8.1f} ms  {total_lines / best:12.0f} lines/s")
+    finally:
+        markdown_parser.gen_uuid = original_uuid
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+publish() のエンドツーエンドベンチマーク (ローカルのスタンドインサーバに投稿する)
+
+    python benchmarks/publish_bench.py [--workload single|batch|images|all] [--count 50]
+                                       [--workers 4] [--latency-ms 20] [--error-rate 0.0]
+                                       [--images 12] [--pipeline] [--json]
+
+- single: publish() を 1 件ずつ順に実行
+- batch:  publish_many() で max_workers 本並行に実行
+- images: 1 記事あたり --images 枚の (毎回異なる) 画像を含む記事を publish_many() で実行
+
+publishes/s・レイテンシ (p50 / p99)・1 投稿あたりの送受信バイト数を出す
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_note import MockNoteServer  # noqa: E402
+from NoteClient2 import NoteClient2  # noqa: E402
+
+ARTICLE = """# ベンチマーク記事 {index}
+
+<toc>
+
+## はじめに
+これは **ベンチマーク** 用の記事です。[リンク](https://example.com) や *強調* を含みます。
+
+- 項目 1
+- 項目 2
+  1. 入れ子 1
+  2. 入れ子 2
+
+```python
+def hello():
+    return "world"
+```
+
+{images}
+
+<pay>
+
+## 有料部分
+ここから先は有料です。
+"""
+
+
+def tiny_png(seed: int, size: int = 16) -> bytes:
+    """seed ごとに中身の違う小さな PNG (Pillow なしで作る)"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    row = bytes([0] + [(seed * 31 + x * 7) % 256 for x in range(size * 3)])
+    raw = row * size
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+class Workspace:
+    """session.json・記事・画像を一時ディレクトリに用意する"""
+
+    def __init__(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory(prefix="noteclient2-bench-")
+        self.root = self._tmp.name
+        self._image_seq = 0
+        self.session_file = os.path.join(self.root, "session.json")
+        with open(self.session_file, "w", encoding="utf-8") as f:
+            json.dump({"timestamp": "2099-01-01T00:00:00", "cookies": {"XSRF-TOKEN": "bench", "_note_session_v5": "bench"}}, f)
+        self.eyecatch = self.image()
+
+    def image(self) -> str:
+        self._image_seq += 1
+        path = os.path.join(self.root, f"img{self._image_seq}.png")
+        with open(path, "wb") as f:
+            f.write(tiny_png(self._image_seq))
+        return path
+
+    def article(self, index: int, images: int = 1) -> str:
+        refs = "\n".join(f"![図 {i}]({self.image()})" for i in range(images))
+        path = os.path.join(self.root, f"article{index}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(ARTICLE.format(index=index, images=refs))
+        return path
+
+    def close(self) -> None:
+        self._tmp.cleanup()
+
+
+class ByteCounter:
+    """Instrumentation のフック: 送受信バイト数を数える"""
+
+    def __init__(self) -> None:
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, event: Dict[str, Any]) -> None:
+        if event.get("kind") == "http":
+            with self._lock:
+                self.total += (event.get("bytes_sent") or 0) + (event.get("bytes_received") or 0)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def make_client(server: MockNoteServer, workspace: Workspace, args: argparse.Namespace) -> NoteClient2:
+    client = NoteClient2(
+        "bench@example.invalid",
+        "unused",
+        "bench",
+        session_file=workspace.session_file,
+        pool_maxsize=max(10, args.workers * 2),
+        pipeline=args.pipeline,
+    )
+    client.http.url_overrides = {"https://note.com": server.url}
+    return client
+
+
+def run_workload(name: str, server: MockNoteServer, args: argparse.Namespace) -> Dict[str, Any]:
+    workspace = Workspace()
+    images = args.images if name == "images" else 1
+    jobs = [
+        {
+            "title": f"bench {i}",
+            "md_file_path": workspace.article(i, images),
+            "eyecatch_path": workspace.eyecatch,
+            "hashtags": ["bench"],
+            "magazine_key": ["m0bench"],
+            "is_publish": True,
+        }
+        for i in range(args.count)
+    ]
+
+    client = make_client(server, workspace, args)
+    counter = ByteCounter()
+    client.instrumentation.add_hook(counter)
+    # 認証 (user_features) は計測に含めない
+    client.auth.prepare(client.http)
+    server.reset_counters()
+    counter.total = 0
+
+    latencies: List[float] = []
+    failed = 0
+    started = time.perf_counter()
+    try:
+        if name == "single":
+            for job in jobs:
+                t0 = time.perf_counter()
+                result = client.publish(**job)
+                latencies.append(time.perf_counter() - t0)
+                failed += 0 if result.get("ok") else 1
+        else:
+            for item in client.publish_many(jobs, max_workers=args.workers):
+                latencies.append(item["elapsed"])
+                failed += 0 if item["result"].get("ok") else 1
+    finally:
+        elapsed = time.perf_counter() - started
+        client.close()
+        workspace.close()
+
+    return {
+        "workload": name,
+        "publishes": args.count,
+        "failed": failed,
+        "elapsed": elapsed,
+        "per_second": args.count / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "bytes_per_publish": counter.total / args.count if args.count else 0,
+        "requests": dict(sorted(server.requests.items())),
+        "errors": dict(sorted(server.errors.items())),
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workload", choices=["single", "batch", "images", "all"], default="all")
+    ap.add_argument("--count", type=int, default=50)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="各エンドポイントの応答遅延")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="各リクエストが error_status を返す確率")
+    ap.add_argument("--images", type=int, default=12, help="images ワークロードの 1 記事あたりの画像数")
+    ap.add_argument("--pipeline", action="store_true", help="NoteClient2(pipeline=True) で実行する")
+    ap.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = ap.parse_args()
+
+    workloads = ["single", "batch", "images"] if args.workload == "all" else [args.workload]
+    results = []
+    with MockNoteServer(latency=args.latency_ms / 1000.0, error_rate=args.error_rate) as server:
+        for name in workloads:
+            results.append(run_workload(name, server, args))
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"latency={args.latency_ms}ms error_rate={args.error_rate} workers={args.workers} pipeline={args.pipeline}")
+    print(f"{'workload':>8} {'n':>5} {'fail':>5} {'pub/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'bytes/pub':>10}")
+    for r in results:
+        print(
+            f"{r['workload']:>8} {r['publishes']:>5} {r['failed']:>5} {r['per_second']:>8.2f} "
+            f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['bytes_per_publish']:>10.0f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
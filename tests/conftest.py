@@ -0,0 +1,57 @@
+from __future__ import annotations
+import json
+import os
+import sys
+from typing import Any, Callable, Iterator
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+from mock_note import MockNoteServer  # noqa: E402
+from NoteClient2 import NoteClient2  # noqa: E402
+
+
+@pytest.fixture
+def server() -> Iterator[MockNoteServer]:
+    """note.com / S3 のスタンドイン (benchmarks/mock_note.py、遅延なし)"""
+    with MockNoteServer() as s:
+        yield s
+
+
+@pytest.fixture
+def session_file(tmp_path: Any) -> str:
+    # 期限の遠い session.json を置いて、ログイン (Playwright) を通らないようにする
+    path = tmp_path / "session.json"
+    path.write_text(json.dumps({"timestamp": "2099-01-01T00:00:00", "cookies": {"XSRF-TOKEN": "t", "_note_session_v5": "s"}}), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def make_client(server: MockNoteServer, session_file: str) -> Iterator[Callable[..., NoteClient2]]:
+    """スタンドインに向けた NoteClient2 を作る (テストの終わりに閉じる)"""
+    clients = []
+
+    def make(**options: Any) -> NoteClient2:
+        client = NoteClient2("user@example.invalid", "unused", "user", session_file=session_file, **options)
+        client.http.url_overrides = {"https://note.com": server.url}
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+@pytest.fixture
+def write_file(tmp_path: Any) -> Callable[[str, Any], str]:
+    """tmp_path にファイルを書いてパスを返す (str はテキスト、bytes はそのまま)"""
+    def write(name: str, content: Any) -> str:
+        path = tmp_path / name
+        if isinstance(content, bytes):
+            path.write_bytes(content)
+        else:
+            path.write_text(content, encoding="utf-8")
+        return str(path)
+    return write
@@ -0,0 +1,114 @@
+from __future__ import annotations
+import itertools
+import json
+import threading
+
+import pytest
+
+from NoteClient2 import AccountPool, RateLimiter
+
+
+@pytest.fixture
+def accounts(server, tmp_path):
+    pool = AccountPool(rate_limiter_factory=lambda: RateLimiter(max_concurrency=4))
+    for name in ("alice", "bob"):
+        session_file = tmp_path / f"session_{name}.json"
+        session_file.write_text(json.dumps({"timestamp": "2099-01-01T00:00:00", "cookies": {"XSRF-TOKEN": name}}), encoding="utf-8")
+        client = pool.add(name, f"{name}@example.invalid", "unused", name, session_file=str(session_file))
+        client.http.url_overrides = {"https://note.com": server.url}
+    yield pool
+    pool.close()
+
+
+def track_concurrency(accounts):
+    """アカウントごとの同時実行数の最大値を記録するように publish を包む"""
+    lock = threading.Lock()
+    running = {name: 0 for name in accounts.names}
+    peak = dict(running)
+    for name in accounts.names:
+        client = accounts.client(name)
+
+        def publish(_name=name, _publish=client.publish, **job):
+            with lock:
+                running[_name] += 1
+                peak[_name] = max(peak[_name], running[_name])
+            try:
+                return _publish(**job)
+            finally:
+                with lock:
+                    running[_name] -= 1
+
+        client.publish = publish
+    return peak
+
+
+def test_clients_share_one_pool_with_their_own_limiters(accounts):
+    alice, bob = accounts.client("alice"), accounts.client("bob")
+    assert alice.http.pool is accounts.pool and bob.http.pool is accounts.pool
+    assert alice.http.rate_limiter is not bob.http.rate_limiter
+    with pytest.raises(ValueError):
+        accounts.add("alice", "x@example.invalid", "unused", "x")
+
+
+def test_publish_many_runs_each_account_with_its_own_cookies(server, accounts, write_file):
+    md = write_file("a.md", "body\n")
+    jobs = [{"account": name, "title": f"{name}{i}", "md_file_path": md} for i in range(3) for name in ("alice", "bob")]
+    jobs.append({"account": "carol", "title": "x", "md_file_path": md})
+
+    items = list(accounts.publish_many(jobs, max_workers=4))
+
+    assert sorted(item["index"] for item in items) == list(range(7))
+    unknown = [item for item in items if item["account"] == "carol"]
+    assert unknown[0]["result"]["error"]["type"] == "UnknownAccount"
+    stats = items[-1]["stats"]
+    assert stats["accounts"]["alice"] == {"completed": 3, "failed": 0}
+    assert stats["accounts"]["bob"] == {"completed": 3, "failed": 0}
+    assert server.requests["text_notes"] == 6
+    assert accounts.client("alice").cookies["XSRF-TOKEN"] == "alice"
+    assert accounts.client("bob").cookies["XSRF-TOKEN"] == "bob"
+
+
+def test_per_account_limit_keeps_other_accounts_moving(server, accounts, write_file):
+    server.latency = {"draft_save": 0.05}
+    md = write_file("a.md", "body\n")
+    names = ["alice", "alice", "bob", "bob"] + ["alice"] * 6
+    peak = track_concurrency(accounts)
+
+    items = list(accounts.publish_many(({"account": n, "title": str(i), "md_file_path": md} for i, n in enumerate(names)), max_workers=3, per_account=1))
+
+    assert all(item["result"]["ok"] for item in items)
+    assert peak == {"alice": 1, "bob": 1}
+    # alice のジョブが多くても bob のジョブは先に終わる
+    assert [item["account"] for item in items[:4]].count("bob") == 2
+
+
+def test_jobs_are_read_lazily(accounts, write_file):
+    md = write_file("a.md", "body\n")
+    read = []
+
+    def jobs():
+        for i in itertools.count():
+            read.append(i)
+            yield {"account": ("alice", "bob")[i % 2], "title": str(i), "md_file_path": md}
+
+    results = accounts.publish_many(jobs(), max_workers=2)
+    for _ in range(3):
+        next(results)
+    results.close()
+
+    assert len(read) <= 3 + 2 * 2 + 1
+
+
+def test_refresh_skips_accounts_that_are_still_fresh(server, accounts):
+    assert set(accounts.refresh()) == {"alice", "bob"}
+    assert server.requests["user_features"] == 2
+
+    # 検証の残り時間が refresh_margin より長ければ何もしない
+    server.reset_counters()
+    assert accounts.refresh() == {}
+    assert "user_features" not in server.requests
+
+    results = accounts.refresh(force=True)
+    assert all(result["ok"] for result in results.values())
+    assert server.requests["user_features"] == 2
+    assert set(accounts.last_refresh) == {"alice", "bob"}
@@ -0,0 +1,101 @@
+from __future__ import annotations
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from NoteClient2 import AsyncNoteClient2  # noqa: E402
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 64
+
+
+@pytest.fixture
+def run(server, session_file):
+    """スタンドインに向けた AsyncNoteClient2 を渡してコルーチン関数を実行する"""
+    def run(test, **options):
+        async def main():
+            async with AsyncNoteClient2("user@example.invalid", "unused", "user", session_file=session_file, **options) as client:
+                client.http.url_overrides = {"https://note.com": server.url}
+                return await test(client)
+        return asyncio.run(main())
+    return run
+
+
+def test_publish_draft_and_published(server, run, write_file):
+    image = write_file("a.png", PNG)
+    md = write_file("a.md", f"# title\n![figure]({image})\nbody\n<pay>\npaid\n")
+
+    async def test(client):
+        return await asyncio.gather(
+            client.publish("draft", md),
+            client.publish("published", md, eyecatch_path=image, hashtags=["tag"], price=100, magazine_key=["mabc"], is_publish=True),
+        )
+
+    draft, published = run(test)
+
+    assert draft["ok"] and draft["data"]["mode"] == "draft"
+    assert published["ok"] and published["data"]["mode"] == "published" and published["data"]["has_pay"]
+    assert server.requests["text_notes"] == 2
+    assert server.requests["draft_save"] == 2  # draft 保存と publish 前の一時保存
+    assert (server.requests["publish"], server.requests["eyecatch"], server.requests["magazine_page"]) == (1, 1, 1)
+
+
+def test_concurrent_publishes_upload_a_shared_image_once(server, run, write_file):
+    image = write_file("a.png", PNG)
+    md = write_file("a.md", f"![figure]({image})\nbody\n")
+
+    async def test(client):
+        return await asyncio.gather(*(client.publish(str(i), md) for i in range(5)))
+
+    assert all(result["ok"] for result in run(test))
+    assert server.requests["text_notes"] == 5
+    assert server.requests["presign"] == 1
+
+
+def test_prepare_runs_off_the_event_loop(run, write_file):
+    md = write_file("a.md", "body\n")
+    threads = []
+
+    async def test(client):
+        prepare = client.parser.prepare
+
+        def recording(*args):
+            threads.append(threading.get_ident())
+            return prepare(*args)
+
+        client.parser.prepare = recording
+        return await client.publish("t", md)
+
+    assert run(test)["ok"]
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_missing_image_fails_before_creating_the_note(server, run, write_file):
+    md = write_file("a.md", "body\n![figure](missing.png)\n")
+
+    async def test(client):
+        return await client.publish("t", md)
+
+    result = run(test)
+
+    assert not result["ok"] and result["error"]["type"] == "FileNotFound"
+    assert "text_notes" not in server.requests
+
+
+def test_failure_after_create_resumes_on_the_same_draft(server, run, write_file):
+    md = write_file("a.md", "body\n")
+
+    async def test(client):
+        server.error_rate = {"draft_save": 1.0}
+        failed = await client.publish("t", md)
+        server.error_rate = 0.0
+        resumed = await client.publish("t", md, resume=failed["error"]["resume"])
+        return failed, resumed
+
+    failed, resumed = run(test)
+
+    assert not failed["ok"] and resumed["ok"]
+    assert resumed["data"]["note_id"] == failed["error"]["resume"]["note_id"]
+    assert server.requests["text_notes"] == 1
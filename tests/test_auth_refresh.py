@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import pytest
+
+from NoteClient2.http import HttpClient
+
+NOTE_LIST = "https://note.com/api/v2/note_list/contents?publish_status=draft&page=1"
+
+
+@pytest.fixture
+def http(server):
+    client = HttpClient({}, {}, url_overrides={"https://note.com": server.url})
+    yield client
+    client.close()
+
+
+@pytest.mark.parametrize("status", [401, 403])
+def test_auth_failure_is_refreshed_and_retried_once(server, http, status):
+    server.error_status = status
+    server.error_rate = {"note_list": 1.0}
+    calls = []
+
+    def handler():
+        calls.append(1)
+        server.error_rate = 0.0
+        return True
+
+    http.set_auth_handler(handler)
+
+    assert http.get(NOTE_LIST)["ok"]
+    assert len(calls) == 1
+    assert server.requests["note_list"] == 2
+
+
+def test_request_is_not_retried_when_refresh_fails(server, http):
+    server.error_status = 401
+    server.error_rate = 1.0
+    calls = []
+    http.set_auth_handler(lambda: calls.append(1) or False)
+
+    assert http.get(NOTE_LIST)["status_code"] == 401
+    assert len(calls) == 1
+    assert server.requests["note_list"] == 1
+
+
+def test_refresh_is_not_attempted_for_other_hosts_or_auth_retry_false(server, http):
+    server.error_status = 401
+    server.error_rate = 1.0
+    calls = []
+    http.set_auth_handler(lambda: calls.append(1) or True)
+
+    assert not http.post(f"{server.url}/s3").get("ok")  # S3 などの note.com 以外
+    assert not http.get(NOTE_LIST, auth_retry=False).get("ok")
+    assert calls == []
+
+
+def test_client_revalidates_the_session_and_retries(server, make_client, write_file):
+    md = write_file("a.md", "body\n")
+    client = make_client()
+    assert client.publish("first", md)["ok"]
+    assert server.requests["user_features"] == 1
+
+    # revalidate_interval 内はセッションを検証し直さない
+    server.reset_counters()
+    assert client.publish("second", md)["ok"]
+    assert "user_features" not in server.requests
+
+    # 401 が返ったら session.json を検証し直して、同じリクエストを 1 回だけ送り直す
+    refresh = client.auth.refresh
+
+    def refreshed(http):
+        server.error_rate = 0.0
+        return refresh(http)
+
+    client.auth.refresh = refreshed
+    server.reset_counters()
+    server.error_status = 401
+    server.error_rate = {"text_notes": 1.0}
+
+    assert client.publish("third", md)["ok"]
+    assert server.requests["user_features"] == 1
+    assert server.requests["text_notes"] == 2
@@ -0,0 +1,81 @@
+from __future__ import annotations
+import itertools
+
+import pytest
+
+from parser_corpus import corpus
+from NoteClient2 import BulkParser
+from NoteClient2.markdown_parser import MarkdownParser
+
+DOCS = [lines for _, lines in corpus(sizes=("small",))]
+BAD = ["a\n", "<pay>\n", "b\n", "<pay>\n", "c\n"]
+
+
+class StubImages:
+    def __init__(self, prefix=True):
+        self.prefix = prefix
+
+    def upload_image(self, http, headers, file_path):
+        if not self.prefix:
+            return {"ok": True, "data": {"url": file_path, "path": file_path}}
+        return {"ok": True, "data": {"url": f"https://assets.example.invalid/{file_path}", "path": f"img/{file_path}"}}
+
+
+def expected(lines, images=None):
+    return MarkdownParser(images or StubImages(), image_concurrency=1, id_strategy="content").parse(None, {}, list(lines))
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_filled_results_match_parse(processes):
+    bulk = BulkParser(processes=processes, chunksize=2, id_strategy="content")
+    items = list(bulk.parse_many(DOCS))
+
+    assert [item["index"] for item in items] == list(range(len(DOCS)))
+    for item, lines in zip(items, DOCS):
+        ir = item["result"]["data"]
+        uploads = {p: StubImages().upload_image(None, {}, p)["data"] for p in ir.image_paths()}
+        assert BulkParser.fill_images(ir, uploads) == expected(lines)["data"]
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_stub_images_render_in_the_worker(processes):
+    bulk = BulkParser(processes=processes, images="stub", id_strategy="content")
+    for item, lines in zip(bulk.parse_many(DOCS), DOCS):
+        assert item["result"] == expected(lines, StubImages(prefix=False))
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_failures_are_reported_per_document(processes, write_file):
+    path = write_file("a.md", "本文\n")
+    sources = [DOCS[0], BAD, path, path + ".gone"]
+
+    items = list(BulkParser(processes=processes).parse_many(sources))
+
+    assert [item["result"]["ok"] for item in items] == [True, False, True, False]
+    assert items[1]["result"] == expected(BAD)
+    assert items[2]["source"] == path and items[0]["source"] is None
+    assert items[3]["result"]["error"]["type"] == "FileNotFound"
+
+
+def test_sources_are_read_lazily():
+    read = []
+
+    def sources():
+        for i in itertools.count():
+            read.append(i)
+            yield DOCS[i % len(DOCS)]
+
+    results = BulkParser(processes=2, chunksize=2).parse_many(sources())
+    for _ in range(3):
+        next(results)
+    results.close()
+
+    # 未完了は processes * 2 チャンクまで
+    assert len(read) <= 2 * 2 * 2 + 2 + 1
+
+
+def test_bad_options_are_rejected():
+    with pytest.raises(ValueError):
+        BulkParser(images="upload")
+    with pytest.raises(ValueError):
+        BulkParser(chunksize=0)
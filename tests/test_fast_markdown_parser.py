@@ -0,0 +1,56 @@
+from __future__ import annotations
+from typing import Any, Dict
+
+import pytest
+
+from parser_corpus import corpus
+from NoteClient2.markdown_parser import PARSER_ENGINES, parser_class
+
+EDGE_CASES = {
+    "inline": "**太字** と *斜体* と ~~取消~~ と [リンク](https://example.com) と **[太字のリンク](https://example.com)**\n",
+    "nested-lists": "- a\n  - b\n    1. c\n  - d\n- e\n1. f\n2. g\n   - h\n\n段落\n",
+    "code-fence": "```python\n- not a list\n# not a heading\n<pay>\n![not an image](x.png)\n```\n後\n",
+    "unclosed-fence": "```\ncode\n",
+    "paywall": "<toc>\n# 見出し\n無料\n<pay>\n### 有料\n![図](a.png)\n",
+    "two-pay-tags": "a\n<pay>\nb\n<pay>\nc\n",
+    "headings": "# h1\n## h2\n### h3\n#### h4\n> 引用 **強調**\n---\n***\n",
+    "images": "![a](a.png)\n![b](b.png) 後ろの文\n![a again](a.png)\n",
+    "empty": "",
+}
+
+
+class StubImages:
+    def upload_image(self, http: Any, headers: Dict[str, str], file_path: str) -> Dict[str, Any]:
+        return {"ok": True, "data": {"url": f"https://assets.example.invalid/{file_path}", "path": f"img/{file_path}"}}
+
+
+def parse_all(lines):
+    results = []
+    for engine in PARSER_ENGINES:
+        parser = parser_class(engine)(StubImages(), image_concurrency=1, id_strategy="content")
+        try:
+            results.append(parser.parse(None, {}, list(lines)))
+        except Exception as e:
+            # 同じ入力で同じ例外になるのも一致とみなす
+            results.append(("error", type(e).__name__))
+    return results
+
+
+@pytest.mark.parametrize("name, lines", corpus(sizes=("small", "medium")), ids=lambda v: v if isinstance(v, str) else "")
+def test_engines_render_the_corpus_identically(name, lines):
+    default, *others = parse_all(lines)
+    assert default["ok"]
+    for other in others:
+        assert other == default
+
+
+@pytest.mark.parametrize("name", sorted(EDGE_CASES))
+def test_engines_render_edge_cases_identically(name):
+    default, *others = parse_all(EDGE_CASES[name].splitlines(keepends=True))
+    for other in others:
+        assert other == default
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        parser_class("slow")
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from NoteClient2.http import HttpClient, SessionPool
+
+NOTE_LIST = "https://note.com/api/v2/note_list/contents?publish_status=draft&page=1"
+
+
+def connections(pool: SessionPool, url: str) -> int:
+    # urllib3 のホスト別プールがこれまでに張った TCP 接続の数
+    pools = pool.session_for(url).get_adapter(url).poolmanager.pools
+    return sum(pools[key].num_connections for key in pools.keys())
+
+
+def test_sessions_are_kept_per_host():
+    pool = SessionPool()
+    try:
+        session = pool.session_for("https://note.com/api/v1/text_notes")
+        assert pool.session_for("https://note.com/api/v2/note_list/contents") is session
+        assert pool.session_for("https://s3.example.invalid/upload") is not session
+    finally:
+        pool.close()
+
+
+def test_requests_reuse_one_keep_alive_connection(server):
+    with HttpClient({}, {}, url_overrides={"https://note.com": server.url}) as http:
+        for _ in range(10):
+            assert http.get(NOTE_LIST)["ok"]
+        # 失敗応答や本文を読まない送信のあとも接続はプールに戻る
+        server.error_rate = 1.0
+        assert not http.get(NOTE_LIST)["ok"]
+        server.error_rate = 0.0
+        assert http.post("https://note.com/api/v1/text_notes/draft_save", body="discard")["ok"]
+
+        assert server.requests == {"note_list": 11, "draft_save": 1}
+        assert connections(http.pool, server.url) == 1
+
+
+def test_clients_share_a_pool_across_accounts(server):
+    pool = SessionPool()
+    try:
+        first = HttpClient({}, {"_note_session_v5": "a"}, pool=pool, url_overrides={"https://note.com": server.url})
+        second = HttpClient({}, {"_note_session_v5": "b"}, pool=pool, url_overrides={"https://note.com": server.url})
+        assert first.get(NOTE_LIST).get("ok") and second.get(NOTE_LIST).get("ok")
+
+        session = pool.session_for(server.url)
+        assert connections(pool, server.url) == 1
+
+        # 共有プールは渡した側が閉じる
+        first.close()
+        assert pool.session_for(server.url) is session
+    finally:
+        pool.close()
@@ -0,0 +1,124 @@
+from __future__ import annotations
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from NoteClient2 import ImageCache
+from NoteClient2 import image_cache as image_cache_module
+from NoteClient2.http import HttpClient
+from NoteClient2.images import ImageManager
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 64
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = ImageCache(str(tmp_path / "images.db"))
+    yield c
+    c.close()
+
+
+@pytest.fixture
+def http(server):
+    client = HttpClient({}, {}, url_overrides={"https://note.com": server.url})
+    yield client
+    client.close()
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_put_and_get_persist_across_instances(cache):
+    cache.put("d1", "https://assets.example.invalid/1.png", "img/1.png")
+    assert cache.get("d1") == ("https://assets.example.invalid/1.png", "img/1.png")
+    assert cache.get("d2") is None
+
+    reopened = ImageCache(cache.path)
+    try:
+        assert reopened.get("d1") == ("https://assets.example.invalid/1.png", "img/1.png")
+    finally:
+        reopened.close()
+
+
+def test_max_entries_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock = Clock(100.0)
+    monkeypatch.setattr(image_cache_module.time, "time", clock)
+    cache = ImageCache(str(tmp_path / "images.db"), max_entries=2)
+    try:
+        cache.put("d1", "u1", "p1")
+        clock.now += 1
+        cache.put("d2", "u2", "p2")
+        clock.now += 1
+        cache.get("d1")  # d1 を使ったので d2 が一番古い
+        clock.now += 1
+        cache.put("d3", "u3", "p3")
+
+        assert cache.get("d2") is None
+        assert cache.get("d1") == ("u1", "p1") and cache.get("d3") == ("u3", "p3")
+    finally:
+        cache.close()
+
+
+def test_max_age_expires_entries(tmp_path, monkeypatch):
+    clock = Clock(100.0)
+    monkeypatch.setattr(image_cache_module.time, "time", clock)
+    cache = ImageCache(str(tmp_path / "images.db"), max_age=10.0)
+    try:
+        cache.put("d1", "u1", "p1")
+        clock.now += 5
+        assert cache.get("d1") == ("u1", "p1")
+        clock.now += 6
+        assert cache.get("d1") is None
+    finally:
+        cache.close()
+
+
+def test_close_closes_every_threads_connection(cache):
+    conns = []
+
+    def worker():
+        conns.append(cache._conn())
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    conns.append(cache._conn())
+
+    cache.close()
+
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    # 閉じたあとに使うと接続し直す
+    cache.put("d1", "u1", "p1")
+    assert cache.get("d1") == ("u1", "p1")
+
+
+def test_concurrent_uploads_of_the_same_bytes_upload_once(server, http, write_file):
+    paths = [write_file(f"{i}.png", PNG) for i in range(4)]
+    images = ImageManager()
+
+    # 同じパスと、中身が同じ別パスが同時に来る
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda p: images.upload_image(http, {}, p), paths * 2))
+
+    assert all(r["ok"] for r in results)
+    assert len({r["data"]["url"] for r in results}) == 1
+    assert server.requests["presign"] == 1 and server.requests["s3"] == 1
+
+
+def test_cache_is_shared_between_managers(server, http, cache, write_file):
+    image = write_file("a.png", PNG)
+    first = ImageManager(cache=cache).upload_image(http, {}, image)
+    second = ImageManager(cache=cache).upload_image(http, {}, write_file("b.png", PNG))
+
+    assert first["ok"] and second["data"]["cached"]
+    assert second["data"]["url"] == first["data"]["url"]
+    assert server.requests["presign"] == 1
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import pytest
+
+from NoteClient2 import PrometheusMetrics
+
+STAGES = {"auth", "parse", "magazines", "create", "eyecatch", "draft_save", "temp_save", "put"}
+
+
+@pytest.mark.parametrize("is_publish", [False, True])
+def test_stage_events_do_not_overlap(make_client, write_file, is_publish):
+    image = write_file("a.png", b"\x89PNG\r\n\x1a\n" + b"\0" * 64)
+    md = write_file("a.md", "body\n")
+    client = make_client()
+    events = []
+    client.instrumentation.add_hook(events.append)
+
+    result = client.publish("t", md, eyecatch_path=image, is_publish=is_publish)
+
+    assert result["ok"]
+    stages = [e["stage"] for e in events if e["kind"] == "stage"]
+    # ステージは入れ子にしない (集計すると二重に数えてしまう)
+    assert len(stages) == len(set(stages)) and set(stages) <= STAGES
+    assert set(result["data"]["timings"]) - {"total"} == set(stages)
+    assert [e["kind"] for e in events].count("publish") == 1
+
+
+def test_prometheus_metrics_render_stage_histograms(make_client, write_file):
+    md = write_file("a.md", "body\n")
+    client = make_client()
+    metrics = PrometheusMetrics()
+    client.instrumentation.add_hook(metrics)
+
+    assert client.publish("t", md)["ok"]
+    text = metrics.render()
+
+    assert 'stage="draft_save"' in text and 'stage="save"' not in text
+    assert 'publish_total{ok="true"} 1' in text
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import pytest
+
+from NoteClient2 import ImageCache, JobStore
+
+NOTE = {"note_id": 7, "note_key": "n7", "note_data": {"id": 7, "key": "n7"}}
+PARSED = {"free_html": "<p>a</p>", "pay_html": "", "image_keys": ["k1"], "separator_id": None, "has_pay": False}
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = JobStore(str(tmp_path / "jobs.db"))
+    yield s
+    s.close()
+
+
+def test_add_dedupes_by_key(store):
+    first = store.add({"title": "a", "md_file_path": "a.md"}, key="a")
+    assert store.add({"title": "changed", "md_file_path": "a.md"}, key="a") == first
+    assert store.add({"title": "b", "md_file_path": "b.md"}) != first
+    assert store.stats()["total"] == 2
+
+
+def test_add_rejects_unserializable_jobs(store):
+    with pytest.raises(ValueError):
+        store.add({"title": "a", "md_file_path": object()})
+
+
+def test_claim_marks_jobs_running_in_order(store):
+    ids = [store.add({"title": str(i), "md_file_path": f"{i}.md"}) for i in range(3)]
+
+    claimed = list(store.claim())
+
+    assert [c["id"] for c in claimed] == ids
+    assert all(c["resume"] is None for c in claimed)
+    assert store.stats()["running"] == 3
+    assert [job["attempts"] for job in store.jobs("running")] == [1, 1, 1]
+
+
+def test_finished_jobs_are_not_claimed_again(store):
+    job_id = store.add({"title": "a", "md_file_path": "a.md"})
+    for claimed in store.claim():
+        store.recorder(claimed["id"])("parse", {"parsed": PARSED})
+        store.finish(claimed["id"], {"ok": True, "data": {"note_id": 7}})
+
+    assert list(store.claim()) == []
+    job = store.get(job_id)
+    assert (job["status"], job["stage"], job["result"]) == ("done", "done", {"note_id": 7})
+    assert job["image_keys"] == ["k1"]
+
+
+def test_recorded_stages_become_the_resume_state(store):
+    job_id = store.add({"title": "a", "md_file_path": "a.md"})
+    claimed = next(store.claim())
+    record = store.recorder(claimed["id"])
+    record("create", NOTE)
+    record("eyecatch", {"uploaded": True})
+    record("parse", {"parsed": PARSED})
+    record("magazines", {"magazine_ids": [1, 2]})
+
+    # 落ちたあとに別のインスタンスで開き直しても、running のジョブを続きから渡す
+    reopened = JobStore(store.path)
+    try:
+        resumed = next(reopened.claim())
+    finally:
+        reopened.close()
+    assert resumed["id"] == job_id
+    assert resumed["resume"] == {**NOTE, "eyecatch_uploaded": True, "parsed": PARSED, "magazine_ids": [1, 2]}
+    assert store.get(job_id)["attempts"] == 2
+
+
+def test_retry_failed_keeps_progress(store):
+    job_id = store.add({"title": "a", "md_file_path": "a.md"})
+    claimed = next(store.claim())
+    store.recorder(claimed["id"])("create", NOTE)
+    store.finish(claimed["id"], {"ok": False, "error": {"type": "NoteSaveFailed", "status_code": 503, "resume": {"note_id": 7}}})
+
+    failed = store.get(job_id)
+    assert failed["status"] == "failed"
+    assert failed["error"] == {"type": "NoteSaveFailed", "status_code": 503}
+    assert list(store.claim()) == []
+
+    assert store.retry_failed() == 1
+    assert store.retry_failed() == 0
+    resumed = next(store.claim())
+    assert resumed["resume"]["note_id"] == 7
+    assert store.stats()["queued"] == 1
+
+
+def test_jobs_rejects_unknown_status(store):
+    with pytest.raises(ValueError):
+        store.jobs("queued")
+
+
+def test_publish_queue_resumes_on_the_same_draft(server, make_client, write_file, store):
+    image = write_file("a.png", b"\x89PNG\r\n\x1a\n" + b"\0" * 64)
+    md = write_file("a.md", f"# title\n![figure]({image})\nbody\n")
+    store.add({"title": "a", "md_file_path": md})
+    client = make_client()
+
+    server.error_rate = {"draft_save": 1.0}
+    [first] = list(client.publish_queue(store))
+    assert not first["result"]["ok"]
+    assert store.get(first["job"]["id"])["note_id"] is not None
+
+    server.error_rate = 0.0
+    store.retry_failed()
+    [second] = list(client.publish_queue(store))
+
+    assert second["result"]["ok"]
+    assert second["stats"]["queued"] == 0
+    # 下書きは作り直さず、画像もアップロードし直さない
+    assert server.requests["text_notes"] == 1
+    assert server.requests["presign"] == 1
+    assert server.requests["draft_save"] == 2
+
+
+def test_publish_queue_scopes_its_image_cache_to_the_run(make_client, write_file, store):
+    md = write_file("a.md", "body\n")
+    store.add({"title": "a", "md_file_path": md})
+    client = make_client()
+    caches = []
+
+    for item in client.publish_queue(store):
+        caches.append(client.images.cache)
+        assert item["result"]["ok"]
+
+    # 実行中だけ store のファイルを使い、終わったら元 (image_cache なし) に戻す
+    assert caches[0].path == store.path
+    assert client.images.cache is None
+
+    own = ImageCache(store.path + ".images")
+    try:
+        client = make_client(image_cache=own)
+        list(client.publish_queue(store))
+        assert client.images.cache is own
+    finally:
+        own.close()
+
+
+def test_publish_queue_authenticates_once(make_client, write_file, store):
+    md = write_file("a.md", "body\n")
+    for i in range(3):
+        store.add({"title": str(i), "md_file_path": md})
+    client = make_client()
+    prepare = client.auth.prepare
+    calls = []
+    client.auth.prepare = lambda http, force=False: calls.append(1) or prepare(http, force)
+
+    items = list(client.publish_queue(store, max_workers=2))
+
+    assert [item["result"]["ok"] for item in items] == [True] * 3
+    assert len(calls) == 1
+    assert client.cookies == client.auth.cookies
+
+
+def test_publish_queue_reports_auth_failure_without_claiming(make_client, store):
+    store.add({"title": "a", "md_file_path": "a.md"})
+    client = make_client()
+    client.auth.prepare = lambda http, force=False: {"ok": False, "error": {"type": "LoginFailed"}}
+
+    [item] = list(client.publish_queue(store))
+
+    assert item["index"] is None and not item["result"]["ok"]
+    assert item["stats"]["queued"] == 1 and store.stats()["running"] == 0
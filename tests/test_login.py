@@ -0,0 +1,38 @@
+from __future__ import annotations
+import contextlib
+
+import pytest
+
+from NoteClient2 import NoteClient2
+from NoteClient2.auth import AuthManager
+
+
+@pytest.mark.parametrize("options", [{"storage_state_file": "state.json"}, {"user_data_dir": "profile"}])
+def test_login_state_requires_fast_login(options):
+    with pytest.raises(ValueError):
+        AuthManager("user@example.invalid", "unused", "session.json", {}, **options)
+    AuthManager("user@example.invalid", "unused", "session.json", {}, fast_login=True, **options)
+
+
+def test_client_passes_login_options_through(session_file):
+    with pytest.raises(ValueError):
+        NoteClient2("user@example.invalid", "unused", "user", session_file=session_file, login_state_file="state.json")
+    with NoteClient2("user@example.invalid", "unused", "user", session_file=session_file, fast_login=True, user_data_dir="profile") as client:
+        assert client.auth.user_data_dir == "profile"
+
+
+@pytest.mark.parametrize("fast_login, expected", [(False, "login"), (True, "fast_login")])
+def test_fast_path_is_used_only_with_fast_login(monkeypatch, fast_login, expected):
+    import playwright.sync_api
+
+    # ブラウザは起動せず、どちらのログイン処理が選ばれたかだけを見る
+    monkeypatch.setattr(playwright.sync_api, "sync_playwright", contextlib.nullcontext)
+    auth = AuthManager("user@example.invalid", "unused", "session.json", {}, fast_login=fast_login)
+    used = []
+    monkeypatch.setattr(auth, "_login", lambda *args: used.append("login") or [{"name": "a", "value": "1"}])
+    monkeypatch.setattr(auth, "_fast_login", lambda *args: used.append("fast_login") or [{"name": "a", "value": "1"}])
+
+    result = auth._get_cookies()
+
+    assert result["ok"] and auth.cookies == {"a": "1"}
+    assert used == [expected]
@@ -0,0 +1,111 @@
+from __future__ import annotations
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from NoteClient2 import magazines as magazines_module
+from NoteClient2.http import HttpClient
+from NoteClient2.magazines import MagazineResolver
+
+KEYS = ["mabc", "mdefg"]
+
+
+def magazine_id(key: str) -> int:
+    # スタンドインはキーの文字コードの和を ID として返す
+    return sum(map(ord, key))
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def http(server):
+    client = HttpClient({}, {}, url_overrides={"https://note.com": server.url})
+    yield client
+    client.close()
+
+
+def test_keys_are_resolved_in_order_and_cached(server, http):
+    resolver = MagazineResolver()
+    result = resolver.get_magazine_ids(http, "user", {}, ["mdefg", "", "mabc", "mdefg"])
+
+    assert result["data"]["magazine_ids"] == [magazine_id("mdefg"), magazine_id("mabc"), magazine_id("mdefg")]
+    assert server.requests == {"magazine_list": 1, "magazine_page": 2}
+
+    server.reset_counters()
+    assert resolver.get_magazine_ids(http, "user", {}, KEYS)["data"] == {"magazine_ids": [magazine_id(k) for k in KEYS], "fetched": 0}
+    assert server.requests == {}
+
+
+def test_entries_expire_after_ttl(server, http, monkeypatch):
+    clock = Clock(1000.0)
+    monkeypatch.setattr(magazines_module.time, "time", clock)
+    resolver = MagazineResolver(ttl=60.0)
+    resolver.get_magazine_ids(http, "user", {}, KEYS)
+
+    clock.now += 59
+    server.reset_counters()
+    resolver.get_magazine_ids(http, "user", {}, KEYS)
+    assert server.requests == {}
+
+    clock.now += 2
+    assert resolver.get_magazine_ids(http, "user", {}, KEYS)["data"]["fetched"] == 2
+    assert server.requests == {"magazine_list": 1, "magazine_page": 2}
+
+
+def test_cache_file_is_shared_between_resolvers(server, http, tmp_path):
+    cache_file = str(tmp_path / "magazines.json")
+    MagazineResolver(cache_file=cache_file).get_magazine_ids(http, "user", {}, KEYS)
+
+    server.reset_counters()
+    result = MagazineResolver(cache_file=cache_file).get_magazine_ids(http, "user", {}, KEYS)
+
+    assert result["data"]["magazine_ids"] == [magazine_id(k) for k in KEYS]
+    assert server.requests == {}
+
+
+def test_failures_are_not_cached(server, http):
+    resolver = MagazineResolver()
+    server.error_rate = {"magazine_page": 1.0}
+    result = resolver.get_magazine_ids(http, "user", {}, KEYS)
+    assert not result["ok"] and result["error"]["type"] == "MagazinePageFetchFailed"
+
+    server.error_rate = 0.0
+    assert resolver.get_magazine_ids(http, "user", {}, KEYS)["data"]["fetched"] == 2
+
+
+def test_concurrent_threads_fetch_each_key_once(server, http):
+    server.latency = {"magazine_list": 0.05, "magazine_page": 0.05}
+    resolver = MagazineResolver()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: resolver.get_magazine_ids(http, "user", {}, KEYS), range(8)))
+
+    assert all(r["data"]["magazine_ids"] == [magazine_id(k) for k in KEYS] for r in results)
+    assert server.requests == {"magazine_list": 1, "magazine_page": 2}
+
+
+def test_concurrent_tasks_fetch_each_key_once(server):
+    pytest.importorskip("aiohttp")
+    from NoteClient2.async_http import AsyncHttpClient
+
+    server.latency = {"magazine_list": 0.05, "magazine_page": 0.05}
+    resolver = MagazineResolver()
+
+    async def main():
+        http = AsyncHttpClient({}, {}, url_overrides={"https://note.com": server.url})
+        try:
+            return await asyncio.gather(*(resolver.aget_magazine_ids(http, "user", {}, KEYS) for _ in range(8)))
+        finally:
+            await http.close()
+
+    results = asyncio.run(main())
+
+    assert all(r["data"]["magazine_ids"] == [magazine_id(k) for k in KEYS] for r in results)
+    assert server.requests == {"magazine_list": 1, "magazine_page": 2}
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import pytest
+
+from NoteClient2 import NoteCache
+
+
+def entry(key: str) -> dict:
+    return {"key": key, "id": int(key[1:]), "name": key}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = NoteCache(str(tmp_path / "notes.db"))
+    yield c
+    c.close()
+
+
+def put(cache: NoteCache, key: str, status: str, seen_at: float, version: str = "v1") -> None:
+    cache.put(key, status, f"{status}:{version}", entry(key), {"id": int(key[1:]), "body": key}, seen_at=seen_at)
+
+
+def test_put_and_get(cache):
+    put(cache, "n1", "published", seen_at=10.0)
+    note = cache.get("n1")
+    assert note["status"] == "published"
+    assert note["version"] == "published:v1"
+    assert note["note"] == {"id": 1, "body": "n1"}
+    assert note["seen_at"] == 10.0 and not note["removed"]
+    assert cache.versions() == {"n1": "published:v1"}
+    assert cache.get("n2") is None
+
+
+def test_notes_that_were_not_listed_are_marked_removed(cache):
+    put(cache, "n1", "published", seen_at=10.0)
+    put(cache, "n2", "published", seen_at=10.0)
+    put(cache, "n3", "draft", seen_at=10.0)
+
+    cache.seen(["n1"], seen_at=20.0)
+
+    # status ごとに、その一覧で見えなかった記事だけ
+    assert cache.mark_removed("published", listed_at=20.0) == ["n2"]
+    assert cache.mark_removed("published", listed_at=20.0) == []
+    assert [n["key"] for n in cache.notes()] == ["n1", "n3"]
+    assert [n["key"] for n in cache.notes(include_removed=True)] == ["n1", "n2", "n3"]
+    assert cache.stats() == {"published": 1, "draft": 1, "removed": 1, "total": 3}
+    # removed でも version は残す (戻ってきたときに取り直さずに済む)
+    assert "n2" in cache.versions()
+
+
+def test_seen_restores_removed_notes(cache):
+    put(cache, "n1", "published", seen_at=10.0)
+    cache.mark_removed("published", listed_at=20.0)
+    assert cache.get("n1")["removed"]
+
+    cache.seen(["n1"], seen_at=30.0)
+
+    note = cache.get("n1")
+    assert not note["removed"] and note["seen_at"] == 30.0
+
+
+def test_put_restores_removed_notes(cache):
+    put(cache, "n1", "draft", seen_at=10.0)
+    cache.mark_removed("draft", listed_at=20.0)
+    put(cache, "n1", "published", seen_at=30.0, version="v2")
+
+    note = cache.get("n1")
+    assert not note["removed"]
+    assert (note["status"], note["version"]) == ("published", "published:v2")
+
+
+def test_notes_filters_by_status(cache):
+    put(cache, "n1", "published", seen_at=10.0)
+    put(cache, "n2", "draft", seen_at=10.0)
+    assert [n["key"] for n in cache.notes(status="draft")] == ["n2"]
+
+
+def test_cache_persists_across_instances(cache):
+    put(cache, "n1", "published", seen_at=10.0)
+    reopened = NoteCache(cache.path)
+    try:
+        assert reopened.versions() == {"n1": "published:v1"}
+    finally:
+        reopened.close()
+
+
+def test_export_only_removes_notes_that_left_every_listing(server, make_client, cache):
+    published = server.add_notes(3, "published")
+    drafts = server.add_notes(2, "draft")
+    client = make_client()
+    first = list(client.export_notes(cache))
+    assert {item["change"] for item in first} == {"new"}
+
+    server.edit_note(drafts[0], status="published")  # 下書きを公開した
+    server.delete_note(published[0])
+    server.reset_counters()
+    second = {item["key"]: item["change"] for item in client.export_notes(cache)}
+
+    assert second == {published[0]: "removed", drafts[0]: "updated"}
+    assert server.requests["note_detail"] == 1
+    assert cache.get(drafts[0])["status"] == "published"
+    assert cache.stats() == {"published": 3, "draft": 1, "removed": 1, "total": 5}
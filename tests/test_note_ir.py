@@ -0,0 +1,116 @@
+from __future__ import annotations
+import io
+import json
+import pickle
+
+import pytest
+
+from NoteClient2 import NoteIR
+from NoteClient2.images import ImageManager
+from NoteClient2.markdown_parser import MarkdownParser
+from NoteClient2.note_ir import plain_length, render
+
+MARKDOWN = """# 見出し
+<toc>
+本文の **太字** と [リンク](https://example.com)
+
+- 項目 1
+  - 入れ子
+1. 番号付き
+
+```python
+print("<pay>")
+```
+
+> 引用
+![図](a.png)
+<pay>
+### 有料部分
+![同じ図](a.png)
+![別の図](b.png)
+---
+"""
+
+UPLOADS = {
+    "a.png": {"url": "https://assets.example.invalid/img/ka.png", "path": "img/ka.png"},
+    "b.png": {"url": "https://assets.example.invalid/img/kb.png", "path": "img/kb.png"},
+}
+
+
+@pytest.fixture
+def parser():
+    # content の ID は Markdown から決まるので、別々にパースしても同じ HTML になる
+    return MarkdownParser(ImageManager(), id_strategy="content")
+
+
+@pytest.fixture
+def ir(parser):
+    parsed = parser.parse_ir(io.StringIO(MARKDOWN))
+    assert parsed["ok"]
+    return parsed["data"]
+
+
+def test_image_paths_are_unique_in_document_order(ir):
+    assert ir.image_paths() == ["a.png", "b.png"]
+    assert len(list(ir.images())) == 3
+
+
+def test_render_does_not_change_the_ir(ir):
+    before = NoteIR.from_dict(json.loads(json.dumps(ir.to_dict())))
+    first = render(ir, UPLOADS)
+    second = render(ir, UPLOADS)
+
+    assert ir == before
+    assert first == second
+    data = first["data"]
+    assert data["image_keys"] == ["ka", "ka", "kb"]
+    assert data["has_pay"] and data["separator_id"]
+    assert data["combined_html"] == data["free_html"] + data["pay_html"]
+    # コードブロック内の <pay> は区切りにならない
+    assert 'print("<pay>")' in data["free_html"] and "有料部分" in data["pay_html"]
+
+
+@pytest.mark.parametrize("round_trip", [
+    lambda ir: NoteIR.from_dict(json.loads(json.dumps(ir.to_dict()))),
+    lambda ir: pickle.loads(pickle.dumps(ir)),
+], ids=["json", "pickle"])
+def test_round_trip_renders_the_same_html(ir, round_trip):
+    restored = round_trip(ir)
+    assert restored == ir
+    assert render(restored, UPLOADS) == render(ir, UPLOADS)
+
+
+def test_render_matches_parse(parser):
+    text = MARKDOWN.replace("![図](a.png)\n", "").replace("![同じ図](a.png)\n", "").replace("![別の図](b.png)\n", "")
+    parsed = parser.parse(None, {}, io.StringIO(text))
+    ir = parser.parse_ir(io.StringIO(text))["data"]
+    assert render(ir, {}) == parsed
+
+
+def test_consume_empties_the_ir_with_the_same_output(ir):
+    expected = render(ir, UPLOADS)
+    assert render(ir, UPLOADS, consume=True) == expected
+    assert ir.free == [] and ir.pay == []
+
+
+def test_streaming_writes_the_same_html(ir):
+    expected = render(ir, UPLOADS)["data"]
+    free, pay = io.StringIO(), io.StringIO()
+    data = render(ir, UPLOADS, free_writer=free, pay_writer=pay)["data"]
+    assert (free.getvalue(), pay.getvalue()) == (expected["free_html"], expected["pay_html"])
+    assert (data["free_length"], data["pay_length"]) == (len(expected["free_html"]), len(expected["pay_html"]))
+    assert data["free_html"] is None and "body_length" not in data
+
+
+def test_body_length_is_counted_only_on_request(ir):
+    assert "body_length" not in render(ir, UPLOADS)["data"]
+    data = render(ir, UPLOADS, body_length=True)["data"]
+    assert data["body_length"] == plain_length(data["combined_html"])
+
+
+def test_from_dict_rejects_other_versions(ir):
+    data = ir.to_dict()
+    data["version"] += 1
+    with pytest.raises(ValueError):
+        NoteIR.from_dict(data)
+
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import pytest
+
+from NoteClient2.images import ImageManager
+from NoteClient2.markdown_parser import MarkdownParser
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 64
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_publish_reports_stage_timings(server, make_client, write_file, pipeline):
+    image = write_file("a.png", PNG)
+    md = write_file("a.md", f"# title\n![figure]({image})\nbody\n")
+    client = make_client(pipeline=pipeline)
+
+    result = client.publish("t", md, eyecatch_path=image, magazine_key=["mabc"], is_publish=True)
+
+    assert result["ok"]
+    assert {"auth", "parse", "magazines", "create", "eyecatch", "temp_save", "put", "total"} <= set(result["data"]["timings"])
+    assert (server.requests["text_notes"], server.requests["presign"], server.requests["eyecatch"]) == (1, 1, 1)
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_missing_image_fails_before_creating_the_note(server, make_client, write_file, pipeline):
+    md = write_file("a.md", "body\n![figure](missing.png)\n")
+    client = make_client(pipeline=pipeline)
+
+    result = client.publish("t", md)
+
+    assert not result["ok"] and result["error"]["type"] == "FileNotFound"
+    # 空の下書きを残さない
+    assert "text_notes" not in server.requests
+
+
+def test_upload_failure_after_create_can_resume(server, make_client, write_file):
+    image = write_file("a.png", PNG)
+    md = write_file("a.md", f"![figure]({image})\n")
+    client = make_client(pipeline=True)
+
+    server.error_rate = {"s3": 1.0}
+    failed = client.publish("t", md)
+    assert not failed["ok"] and failed["error"]["resume"]["note_id"]
+
+    server.error_rate = 0.0
+    assert client.publish("t", md, resume=failed["error"]["resume"])["ok"]
+    assert server.requests["text_notes"] == 1
+
+
+def test_prepare_reports_missing_images_without_uploading(write_file):
+    parser = MarkdownParser(ImageManager())
+    md = write_file("a.md", "本文\n![図](missing.png)\n")
+
+    result = parser.prepare(md)
+
+    assert not result["ok"]
+    assert result["error"]["type"] == "FileNotFound"
+    assert result["error"]["image_path"] == "missing.png"
+    assert result["error"]["md_path"] == md
@@ -0,0 +1,56 @@
+from __future__ import annotations
+import itertools
+
+AUTH_FAILED = {"ok": False, "error": {"type": "LoginFailed", "message": "denied"}}
+
+
+def test_results_cover_every_job_once(server, make_client, write_file):
+    md = write_file("a.md", "# title\nbody\n")
+    client = make_client()
+    jobs = [{"title": str(i), "md_file_path": md, "is_publish": i % 2 == 0} for i in range(6)]
+
+    items = list(client.publish_many(jobs, max_workers=3))
+
+    assert sorted(item["index"] for item in items) == list(range(6))
+    assert all(item["result"]["ok"] for item in items)
+    assert items[-1]["stats"]["completed"] == 6 and items[-1]["stats"]["failed"] == 0
+    assert server.requests["text_notes"] == 6
+    # 認証 (user_features) はまとめて 1 回まで
+    assert server.requests.get("user_features", 0) <= 1
+
+
+def test_jobs_are_read_lazily(make_client, write_file):
+    md = write_file("a.md", "body\n")
+    client = make_client()
+    read = []
+
+    def jobs():
+        for i in itertools.count():
+            read.append(i)
+            yield {"title": str(i), "md_file_path": md}
+
+    results = client.publish_many(jobs(), max_workers=2)
+    for _ in range(3):
+        next(results)
+    results.close()
+
+    # 未完了は max_workers * 2 件まで
+    assert len(read) <= 3 + 2 * 2
+
+
+def test_auth_failure_is_reported_once_without_reading_jobs(make_client):
+    client = make_client()
+    client.auth.prepare = lambda http: AUTH_FAILED
+    read = []
+
+    def jobs():
+        for i in itertools.count():
+            read.append(i)
+            yield {"title": str(i), "md_file_path": "a.md"}
+
+    items = list(client.publish_many(jobs()))
+
+    assert len(items) == 1
+    assert (items[0]["index"], items[0]["job"], items[0]["result"]) == (None, None, AUTH_FAILED)
+    assert items[0]["stats"]["completed"] == 0
+    assert read == []
@@ -0,0 +1,131 @@
+from __future__ import annotations
+import email.utils
+import threading
+import time
+
+import pytest
+
+from NoteClient2 import RateLimiter
+from NoteClient2.rate_limit import parse_retry_after
+
+URL = "https://note.com/api/v1/text_notes"
+
+
+def limit(limiter: RateLimiter) -> int:
+    return limiter.metrics()["note.com"]["concurrency_limit"]
+
+
+def test_throttle_halves_the_limit_once_per_cooldown():
+    limiter = RateLimiter(max_concurrency=8, cooldown=60.0)
+    key = limiter.acquire(URL)
+    limiter.release(key, 503)
+    assert limit(limiter) == 4
+
+    # cooldown 内の 2 回目の 429 / 5xx では下げない
+    key = limiter.acquire(URL)
+    limiter.release(key, 502)
+    assert limit(limiter) == 4
+
+
+def test_throttle_never_drops_below_min_concurrency():
+    limiter = RateLimiter(max_concurrency=4, min_concurrency=2, cooldown=0.0)
+    for _ in range(5):
+        limiter.release(limiter.acquire(URL), 500)
+    assert limit(limiter) == 2
+
+
+def test_success_increases_the_limit_additively_up_to_max():
+    limiter = RateLimiter(max_concurrency=4, initial_concurrency=2)
+    # 1 回の成功で 1 / limit ずつ増える (2 -> 2.5 -> 2.9 -> 3.24)
+    for _ in range(2):
+        limiter.release(limiter.acquire(URL), 200)
+    assert limit(limiter) == 2
+    limiter.release(limiter.acquire(URL), 200)
+    assert limit(limiter) == 3
+    for _ in range(20):
+        limiter.release(limiter.acquire(URL), 200)
+    assert limit(limiter) == 4
+
+
+def test_client_errors_do_not_change_the_limit():
+    limiter = RateLimiter(max_concurrency=4, initial_concurrency=2, cooldown=0.0)
+    limiter.release(limiter.acquire(URL), 404)
+    limiter.release(limiter.acquire(URL), None)  # 接続エラー
+    assert limit(limiter) == 2
+
+
+def test_acquire_waits_for_a_free_slot():
+    limiter = RateLimiter(max_concurrency=1)
+    key = limiter.acquire(URL)
+    acquired = threading.Event()
+
+    def worker():
+        limiter.release(limiter.acquire(URL), 200)
+        acquired.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release(key, 200)
+    assert acquired.wait(2.0)
+    thread.join()
+
+
+def test_limits_are_per_host():
+    limiter = RateLimiter(max_concurrency=4, cooldown=60.0)
+    limiter.release(limiter.acquire(URL), 503)
+    limiter.release(limiter.acquire("https://s3.example.invalid/upload"), 200)
+    metrics = limiter.metrics()
+    assert metrics["note.com"]["concurrency_limit"] == 2
+    assert metrics["s3.example.invalid"]["concurrency_limit"] == 4
+
+
+def test_retry_after_blocks_new_requests():
+    limiter = RateLimiter(cooldown=60.0)
+    delay = limiter.release(limiter.acquire(URL), 429, "0.2")
+    assert delay == pytest.approx(0.2)
+    assert limiter.metrics()["note.com"]["blocked_for"] > 0.1
+
+    started = time.monotonic()
+    limiter.release(limiter.acquire(URL), 200)
+    assert time.monotonic() - started >= 0.15
+
+
+def test_retry_after_on_5xx_is_capped():
+    limiter = RateLimiter(max_retry_after=5.0)
+    assert limiter.release(limiter.acquire(URL), 503, "600") == 5.0
+    assert 4.0 < limiter.metrics()["note.com"]["blocked_for"] <= 5.0
+
+
+def test_429_without_retry_after_blocks_for_cooldown():
+    limiter = RateLimiter(cooldown=3.0)
+    assert limiter.release(limiter.acquire(URL), 429) == 3.0
+    assert 2.0 < limiter.metrics()["note.com"]["blocked_for"] <= 3.0
+
+
+def test_5xx_without_retry_after_does_not_block():
+    limiter = RateLimiter(cooldown=3.0)
+    assert limiter.release(limiter.acquire(URL), 503) is None
+    assert limiter.metrics()["note.com"]["blocked_for"] == 0.0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(" 1.5 ") == 1.5
+    assert parse_retry_after("-4") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    later = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25.0 < parse_retry_after(later) <= 30.0
+    earlier = email.utils.formatdate(time.time() - 30, usegmt=True)
+    assert parse_retry_after(earlier) == 0.0
+
+
+def test_token_bucket_spaces_requests_after_the_burst():
+    limiter = RateLimiter(rate=20.0, burst=2)
+    started = time.monotonic()
+    for _ in range(3):
+        limiter.release(limiter.acquire(URL), 200)
+    # 2 件は burst で即時、3 件目はトークン 1 つ分 (1/20 秒) 待つ
+    assert time.monotonic() - started >= 0.04
+    assert limiter.metrics()["note.com"]["requests"] == 3
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import pytest
+
+from NoteClient2 import RateLimiter, RetryPolicy
+from NoteClient2.http import HttpClient
+
+UNAVAILABLE = {"ok": False, "status_code": 503}
+CONNECTION_ERROR = {"ok": False, "error": {"type": "ConnectionError", "message": "reset"}}
+
+
+@pytest.mark.parametrize("method", ["GET", "PUT", "DELETE", "get"])
+def test_idempotent_methods_are_retried(method):
+    assert RetryPolicy().should_retry(method, UNAVAILABLE, attempt=1)
+
+
+def test_post_is_retried_only_when_marked_idempotent():
+    policy = RetryPolicy()
+    assert not policy.should_retry("POST", UNAVAILABLE, attempt=1)
+    assert not policy.should_retry("POST", CONNECTION_ERROR, attempt=1)
+    assert policy.should_retry("POST", UNAVAILABLE, attempt=1, idempotent=True)
+    # 明示すれば GET でもやり直さない
+    assert not policy.should_retry("GET", UNAVAILABLE, attempt=1, idempotent=False)
+
+
+def test_only_transient_failures_are_retried():
+    policy = RetryPolicy()
+    assert policy.should_retry("GET", CONNECTION_ERROR, attempt=1)
+    assert not policy.should_retry("GET", {"ok": False, "status_code": 404}, attempt=1)
+    assert not policy.should_retry("GET", {"ok": False, "error": {"type": "ValueError"}}, attempt=1)
+    assert not policy.should_retry("GET", {"ok": True, "status_code": 200}, attempt=1)
+
+
+def test_429_is_left_to_the_rate_limiter():
+    assert not RetryPolicy().should_retry("GET", {"ok": False, "status_code": 429}, attempt=1)
+
+
+def test_attempts_are_capped():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry("GET", UNAVAILABLE, attempt=2)
+    assert not policy.should_retry("GET", UNAVAILABLE, attempt=3)
+
+
+def test_publish_errors_use_their_status_code():
+    # publish のエラー (error["status_code"]) も同じ基準で一時的かどうかを決める
+    policy = RetryPolicy()
+    assert policy.is_transient({"ok": False, "error": {"type": "NoteSaveFailed", "status_code": 502}})
+    assert not policy.is_transient({"ok": False, "error": {"type": "NoteSaveFailed", "status_code": 400}})
+
+
+def test_delay_is_jittered_and_capped():
+    policy = RetryPolicy(base_delay=1.0, max_delay=4.0)
+    for attempt in range(1, 8):
+        assert 0.0 <= policy.delay(attempt) <= min(4.0, 2 ** (attempt - 1))
+
+
+@pytest.fixture
+def http(server):
+    client = HttpClient({}, {}, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.0), url_overrides={"https://note.com": server.url})
+    yield client
+    client.close()
+
+
+def test_http_client_resends_only_idempotent_requests(server, http):
+    server.error_rate = 1.0
+
+    assert not http.post("https://note.com/api/v1/text_notes", json={}).get("ok")
+    assert not http.post("https://note.com/api/v3/images/upload/presigned_post", idempotent=True).get("ok")
+    assert not http.get("https://note.com/api/v2/note_list/contents?publish_status=draft&page=1").get("ok")
+
+    # 記事作成は二重に作らないよう 1 回だけ、冪等なものは max_attempts 回
+    assert server.requests == {"text_notes": 1, "presign": 3, "note_list": 3}
+
+
+def test_publish_does_not_resend_note_creation(server, make_client, write_file):
+    client = make_client(retry_policy=RetryPolicy(max_attempts=3, base_delay=0.0))
+    md = write_file("a.md", "# title\nbody\n")
+    server.error_rate = {"text_notes": 1.0}
+
+    result = client.publish("t", md)
+
+    assert not result["ok"]
+    assert server.requests["text_notes"] == 1
+
+
+def test_429_is_retried_in_one_layer_only(server):
+    server.error_status = 429
+    server.error_rate = 1.0
+    limiter = RateLimiter(cooldown=0.0, throttle_retries=2)
+    policy = RetryPolicy(max_attempts=3, base_delay=0.0)
+    with HttpClient({}, {}, rate_limiter=limiter, retry_policy=policy, url_overrides={"https://note.com": server.url}) as http:
+        assert http.get("https://note.com/api/v2/note_list/contents?publish_status=draft&page=1")["status_code"] == 429
+
+    # rate_limiter の throttle_retries だけ (max_attempts と掛け算にならない)
+    assert server.requests["note_list"] == 1 + 2